@@ -1,3 +1,23 @@
-from .data_processing import SpeechProcessor
-from .sentiment_analysis import SentimentFlowCalculator
-from .senti_keywords import keywords_example
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first attribute access so that, e.g., a calculator-only worker
+# never pays for loading spaCy.
+_LAZY_ATTRIBUTES = {
+    'SpeechProcessor': 'SentimentFlow.data_processing',
+    'SentimentFlowCalculator': 'SentimentFlow.sentiment_analysis',
+    'keywords_example': 'SentimentFlow.senti_keywords',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
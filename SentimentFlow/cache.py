@@ -0,0 +1,212 @@
+import hashlib
+import io
+import sqlite3
+import time
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+CACHE_SCHEMA_VERSION = 1
+# SQLite limits the number of parameters of a statement.
+_MAX_PARAMETERS = 500
+
+
+@dataclass
+class CacheStats:
+    """Lookups and writes of a DocumentCache."""
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    def __iadd__(self, other: "CacheStats") -> "CacheStats":
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+        return self
+
+    def as_dict(self) -> Dict[str, int]:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Hash the inputs of a cached computation into a key.
+
+    Strings, bytes and arrays are hashed by content (arrays with their dtype and shape), anything else by its
+    `repr`. Parts are length-prefixed, so different splits of the same bytes give different keys.
+
+    Args:
+        *parts (Any): The inputs, e.g. a kind tag, the document text and the lexicon version.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            data = f"{part.dtype.str}{part.shape}".encode() + np.ascontiguousarray(part).tobytes()
+        elif isinstance(part, bytes):
+            data = part
+        else:
+            data = (part if isinstance(part, str) else repr(part)).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def encode_array(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_array(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class DocumentCache:
+    def __init__(self, path: str, max_bytes: int = 1 << 30, commit_every: int = 256):
+        """
+        Initialize the DocumentCache, a persistent, size-bounded store of per-document results across runs.
+
+        Entries are keyed by `cache_key` hashes of everything a result depends on, so changed documents,
+        lexicons or solver settings simply miss. When the stored values exceed `max_bytes`, the least recently
+        used entries are evicted. The cache is an SQLite database and can be shared by several processes.
+
+        Args:
+            path (str): The SQLite database file, created if needed.
+            max_bytes (int): Maximum total size of the stored values.
+            commit_every (int): Number of writes batched into one transaction.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.stats = CacheStats()
+        self._connect()
+
+    def _connect(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL);
+                CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+                CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO meta VALUES ('schema', %d), ('bytes', 0);
+                CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes'; END;
+                CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+                    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes'; END;
+                CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes'; END;
+            """ % CACHE_SCHEMA_VERSION)
+        schema, = self._connection.execute("SELECT value FROM meta WHERE name = 'schema'").fetchone()
+        if schema != CACHE_SCHEMA_VERSION:
+            raise ValueError(f"{self.path} is a cache of schema {schema}; expected {CACHE_SCHEMA_VERSION}.")
+        self._touched = []
+        self._pending_writes = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up an entry.
+
+        Args:
+            key (str): The entry key.
+
+        Returns:
+            Optional[bytes]: The stored value, or None on a miss.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Look up several entries with as few queries as possible.
+
+        Args:
+            keys (Iterable[str]): The entry keys.
+
+        Returns:
+            Dict[str, bytes]: The stored values of the keys that hit.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), _MAX_PARAMETERS):
+            batch = keys[start:start + _MAX_PARAMETERS]
+            query = f"SELECT key, value FROM entries WHERE key IN ({', '.join('?' * len(batch))})"
+            found.update(self._connection.execute(query, batch).fetchall())
+        self.stats.hits += len(found)
+        self.stats.misses += len(keys) - len(found)
+        # Recency updates are written with the next commit rather than on every read.
+        now = time.time_ns()
+        self._touched.extend((now, key) for key in found)
+        return found
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Store an entry, replacing any previous value.
+
+        Args:
+            key (str): The entry key.
+            value (bytes): The value.
+        """
+        self._connection.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, size = excluded.size, last_used = excluded.last_used",
+            (key, value, len(value), time.time_ns()))
+        self.stats.writes += 1
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self.flush()
+
+    @property
+    def total_bytes(self) -> int:
+        """The total size of the stored values."""
+        return self._connection.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def flush(self) -> None:
+        """Commit pending writes and recency updates, evicting least recently used entries if over budget."""
+        if self._touched:
+            self._connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?", self._touched)
+            self._touched = []
+        excess = self.total_bytes - self.max_bytes
+        if excess > 0:
+            evicted = []
+            for key, size in self._connection.execute("SELECT key, size FROM entries ORDER BY last_used"):
+                evicted.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            self.stats.evictions += len(evicted)
+        self._connection.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        """Flush and close the database."""
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __enter__(self) -> "DocumentCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Worker processes open their own connection to the same database.
+        return {'path': self.path, 'max_bytes': self.max_bytes, 'commit_every': self.commit_every}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.stats = CacheStats()
+        self._connect()
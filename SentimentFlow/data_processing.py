@@ -1,25 +1,317 @@
+import collections
+import functools
+import itertools
+import json
+import time
+import numpy as np
 import pandas as pd
-from pathlib import Path
-from tqdm.auto import tqdm
-import spacy
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 import logging
 
+from SentimentFlow.cache import DocumentCache, cache_key
+from SentimentFlow.emotion_matrix import EmotionMatrix, EmotionMatrixBuilder
+from SentimentFlow.lexicon import PHRASE_SEPARATOR, SenticNetLexicon
+from SentimentFlow.metrics import Metrics
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.streaming import Checkpoint, ChunkWriter, read_chunks
+from SentimentFlow.tokenizers import DEFAULT_NLP_MODEL, NLP_EXCLUDED_COMPONENTS, SpacyTokenizer, Tokenizer, load_nlp
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
 
-# Load the English tokenizer, POS tagger, parser, NER, and word vectors
-nlp = spacy.load("en_core_web_sm")
+PROCESSED_TEXTS_NAME = 'processed_texts.csv'
+PROCESSED_SPEECHES_NAME = 'speeches_processed.csv'
+# Part of the document cache keys; bump it when scoring changes so that cached scores are recomputed.
+SCORES_CACHE_VERSION = 1
+
 
 class SpeechProcessor:
-    def __init__(self, senticnet_path: str):
+    def __init__(self, senticnet_path: str, lexicon_cache: bool = True, lexicon_cache_dir: Optional[str] = None,
+                 batch_size: int = 256, n_process: int = 1, nlp_model: str = DEFAULT_NLP_MODEL,
+                 nlp_exclude: Sequence[str] = NLP_EXCLUDED_COMPONENTS, cache: Optional[DocumentCache] = None,
+                 token_memo_size: Optional[int] = 65536, match_phrases: bool = False,
+                 metrics: Optional[Metrics] = None, output: Optional[OutputPolicy] = None,
+                 tokenizer: Optional[Tokenizer] = None):
         """
         Initialize the SpeechProcessor.
 
         Args:
             senticnet_path (str): The path to the SenticNet data.
+            lexicon_cache (bool): Whether to load the lexicon from its compiled on-disk cache (built on first use).
+            lexicon_cache_dir (Optional[str]): Where to keep the compiled lexicon. Defaults to a
+                `.sentimentflow_cache` directory next to the SenticNet file.
+            batch_size (int): Number of texts tokenized per batch.
+            n_process (int): Number of processes spaCy uses for tokenization (-1 for all cores). The regex
+                tokenizer always runs in the calling process.
+            nlp_model (str): The spaCy model to tokenize with. It is loaded on first use and shared per process.
+            nlp_exclude (Sequence[str]): The spaCy components not to load.
+            cache (Optional[DocumentCache]): Persistent cache of document scores, keyed by the text, the lexicon
+                version and the tokenizer settings. Texts found in it are not tokenized again.
+            token_memo_size (Optional[int]): Maximum number of distinct tokens whose lexicon contribution is
+                memoized, including tokens that are not in the lexicon (None for no limit, 0 to disable).
+            match_phrases (bool): Also match the multi-word SenticNet concepts (e.g. 'a_lot'). The longest concept
+                starting at each token is scored, and the tokens it spans are not scored again on their own.
+            metrics (Optional[Metrics]): Where the stage timings ('tokenize', 'lexicon_lookup', 'aggregation',
+                'serialization') and the document and token counters are recorded. Defaults to a new registry.
+            output (Optional[OutputPolicy]): Where `process_texts` and `process_speeches` write their CSV files.
+                Defaults to `results/`; pass `OutputPolicy.memory()` to write nothing.
+            tokenizer (Optional[Tokenizer]): How texts are split into sentences of tokens. Defaults to a
+                `SpacyTokenizer` with `nlp_model` and `nlp_exclude`; a `RegexTokenizer` is much faster and needs
+                no spaCy model, but does not give the same tokens for every text.
         """
         self.senticnet_path = senticnet_path
-        self.senticnet_data = pd.read_csv(senticnet_path, delimiter="\t")
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.nlp_model = nlp_model
+        self.nlp_exclude = tuple(nlp_exclude)
+        self.cache = cache
+        self.token_memo_size = token_memo_size
+        self.match_phrases = match_phrases
+        self.metrics = Metrics() if metrics is None else metrics
+        self.output = OutputPolicy() if output is None else output
+        self.tokenizer = SpacyTokenizer(nlp_model, nlp_exclude) if tokenizer is None else tokenizer
+        self._token_contribution = functools.lru_cache(maxsize=token_memo_size)(self._resolve_token)
         self.categories = ['INTROSPECTION', 'TEMPER', 'ATTITUDE', 'SENSITIVITY']
+        self._senticnet_data = None
+        if lexicon_cache:
+            self.lexicon = SenticNetLexicon.load(senticnet_path, self.categories, cache_dir=lexicon_cache_dir)
+        else:
+            self.lexicon = SenticNetLexicon.from_tsv(senticnet_path, self.categories)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The token memo is bound to this instance; worker processes start their own.
+        state = self.__dict__.copy()
+        del state['_token_contribution']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._token_contribution = functools.lru_cache(maxsize=self.token_memo_size)(self._resolve_token)
+
+    @property
+    def senticnet_data(self) -> pd.DataFrame:
+        """
+        The raw SenticNet dataframe, read from the TSV on first access.
+
+        Returns:
+            pd.DataFrame: The SenticNet data.
+        """
+        if self._senticnet_data is None:
+            self._senticnet_data = pd.read_csv(self.senticnet_path, delimiter="\t")
+        return self._senticnet_data
+
+    @property
+    def nlp(self) -> "spacy.Language":
+        """
+        The spaCy pipeline, loaded on first access.
+
+        Returns:
+            spacy.Language: The pipeline used for tokenization.
+        """
+        return load_nlp(self.nlp_model, self.nlp_exclude)
+
+    @property
+    def emotion_columns(self) -> List[str]:
+        """
+        Every emotion column the processor can produce, in lexicon order, followed by 'POLARITY'.
+
+        Returns:
+            List[str]: The fixed emotion vocabulary used by the streaming API.
+        """
+        return [*self.lexicon.labels, 'POLARITY']
+
+    def _pipe(self, records: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Tokenize texts in batches, optionally across several processes.
+
+        Args:
+            records (Iterable[Tuple[str, Any]]): (text, context) pairs; the context is passed through untouched.
+
+        Returns:
+            Iterator[Tuple[Any, Any]]: The tokenizer's documents with their context, in input order.
+        """
+        docs = self.tokenizer.pipe(records, batch_size=self.batch_size, n_process=self.n_process)
+        return self.metrics.timed(docs, 'tokenize')
+
+    def _scores_key(self, text: str) -> str:
+        return cache_key('scores', SCORES_CACHE_VERSION, self.lexicon.version, *self.tokenizer.config,
+                         self.match_phrases, text)
+
+    def _score_records(self, records: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[Dict[str, float], Any]]:
+        """
+        Score texts in order, tokenizing only the ones whose scores are not cached.
+
+        Args:
+            records (Iterable[Tuple[str, Any]]): (text, context) pairs; the context is passed through untouched.
+
+        Returns:
+            Iterator[Tuple[Dict[str, float], Any]]: The scores of every text with its context, in input order.
+        """
+        if self.cache is None:
+            for doc, context in self._pipe(records):
+                yield self._score_doc(doc), context
+            return
+
+        # (key, cached scores, context) of every record read but not yielded yet. spaCy only sees the misses,
+        # so the cached records in front of a miss are yielded when its document comes out of the pipe.
+        pending = collections.deque()
+        flush_marker = (None, None, None)
+
+        def misses() -> Iterator[Tuple[str, None]]:
+            cached_run = 0
+            for text, context in records:
+                key = self._scores_key(text)
+                cached = self.cache.get(key)
+                if cached is None:
+                    pending.append((key, None, context))
+                    cached_run = 0
+                    yield text, None
+                else:
+                    pending.append((key, json.loads(cached), context))
+                    cached_run += 1
+                    if cached_run >= self.batch_size:
+                        # An empty document makes a batching tokenizer hand back control, so runs of cached
+                        # texts are not buffered until the next miss.
+                        pending.append(flush_marker)
+                        cached_run = 0
+                        yield '', None
+
+        for doc, _ in self._pipe(misses()):
+            while pending[0][1] is not None:
+                _, scores, context = pending.popleft()
+                yield scores, context
+            key, _, context = pending.popleft()
+            if key is not None:
+                scores = self._score_doc(doc)
+                self.cache.put(key, json.dumps(scores).encode('utf-8'))
+                yield scores, context
+        for _, scores, context in pending:
+            yield scores, context
+        self.cache.flush()
+
+    def _iter_text_rows(self, texts: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        for scores, text in self._score_records((text, text) for text in texts):
+            yield {'text': text, **scores}
+
+    def _iter_speech_rows(self, frames: Iterable[pd.DataFrame]) -> Iterator[Dict[str, Any]]:
+        records = (
+            (speech, (title, speaker, speech))
+            for frame in frames
+            for title, speaker, speech in zip(frame['title'], frame['speaker'], frame['speech'])
+        )
+        for scores, (title, speaker, speech) in self._score_records(records):
+            yield {'title': title, "speaker": speaker, "speech": speech, **scores}
+
+    @staticmethod
+    def _iter_chunks(rows: Iterator[Dict[str, Any]], columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+        start = 0
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield pd.DataFrame(chunk, columns=columns, index=pd.RangeIndex(start, start + len(chunk))).fillna(0)
+            start += len(chunk)
+
+    def _resolve_token(self, text: str) -> Optional[Tuple[Tuple[Tuple[str, float], ...], float]]:
+        """
+        Resolve what a token (or a matched phrase) adds to the scores of a document.
+
+        Args:
+            text (str): The token text, lowercased, or the words of a phrase joined with `PHRASE_SEPARATOR`.
+
+        Returns:
+            Optional[Tuple[Tuple[Tuple[str, float], ...], float]]: The (emotion, score) pairs and the polarity of
+            the token, or None if it is not in SenticNet.
+        """
+        entry = self.lexicon.get(text)
+        if entry is None:
+            return None
+        if entry.max_emotion == entry.min_emotion:
+            return ((entry.max_emotion, entry.max_score),), entry.polarity
+        return ((entry.max_emotion, entry.max_score), (entry.min_emotion, entry.min_score)), entry.polarity
+
+    @property
+    def token_memo_stats(self) -> Dict[str, Any]:
+        """
+        Hits and misses of the token memo since the processor was created, to help size `token_memo_size`.
+
+        Returns:
+            Dict[str, Any]: 'hits', 'misses', 'size', 'max_size' and 'hit_rate'.
+        """
+        info = self._token_contribution.cache_info()
+        lookups = info.hits + info.misses
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize,
+                'hit_rate': info.hits / lookups if lookups else 0.0}
+
+    def _phrases(self, words: List[str]) -> Iterator[str]:
+        """
+        Split a sentence into concepts in one pass, taking the longest SenticNet concept at every position.
+
+        Args:
+            words (List[str]): The lowercased tokens of the sentence.
+
+        Returns:
+            Iterator[str]: The matched phrases (joined with `PHRASE_SEPARATOR`) and the remaining lowercased tokens.
+        """
+        start = 0
+        while start < len(words):
+            length = self.lexicon.match_phrase(words, start)
+            if length > 1:
+                yield PHRASE_SEPARATOR.join(words[start:start + length])
+                start += length
+            else:
+                yield words[start]
+                start += 1
+
+    def _score_doc(self, doc: Any) -> Dict[str, float]:
+        """
+        Average the SenticNet emotions and polarity of the tokens of a processed document.
+
+        Args:
+            doc (Any): A document from the tokenizer.
+
+        Returns:
+            Dict[str, float]: The averaged score of every emotion found, plus the averaged 'POLARITY'.
+        """
+        start = time.perf_counter()
+        contributions = []
+        for words in self.tokenizer.sentences(doc):
+            concepts = self._phrases(words) if self.match_phrases else words
+            # Memoized per concept: corpora reuse a small vocabulary over and over.
+            contributions.extend(map(self._token_contribution, concepts))
+        looked_up = time.perf_counter()
+
+        sums = {}
+        counts = {}
+        polarity_sum = 0.0
+        polarity_count = 0
+        for contribution in contributions:
+            if contribution is not None:
+                emotions, polarity = contribution
+                for emotion, score in emotions:
+                    sums[emotion] = sums.get(emotion, 0) + score
+                    counts[emotion] = counts.get(emotion, 0) + 1
+                polarity_sum += polarity
+                polarity_count += 1
+
+        emotion_avg = {emotion: total / counts[emotion] for emotion, total in sums.items()}
+        polarity_avg = {"POLARITY": polarity_sum / polarity_count if polarity_count else 0}
+        self.metrics.update(
+            counters={'documents_total': 1, 'tokens_total': len(contributions), 'tokens_matched_total': polarity_count},
+            timings={'lexicon_lookup': looked_up - start, 'aggregation': time.perf_counter() - looked_up}
+        )
+        return {**emotion_avg, **polarity_avg}
+
+    def score_texts(self, texts: Iterable[str]) -> List[Dict[str, float]]:
+        """
+        Score texts in memory, without progress bars or files, e.g. for a small batch scored online.
+
+        Args:
+            texts (Iterable[str]): The texts.
+
+        Returns:
+            List[Dict[str, float]]: The scores of every text, as in `_score_doc`, in input order.
+        """
+        return [scores for scores, _ in self._score_records((text, None) for text in texts)]
 
     def process_speeches(self, input_df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -39,61 +331,18 @@ class SpeechProcessor:
             0  Title 1  Speaker 1  I am happy  0.0  0.500000
             1  Title 2  Speaker 2    I am sad  0.0 -0.333333
         """
-        results = []
+        from tqdm.auto import tqdm
+
         logging.info("Starting to process")
-        for _, row in tqdm(input_df.iterrows(), total=input_df.shape[0], desc="Processing speeches"):
-            speech_processed = nlp(row['speech'])
-            speaker = row['speaker']
-            speech = row['speech']
-            title = row['title']
-
-            accumulators = {}
-            polaritylist = []
-            for sent in speech_processed.sents:
-                for token in sent:
-                    token_text = token.text.lower()
-                    matching_row = self.senticnet_data[self.senticnet_data['CONCEPT'] == token_text]
-                    if not matching_row.empty:
-                        max_category = matching_row[self.categories].astype(float).idxmax(axis=1).iloc[0]
-                        min_category = matching_row[self.categories].astype(float).idxmin(axis=1).iloc[0]
-
-                        primary_emotion = matching_row['PRIMARY EMOTION'].iloc[0]
-                        secondary_emotion = matching_row['SECONDARY EMOTION'].iloc[0]
-
-                        if pd.isna(primary_emotion):
-                            max_emotion = max_category
-                        else:
-                            max_emotion = f"{max_category}{matching_row['PRIMARY EMOTION'].iloc[0]}"
-
-                        if pd.isna(secondary_emotion):
-                            min_emotion = min_category
-                        else:
-                            min_emotion = f"{min_category}{matching_row['SECONDARY EMOTION'].iloc[0]}"
-
-                        if max_emotion not in accumulators:
-                            accumulators[max_emotion] = []
-                        if min_emotion not in accumulators:
-                            accumulators[min_emotion] = []
-
-                        accumulators[max_emotion].append(matching_row[max_category].iloc[0])
-                        if max_emotion != min_emotion:
-                            accumulators[min_emotion].append(matching_row[min_category].iloc[0])
-
-                        polarity = matching_row["POLARITY INTENSITY"].astype(float).iloc[0]
-                        polaritylist.append(polarity)
-
-            emotion_avg = {emotion: sum(values) / len(values) if values else 0 for emotion, values in accumulators.items()}
-            polarity_avg = {"POLARITY": sum(polaritylist) / len(polaritylist) if polaritylist else 0}
-
-            result_row = {'title': title, "speaker": speaker, "speech": speech, **emotion_avg, **polarity_avg}
-            results.append(result_row)
+        rows = self._iter_speech_rows([input_df])
+        results = list(tqdm(rows, total=input_df.shape[0], desc="Processing speeches"))
+        logging.info(f"Token memo: {self.token_memo_stats}")
 
         results_df = pd.DataFrame(results).fillna(0)
         results_df = results_df.loc[:, (results_df != 0).any(axis=0)]
 
-        logging.info("Saving results to results/speeches_processed.csv")
-        Path("results/speeches_processed.csv").parent.mkdir(parents=True, exist_ok=True)
-        results_df.to_csv('results/speeches_processed.csv', index=False)
+        with self.metrics.timer('serialization'):
+            self.output.write_frame(results_df, PROCESSED_SPEECHES_NAME)
         return results_df
 
     def process_texts(self, input_series: pd.Series) -> pd.DataFrame:
@@ -114,61 +363,150 @@ class SpeechProcessor:
             0  I am happy  0.0  0.500000
             1    I am sad  0.0 -0.333333
         """
-        results = []
+        from tqdm.auto import tqdm
+
         logging.info("Starting to process")
-        for text in tqdm(input_series,total=len(input_series) , desc="Processing texts"):
-            text_processed = nlp(text)
-
-            accumulators = {}
-            polaritylist = []
-            for sent in text_processed.sents:
-                for token in sent:
-                    token_text = token.text.lower()
-                    matching_row = self.senticnet_data[self.senticnet_data['CONCEPT'] == token_text]
-                    if not matching_row.empty:
-                        max_category = matching_row[self.categories].astype(float).idxmax(axis=1).iloc[0]
-                        min_category = matching_row[self.categories].astype(float).idxmin(axis=1).iloc[0]
-
-                        primary_emotion = matching_row['PRIMARY EMOTION'].iloc[0]
-                        secondary_emotion = matching_row['SECONDARY EMOTION'].iloc[0]
-
-                        if pd.isna(primary_emotion):
-                            max_emotion = max_category
-                        else:
-                            max_emotion = f"{max_category}{matching_row['PRIMARY EMOTION'].iloc[0]}"
-
-                        if pd.isna(secondary_emotion):
-                            min_emotion = min_category
-                        else:
-                            min_emotion = f"{min_category}{matching_row['SECONDARY EMOTION'].iloc[0]}"
-
-                        if max_emotion not in accumulators:
-                            accumulators[max_emotion] = []
-                        if min_emotion not in accumulators:
-                            accumulators[min_emotion] = []
-
-                        accumulators[max_emotion].append(matching_row[max_category].iloc[0])
-                        if max_emotion != min_emotion:
-                            accumulators[min_emotion].append(matching_row[min_category].iloc[0])
-
-                        polarity = matching_row["POLARITY INTENSITY"].astype(float).iloc[0]
-                        polaritylist.append(polarity)
-
-            emotion_avg = {emotion: sum(values) / len(values) if values else 0 for emotion, values in
-                           accumulators.items()}
-            polarity_avg = {"POLARITY": sum(polaritylist) / len(polaritylist) if polaritylist else 0}
-
-            result_row = {'text': text, **emotion_avg, **polarity_avg}
-            results.append(result_row)
+        rows = self._iter_text_rows(input_series)
+        results = list(tqdm(rows, total=len(input_series), desc="Processing texts"))
+        logging.info(f"Token memo: {self.token_memo_stats}")
 
         results_df = pd.DataFrame(results).fillna(0)
         results_df = results_df.loc[:, (results_df != 0).any(axis=0)]
 
-        logging.info("Saving results to results/processed_texts.csv")
-        Path("results/processed_texts.csv").parent.mkdir(parents=True, exist_ok=True)
-        results_df.to_csv('results/processed_texts.csv', index=False)
+        with self.metrics.timer('serialization'):
+            self.output.write_frame(results_df, PROCESSED_TEXTS_NAME)
         return results_df
 
+    def _score_matrix(self, records: Iterable[Tuple[str, Tuple[Any, ...]]], metadata_columns: List[str], total: int,
+                      desc: str, dtype: Union[str, np.dtype]) -> EmotionMatrix:
+        from tqdm.auto import tqdm
+
+        logging.info("Starting to process")
+        builder = EmotionMatrixBuilder(self.emotion_columns, dtype)
+        metadata = []
+        for scores, context in tqdm(self._score_records(records), total=total, desc=desc):
+            builder.add(scores)
+            metadata.append(context)
+        logging.info(f"Token memo: {self.token_memo_stats}")
+        return builder.build(pd.DataFrame(metadata, columns=metadata_columns))
+
+    def process_texts_sparse(self, input_series: Union[pd.Series, Sequence[str]],
+                             dtype: Union[str, np.dtype] = np.float64) -> EmotionMatrix:
+        """
+        Process texts like `process_texts`, but keep the scores in a sparse matrix over `emotion_columns`.
+
+        Every text only has a few of the lexicon's emotions, so this takes a fraction of the memory of the dense
+        frame. `SentimentFlowCalculator.calculate_navier_stocker_for_texts` accepts the result directly, and
+        `to_frame()` converts it to the `process_texts` layout. Nothing is written to disk.
+
+        Args:
+            input_series (Union[pd.Series, Sequence[str]]): The texts.
+            dtype (Union[str, np.dtype]): The dtype the scores are stored in. float32 halves their memory, but
+                the flow amplifies the rounding, so trajectories computed from it can differ noticeably from those
+                of the float64 scores.
+
+        Returns:
+            EmotionMatrix: The texts and their scores.
+        """
+        records = ((text, (text,)) for text in input_series)
+        return self._score_matrix(records, ['text'], len(input_series), "Processing texts", dtype)
+
+    def process_speeches_sparse(self, input_df: pd.DataFrame, dtype: Union[str, np.dtype] = np.float64) -> EmotionMatrix:
+        """
+        Process speeches like `process_speeches`, but keep the scores in a sparse matrix over `emotion_columns`.
+
+        Args:
+            input_df (pd.DataFrame): The speeches, with 'title', 'speaker' and 'speech' columns.
+            dtype (Union[str, np.dtype]): The dtype the scores are stored in.
+
+        Returns:
+            EmotionMatrix: The speeches ('title', 'speaker', 'speech' metadata) and their scores.
+        """
+        records = ((speech, (title, speaker, speech))
+                   for title, speaker, speech in zip(input_df['title'], input_df['speaker'], input_df['speech']))
+        return self._score_matrix(records, ['title', 'speaker', 'speech'], input_df.shape[0], "Processing speeches",
+                                  dtype)
+
+    def iter_process_texts(self, texts: Iterable[str], chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+        """
+        Process texts lazily and yield the results in chunks, keeping memory bounded by the chunk size.
+
+        Unlike `process_texts`, every chunk has the same columns: 'text' followed by `emotion_columns`.
+        Nothing is written to disk.
+
+        Args:
+            texts (Iterable[str]): The texts, e.g. a generator over a corpus that does not fit in memory.
+            chunk_size (int): The number of texts per yielded chunk.
+
+        Returns:
+            Iterator[pd.DataFrame]: The processed texts, indexed by their position in `texts`.
+        """
+        return self._iter_chunks(self._iter_text_rows(texts), ['text', *self.emotion_columns], chunk_size)
+
+    def iter_process_speeches(self, speeches: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                              chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+        """
+        Process speeches lazily and yield the results in chunks, keeping memory bounded by the chunk size.
+
+        Unlike `process_speeches`, every chunk has the same columns: 'title', 'speaker', 'speech' followed by
+        `emotion_columns`. Nothing is written to disk.
+
+        Args:
+            speeches (Union[pd.DataFrame, Iterable[pd.DataFrame]]): The speeches, or an iterable of chunks of
+                speeches, with 'title', 'speaker' and 'speech' columns.
+            chunk_size (int): The number of speeches per yielded chunk.
+
+        Returns:
+            Iterator[pd.DataFrame]: The processed speeches, indexed by their position in the input.
+        """
+        frames = [speeches] if isinstance(speeches, pd.DataFrame) else speeches
+        columns = ['title', 'speaker', 'speech', *self.emotion_columns]
+        return self._iter_chunks(self._iter_speech_rows(frames), columns, chunk_size)
+
+    def process_file(self, input_path: str, output_path: str, speeches: bool = False, text_column: str = 'text',
+                     chunk_size: int = 1000, checkpoint_path: Optional[str] = None) -> int:
+        """
+        Process a CSV or JSON-lines corpus chunk by chunk, appending the results to `output_path`.
+
+        After every chunk the output is flushed and a checkpoint is saved. Rerunning the same call after a crash
+        resumes from the last checkpoint instead of starting over. Delete the checkpoint to start from scratch.
+
+        Args:
+            input_path (str): The corpus (`.csv` or `.jsonl`).
+            output_path (str): Where to append the results (`.csv` or `.jsonl`).
+            speeches (bool): Whether the corpus holds speeches ('title', 'speaker', 'speech') rather than texts.
+            text_column (str): The column holding the texts, when `speeches` is False.
+            chunk_size (int): The number of rows read, processed and written at a time.
+            checkpoint_path (Optional[str]): Where to keep the checkpoint. Defaults to
+                `<output_path>.checkpoint.json`.
+
+        Returns:
+            int: The total number of rows processed, including those from previous runs.
+        """
+        if checkpoint_path is None:
+            checkpoint_path = f"{output_path}.checkpoint.json"
+        checkpoint = Checkpoint(checkpoint_path, input_path, output_path).load()
+        if checkpoint.rows_done:
+            logging.info(f"Resuming {input_path} after {checkpoint.rows_done} rows")
+
+        chunks = read_chunks(input_path, chunk_size, skip_rows=checkpoint.rows_done)
+        if speeches:
+            columns = ['title', 'speaker', 'speech', *self.emotion_columns]
+            results = self.iter_process_speeches(chunks, chunk_size)
+        else:
+            columns = ['text', *self.emotion_columns]
+            results = self.iter_process_texts((text for chunk in chunks for text in chunk[text_column]), chunk_size)
+
+        rows_done = checkpoint.rows_done
+        with ChunkWriter(output_path, columns, truncate_to=checkpoint.output_bytes) as writer:
+            for result in results:
+                with self.metrics.timer('serialization'):
+                    output_bytes = writer.write(result)
+                rows_done += len(result)
+                checkpoint.save(rows_done, output_bytes)
+                logging.info(f"Processed {rows_done} rows of {input_path}")
+        return rows_done
+
 # Example usage
 # processor = SpeechProcessor('data/SenticNet4.txt')
 # input_df = pd.DataFrame({'title': ['Title 1', 'Title 2'], 'speaker': ['Speaker 1', 'Speaker 2'], 'speech': ['I am happy', 'I am sad']})
@@ -0,0 +1,141 @@
+from array import array
+from typing import Dict, List, NamedTuple, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+class EmotionMatrix(NamedTuple):
+    """
+    Processed documents with their scores as a sparse matrix over a fixed emotion vocabulary.
+
+    Attributes:
+        metadata (pd.DataFrame): One row per document: 'text', or 'title', 'speaker' and 'speech'.
+        scores (scipy.sparse.csr_matrix): (documents, len(columns)) scores; emotions a document does not have
+            are not stored.
+        columns (List[str]): The emotion vocabulary, followed by 'POLARITY'.
+    """
+    metadata: pd.DataFrame
+    scores: "scipy.sparse.csr_matrix"
+    columns: List[str]
+
+    def active_columns(self) -> List[str]:
+        """
+        The columns with at least one non-zero score, sorted by name, as in the dense processed frames.
+
+        Returns:
+            List[str]: The active columns.
+        """
+        return sorted(np.asarray(self.columns)[self.scores.getnnz(axis=0) > 0].tolist())
+
+    def select(self, columns: Sequence[str]) -> "scipy.sparse.csr_matrix":
+        """
+        Pick some columns of the scores.
+
+        Args:
+            columns (Sequence[str]): The columns, in the order wanted.
+
+        Returns:
+            scipy.sparse.csr_matrix: The (documents, len(columns)) scores.
+        """
+        positions = {column: i for i, column in enumerate(self.columns)}
+        return self.scores[:, [positions[column] for column in columns]].tocsr()
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Densify a single column of the scores.
+
+        Args:
+            name (str): The column.
+
+        Returns:
+            np.ndarray: The float64 scores of every document.
+        """
+        return self.select([name]).toarray().ravel().astype(np.float64)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Densify into the layout of `process_texts` / `process_speeches`: the metadata followed by the active columns.
+
+        Returns:
+            pd.DataFrame: The processed documents.
+        """
+        active = set(self.active_columns())
+        columns = [column for column in self.columns if column in active]
+        scores = pd.DataFrame(self.select(columns).toarray().astype(np.float64), columns=columns,
+                              index=self.metadata.index)
+        return pd.concat([self.metadata, scores], axis=1)
+
+
+class EmotionMatrixBuilder:
+    def __init__(self, columns: List[str], dtype: Union[str, np.dtype] = np.float64):
+        """
+        Initialize the EmotionMatrixBuilder, which accumulates document scores straight into CSR arrays.
+
+        Args:
+            columns (List[str]): The emotion vocabulary, followed by 'POLARITY'.
+            dtype (Union[str, np.dtype]): The dtype of the stored scores.
+        """
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        self._positions = {column: i for i, column in enumerate(self.columns)}
+        self._indptr = array('q', [0])
+        self._indices = array('i')
+        self._data = array('d')
+
+    def add(self, scores: Dict[str, float]) -> None:
+        """
+        Append the scores of a document; zeros are not stored.
+
+        Args:
+            scores (Dict[str, float]): The scores, keyed by column.
+        """
+        for column, score in scores.items():
+            if score != 0:
+                self._indices.append(self._positions[column])
+                self._data.append(score)
+        self._indptr.append(len(self._indices))
+
+    def __len__(self) -> int:
+        return len(self._indptr) - 1
+
+    def build(self, metadata: pd.DataFrame) -> EmotionMatrix:
+        """
+        Assemble the matrix.
+
+        Args:
+            metadata (pd.DataFrame): One row per added document.
+
+        Returns:
+            EmotionMatrix: The documents and their scores.
+        """
+        from scipy.sparse import csr_matrix
+
+        if len(metadata) != len(self):
+            raise ValueError(f"Got metadata for {len(metadata)} documents, but scores for {len(self)}.")
+        scores = csr_matrix(
+            (np.frombuffer(self._data, dtype=np.float64).astype(self.dtype),
+             np.frombuffer(self._indices, dtype=np.int32),
+             np.frombuffer(self._indptr, dtype=np.int64)),
+            shape=(len(self), len(self.columns))
+        )
+        scores.sort_indices()
+        return EmotionMatrix(metadata, scores, self.columns)
+
+
+def dense_rows(states: Union[np.ndarray, "scipy.sparse.spmatrix"], start: int, stop: int) -> np.ndarray:
+    """
+    Densify rows of a dense or sparse state matrix as float64, one block at a time.
+
+    Args:
+        states (Union[np.ndarray, scipy.sparse.spmatrix]): The states.
+        start (int): The first row.
+        stop (int): The row after the last.
+
+    Returns:
+        np.ndarray: The (stop - start, d) float64 rows.
+    """
+    block = states[start:stop]
+    if not isinstance(block, np.ndarray):
+        block = block.toarray()
+    return np.asarray(block, dtype=np.float64)
@@ -0,0 +1,303 @@
+import functools
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from SentimentFlow.solver import FlowRHS, gradient
+
+ODEINT = 'odeint'
+SOLVE_IVP_METHODS = ('RK45', 'RK23', 'DOP853', 'Radau', 'BDF', 'LSODA')
+FIXED_STEP_METHODS = ('rk4', 'euler')
+METHODS = (ODEINT,) + SOLVE_IVP_METHODS + FIXED_STEP_METHODS
+
+# Methods that use a supplied Jacobian, and whether they take it in banded form.
+_JACOBIAN_METHODS = {ODEINT: True, 'LSODA': True, 'Radau': False, 'BDF': False}
+
+# The flow couples each dimension to its neighbours within two positions (the Laplacian is a gradient of a
+# gradient), so its Jacobian is pentadiagonal.
+JACOBIAN_BANDWIDTH = 2
+
+_CLIP = 1e10
+
+
+@dataclass
+class IntegrationStats:
+    """Work done by a FlowIntegrator."""
+    integrations: int = 0
+    rhs_evaluations: int = 0
+    jacobian_evaluations: int = 0
+    diverged: int = 0
+
+    def __iadd__(self, other: "IntegrationStats") -> "IntegrationStats":
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+        return self
+
+    def as_dict(self) -> Dict[str, int]:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+@functools.lru_cache(maxsize=None)
+def difference_operators(d: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrices of the discrete gradient used by the flow and of its square (the discrete Laplacian).
+
+    Args:
+        d (int): Number of emotion dimensions, at least 2.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (d, d) gradient and Laplacian matrices, so that `D @ s == gradient(s)`.
+    """
+    D = gradient(np.eye(d)).T
+    laplacian = D @ D
+    D.setflags(write=False)
+    laplacian.setflags(write=False)
+    return D, laplacian
+
+
+def flow_jacobian(s: np.ndarray, pressure_term: np.ndarray, nu_sent: float, g_context: float) -> np.ndarray:
+    """
+    Analytic Jacobian of `navier_stokes_rhs` with respect to the state.
+
+    With D the discrete gradient, the flow is `s * (D s) + pressure + nu D^2 s + g`, so the Jacobian is
+    `diag(D s) + diag(s) D + nu D^2`. Rows whose flow is clipped have a zero derivative.
+
+    Args:
+        s (np.ndarray): (d,) sentiment state.
+        pressure_term (np.ndarray): (d,) pressure term.
+        nu_sent (float): Sentiment viscosity.
+        g_context (float): External contextual force.
+
+    Returns:
+        np.ndarray: (d, d) Jacobian.
+    """
+    D, laplacian = difference_operators(len(s))
+    grad_s = D @ s
+    jacobian = s[:, None] * D + nu_sent * laplacian
+    jacobian[np.diag_indices_from(jacobian)] += grad_s
+    clipped = np.abs(s * grad_s + pressure_term + nu_sent * (laplacian @ s) + g_context) > _CLIP
+    jacobian[clipped] = 0.0
+    return jacobian
+
+
+def to_banded(jacobian: np.ndarray, bandwidth: int = JACOBIAN_BANDWIDTH) -> np.ndarray:
+    """
+    Pack a banded matrix in the LAPACK layout used by `odeint` and LSODA: `band[bandwidth + i - j, j] = J[i, j]`.
+
+    Args:
+        jacobian (np.ndarray): (d, d) matrix with `bandwidth` non-zero diagonals on each side.
+        bandwidth (int): Number of sub- and super-diagonals.
+
+    Returns:
+        np.ndarray: (2 * bandwidth + 1, d) packed matrix.
+    """
+    d = len(jacobian)
+    band = np.zeros((2 * bandwidth + 1, d))
+    for offset in range(-bandwidth, bandwidth + 1):
+        diagonal = np.diagonal(jacobian, offset)
+        if offset >= 0:
+            band[bandwidth - offset, offset:] = diagonal
+        else:
+            band[bandwidth - offset, :d + offset] = diagonal
+    return band
+
+
+def _rhs_kernel(s, pressure_term, nu_sent, g_context, out):
+    """Loop form of `navier_stokes_rhs` for Numba; returns False instead of raising on non-finite values."""
+    d = s.shape[0]
+    grad_s = np.empty(d)
+    laplacian_s = np.empty(d)
+    grad_s[0] = s[1] - s[0]
+    grad_s[d - 1] = s[d - 1] - s[d - 2]
+    for i in range(1, d - 1):
+        grad_s[i] = (s[i + 1] - s[i - 1]) / 2.0
+    laplacian_s[0] = grad_s[1] - grad_s[0]
+    laplacian_s[d - 1] = grad_s[d - 1] - grad_s[d - 2]
+    for i in range(1, d - 1):
+        laplacian_s[i] = (grad_s[i + 1] - grad_s[i - 1]) / 2.0
+
+    finite = True
+    for i in range(d):
+        if not (np.isfinite(s[i]) and np.isfinite(grad_s[i])):
+            finite = False
+        value = s[i] * grad_s[i] + pressure_term[i] + nu_sent * laplacian_s[i] + g_context
+        if np.isnan(value):
+            finite = False
+        out[i] = min(max(value, -_CLIP), _CLIP)
+    return finite
+
+
+@functools.lru_cache(maxsize=None)
+def _jit_rhs_kernel() -> Callable:
+    try:
+        import numba
+    except ImportError as error:
+        raise ImportError("jit=True requires numba; install it with `pip install numba`.") from error
+    return numba.njit(cache=True)(_rhs_kernel)
+
+
+class _JitFlowRHS(FlowRHS):
+    def __call__(self, s: np.ndarray, _t: float = 0.0) -> np.ndarray:
+        if not self.diverged and not _jit_rhs_kernel()(s, self.pressure_term, self.nu_sent, self.g_context, self._rhs):
+            self.diverged = True
+        if self.diverged:
+            self._rhs.fill(0.0)
+        return self._rhs
+
+
+class FlowIntegrator:
+    def __init__(self, method: str = ODEINT, rtol: Optional[float] = None, atol: Optional[float] = None,
+                 n_steps: int = 10, use_jacobian: bool = False, jit: bool = False,
+                 solver_options: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the FlowIntegrator, which advances a sentiment state along the Navier-Stokes sentiment flow.
+
+        The default (`odeint` without a Jacobian, default tolerances) reproduces the original integration.
+
+        Args:
+            method (str): `'odeint'`, a `solve_ivp` method (`'RK45'`, `'RK23'`, `'DOP853'`, `'Radau'`, `'BDF'`,
+                `'LSODA'`), or a fixed-step scheme (`'rk4'`, `'euler'`).
+            rtol (Optional[float]): Relative tolerance of the adaptive methods (None for the solver default).
+            atol (Optional[float]): Absolute tolerance of the adaptive methods (None for the solver default).
+            n_steps (int): Number of steps per time interval of the fixed-step schemes.
+            use_jacobian (bool): Supply the analytic Jacobian (banded for `odeint` and LSODA, dense for Radau and
+                BDF) instead of letting the solver estimate it by finite differences. Ignored by explicit methods.
+            jit (bool): Evaluate the flow with a Numba-compiled kernel (requires numba).
+            solver_options (Optional[Dict[str, Any]]): Extra keyword arguments for `odeint` or `solve_ivp`,
+                e.g. `{'mxstep': 5000}` or `{'max_step': 0.1}`.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown integration method {method!r}. Choose one of {', '.join(METHODS)}.")
+        if n_steps < 1:
+            raise ValueError("n_steps must be at least 1.")
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+        self.n_steps = n_steps
+        self.use_jacobian = use_jacobian and method in _JACOBIAN_METHODS
+        self.jit = jit
+        self.solver_options = dict(solver_options or {})
+        self.stats = IntegrationStats()
+        if jit:
+            _jit_rhs_kernel()
+
+    @property
+    def config(self) -> Tuple[Any, ...]:
+        """The settings that determine the integration results, e.g. for cache keys."""
+        return (self.method, self.rtol, self.atol, self.n_steps, self.use_jacobian, self.jit,
+                sorted(self.solver_options.items()))
+
+    def _rhs(self, flow: FlowRHS) -> Callable[[np.ndarray], np.ndarray]:
+        stats = self.stats
+        # odeint copies the flow out of the workspace; the other solvers keep references to it.
+        if self.method == ODEINT:
+            def rhs(s: np.ndarray) -> np.ndarray:
+                stats.rhs_evaluations += 1
+                return flow(s)
+        else:
+            def rhs(s: np.ndarray) -> np.ndarray:
+                stats.rhs_evaluations += 1
+                return flow(s).copy()
+        return rhs
+
+    def _jacobian(self, pressure_term: np.ndarray, nu_sent: float, g_context: float,
+                  banded: bool) -> Callable[[np.ndarray], np.ndarray]:
+        stats = self.stats
+
+        def jacobian(s: np.ndarray) -> np.ndarray:
+            stats.jacobian_evaluations += 1
+            dense = flow_jacobian(s, pressure_term, nu_sent, g_context)
+            return to_banded(dense) if banded else dense
+        return jacobian
+
+    def _tolerances(self) -> Dict[str, float]:
+        return {key: value for key, value in (('rtol', self.rtol), ('atol', self.atol)) if value is not None}
+
+    def integrate(self, s0: np.ndarray, t: np.ndarray, pressure_term: np.ndarray, nu_sent: float,
+                  g_context: float) -> np.ndarray:
+        """
+        Integrate the sentiment flow from `s0` and report the states at the time points `t`.
+
+        Args:
+            s0 (np.ndarray): (d,) initial sentiment state, at time `t[0]`.
+            t (np.ndarray): Increasing time points.
+            pressure_term (np.ndarray): (d,) pressure term, see `solver.pressure_terms`.
+            nu_sent (float): Sentiment viscosity.
+            g_context (float): External contextual force.
+
+        Returns:
+            np.ndarray: (len(t), d) states.
+
+        Raises:
+            ValueError: If the flow stops being finite.
+        """
+        states = self.try_integrate(s0, t, pressure_term, nu_sent, g_context)
+        if states is None:
+            raise ValueError("Invalid sentiment flow calculation")
+        return states
+
+    def try_integrate(self, s0: np.ndarray, t: np.ndarray, pressure_term: np.ndarray, nu_sent: float,
+                      g_context: float) -> Optional[np.ndarray]:
+        """
+        Integrate the sentiment flow like `integrate`, but return None instead of raising if it diverges.
+
+        Returns:
+            Optional[np.ndarray]: (len(t), d) states, or None if the flow stopped being finite.
+        """
+        s0 = np.asarray(s0, dtype=float)
+        t = np.asarray(t, dtype=float)
+        pressure_term = np.asarray(pressure_term, dtype=float)
+        flow = (_JitFlowRHS if self.jit else FlowRHS)(pressure_term, float(nu_sent), float(g_context))
+        rhs = self._rhs(flow)
+        self.stats.integrations += 1
+
+        if self.method == ODEINT:
+            from scipy.integrate import odeint
+
+            options = {**self._tolerances(), **self.solver_options}
+            if self.use_jacobian:
+                jacobian = self._jacobian(pressure_term, float(nu_sent), float(g_context), banded=True)
+                options.update(Dfun=lambda s, _t: jacobian(s), ml=JACOBIAN_BANDWIDTH, mu=JACOBIAN_BANDWIDTH)
+            states = odeint(lambda s, _t: rhs(s), s0, t, **options)
+        elif self.method in SOLVE_IVP_METHODS:
+            from scipy.integrate import solve_ivp
+
+            options = {**self._tolerances(), **self.solver_options}
+            if self.use_jacobian:
+                banded = _JACOBIAN_METHODS[self.method]
+                jacobian = self._jacobian(pressure_term, float(nu_sent), float(g_context), banded=banded)
+                options['jac'] = lambda _t, s: jacobian(s)
+                if banded:
+                    options.update(lband=JACOBIAN_BANDWIDTH, uband=JACOBIAN_BANDWIDTH)
+            solution = solve_ivp(lambda _t, s: rhs(s), (t[0], t[-1]), s0, method=self.method, t_eval=t, **options)
+            if not (solution.success or flow.diverged):
+                raise ValueError(f"Sentiment flow integration failed: {solution.message}")
+            states = solution.y.T
+        else:
+            states = self._integrate_fixed_step(rhs, flow, s0, t)
+
+        if flow.diverged:
+            self.stats.diverged += 1
+            return None
+        return states
+
+    def _integrate_fixed_step(self, rhs: Callable[[np.ndarray], np.ndarray], flow: FlowRHS, s0: np.ndarray,
+                              t: np.ndarray) -> np.ndarray:
+        states = np.empty((len(t), len(s0)))
+        states[0] = s = s0
+        for i in range(1, len(t)):
+            h = (t[i] - t[i - 1]) / self.n_steps
+            for _ in range(self.n_steps):
+                k1 = rhs(s)
+                if self.method == 'euler':
+                    s = s + h * k1
+                    continue
+                k2 = rhs(s + h / 2 * k1)
+                k3 = rhs(s + h / 2 * k2)
+                k4 = rhs(s + h * k3)
+                s = s + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            if flow.diverged:
+                break
+            states[i] = s
+        return states
@@ -0,0 +1,80 @@
+import functools
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    # '' marks the end of a keyword; the rest of the node maps next characters to child nodes.
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return '(?:' + pattern + ')?' if '' in node else pattern
+
+
+def compile_keywords(keywords: Iterable[str]) -> Optional["re.Pattern"]:
+    """
+    Compile keywords into a single regular expression shaped like their prefix trie.
+
+    Keywords sharing a prefix share a branch of the pattern, so a search tries each text position against the
+    trie once instead of against every keyword.
+
+    Args:
+        keywords (Iterable[str]): The keywords, already lowercased.
+
+    Returns:
+        Optional[re.Pattern]: The compiled pattern, or None if there are no keywords.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    if not trie:
+        return None
+    return re.compile(_trie_pattern(trie))
+
+
+class KeywordMatcher:
+    def __init__(self, keywords: List[str], cache_size: int = 65536):
+        """
+        Initialize the KeywordMatcher, which checks texts for keywords in a single pass.
+
+        Matching has the same semantics as `any(keyword.lower() in text.lower() for keyword in keywords)`.
+        Results are memoized per text, so the per-dimension pressure of a text only scans it once.
+
+        Args:
+            keywords (List[str]): The keywords.
+            cache_size (int): Maximum number of texts whose result is memoized.
+        """
+        self.keywords = list(keywords)
+        self.cache_size = cache_size
+        self._compile()
+
+    def _compile(self) -> None:
+        self._pattern = compile_keywords({keyword.lower() for keyword in self.keywords})
+        self.contains = functools.lru_cache(maxsize=self.cache_size)(self._search)
+
+    def _search(self, text: str) -> bool:
+        return self._pattern is not None and self._pattern.search(text.lower()) is not None
+
+    def contains(self, text: str) -> bool:
+        """
+        Check whether a text contains any of the keywords (case-insensitive substring match).
+
+        Args:
+            text (str): Input text.
+
+        Returns:
+            bool: True if at least one keyword occurs in the text.
+        """
+        return self._search(text)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The compiled pattern and the memo are rebuilt on unpickling (e.g. in worker processes).
+        return {'keywords': self.keywords, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._compile()
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import FrozenSet, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+CONCEPT_SEPARATOR = "\x00"
+# Joins the words of multi-word SenticNet concepts, e.g. 'a_lot'.
+PHRASE_SEPARATOR = "_"
+
+
+class LexiconEntry(NamedTuple):
+    """
+    Pre-resolved SenticNet entry for a single concept.
+
+    Attributes:
+        max_category (str): Category with the highest score.
+        min_category (str): Category with the lowest score.
+        max_emotion (str): Emotion label accumulated with the highest score (category + primary emotion).
+        min_emotion (str): Emotion label accumulated with the lowest score (category + secondary emotion).
+        max_score (float): Score of the max category.
+        min_score (float): Score of the min category.
+        polarity (float): Polarity intensity of the concept.
+    """
+    max_category: str
+    min_category: str
+    max_emotion: str
+    min_emotion: str
+    max_score: float
+    min_score: float
+    polarity: float
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class SenticNetLexicon:
+    def __init__(self, concepts: List[str], labels: List[str], category_ids: np.ndarray, label_ids: np.ndarray,
+                 values: np.ndarray, categories: List[str], version: Optional[str] = None):
+        """
+        Initialize the SenticNetLexicon.
+
+        The per-concept data is kept in flat arrays so that it can be memory-mapped from the on-disk cache;
+        only the concept -> row index is a Python dict.
+
+        Args:
+            concepts (List[str]): The concepts, one per row.
+            labels (List[str]): The vocabulary of emotion labels.
+            category_ids (np.ndarray): (n, 2) indices into `categories` of the max and min category.
+            label_ids (np.ndarray): (n, 2) indices into `labels` of the max and min emotion.
+            values (np.ndarray): (n, 3) max score, min score and polarity.
+            categories (List[str]): The SenticNet categories the entries were resolved against.
+            version (Optional[str]): SHA-256 of the source file, if known.
+        """
+        self.concepts = concepts
+        self.labels = labels
+        self.category_ids = category_ids
+        self.label_ids = label_ids
+        self.values = values
+        self.categories = categories
+        self.version = version
+        self.index = {concept: row for row, concept in enumerate(concepts)}
+        self._phrase_prefixes = None
+
+    @classmethod
+    def from_dataframe(cls, senticnet_data: pd.DataFrame, categories: List[str],
+                       version: Optional[str] = None) -> "SenticNetLexicon":
+        """
+        Build the lexicon index from a SenticNet dataframe.
+
+        The max/min category and the emotion labels are resolved once for every concept, with the same
+        rules previously applied per token: the first row wins for duplicated concepts, and the primary
+        (secondary) emotion is appended to the max (min) category when present.
+
+        Args:
+            senticnet_data (pd.DataFrame): The SenticNet data, as read from the TSV.
+            categories (List[str]): The SenticNet categories to score against.
+            version (Optional[str]): SHA-256 of the source file, if known.
+
+        Returns:
+            SenticNetLexicon: The indexed lexicon.
+        """
+        data = senticnet_data[senticnet_data['CONCEPT'].map(
+            lambda concept: isinstance(concept, str) and CONCEPT_SEPARATOR not in concept)]
+        data = data.drop_duplicates(subset='CONCEPT', keep='first')
+
+        scores = data[categories].astype(float)
+        scorable = scores.notna().any(axis=1)
+        if not scorable.all():
+            logging.warning(f"Skipping {int((~scorable).sum())} SenticNet concepts without any category score.")
+            data = data[scorable]
+            scores = scores[scorable]
+
+        max_categories = scores.idxmax(axis=1)
+        min_categories = scores.idxmin(axis=1)
+        category_index = {category: i for i, category in enumerate(categories)}
+        category_ids = np.column_stack([
+            max_categories.map(category_index).to_numpy(dtype=np.int8),
+            min_categories.map(category_index).to_numpy(dtype=np.int8),
+        ])
+
+        labels = {}
+        label_ids = np.empty((len(data), 2), dtype=np.int32)
+        for row, (max_category, min_category, primary_emotion, secondary_emotion) in enumerate(zip(
+                max_categories, min_categories, data['PRIMARY EMOTION'], data['SECONDARY EMOTION'])):
+            max_emotion = max_category if pd.isna(primary_emotion) else f"{max_category}{primary_emotion}"
+            min_emotion = min_category if pd.isna(secondary_emotion) else f"{min_category}{secondary_emotion}"
+            label_ids[row, 0] = labels.setdefault(max_emotion, len(labels))
+            label_ids[row, 1] = labels.setdefault(min_emotion, len(labels))
+
+        score_matrix = scores.to_numpy(dtype=np.float64)
+        rows = np.arange(len(data))
+        values = np.column_stack([
+            score_matrix[rows, category_ids[:, 0]],
+            score_matrix[rows, category_ids[:, 1]],
+            data['POLARITY INTENSITY'].astype(float).to_numpy(dtype=np.float64),
+        ])
+        return cls(data['CONCEPT'].tolist(), list(labels), category_ids, label_ids, values, categories, version)
+
+    @classmethod
+    def from_tsv(cls, senticnet_path: str, categories: List[str]) -> "SenticNetLexicon":
+        """
+        Read a SenticNet TSV file and build the lexicon index.
+
+        Args:
+            senticnet_path (str): The path to the SenticNet data.
+            categories (List[str]): The SenticNet categories to score against.
+
+        Returns:
+            SenticNetLexicon: The indexed lexicon.
+        """
+        return cls.from_dataframe(pd.read_csv(senticnet_path, delimiter="\t"), categories,
+                                  version=_file_sha256(Path(senticnet_path)))
+
+    @classmethod
+    def load(cls, senticnet_path: str, categories: List[str], cache_dir: Optional[str] = None) -> "SenticNetLexicon":
+        """
+        Load the lexicon from its compiled cache, building the cache from the TSV on first use.
+
+        The cache is a directory of `.npy` arrays plus the concept list and a `meta.json` describing the
+        source file. It is rebuilt when the source file's size/mtime change and its SHA-256 no longer matches.
+        The arrays are memory-mapped read-only, so worker processes on the same host share the same pages.
+
+        Args:
+            senticnet_path (str): The path to the SenticNet data.
+            categories (List[str]): The SenticNet categories to score against.
+            cache_dir (Optional[str]): Where to keep the compiled lexicon. Defaults to a
+                `.sentimentflow_cache/<file name>` directory next to the TSV.
+
+        Returns:
+            SenticNetLexicon: The indexed lexicon.
+        """
+        source = Path(senticnet_path)
+        cache_path = Path(cache_dir) if cache_dir is not None else source.parent / '.sentimentflow_cache' / source.name
+
+        lexicon = cls._load_cache(cache_path, source, categories)
+        if lexicon is not None:
+            return lexicon
+
+        logging.info(f"Compiling SenticNet lexicon {source} into {cache_path}")
+        lexicon = cls.from_tsv(senticnet_path, categories)
+        try:
+            lexicon._save_cache(cache_path, source)
+        except OSError as e:
+            logging.warning(f"Could not write the lexicon cache to {cache_path}: {e}")
+            return lexicon
+        return cls._load_cache(cache_path, source, categories) or lexicon
+
+    @classmethod
+    def _load_cache(cls, cache_path: Path, source: Path, categories: List[str]) -> Optional["SenticNetLexicon"]:
+        try:
+            meta = json.loads((cache_path / 'meta.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('format') != CACHE_FORMAT_VERSION or meta.get('categories') != categories:
+            return None
+        stat = source.stat()
+        touched = (meta['size'], meta['mtime_ns']) != (stat.st_size, stat.st_mtime_ns)
+        if touched and (meta['size'] != stat.st_size or meta['sha256'] != _file_sha256(source)):
+            return None
+
+        try:
+            concepts_blob = (cache_path / 'concepts.txt').read_text(encoding='utf-8')
+            concepts = concepts_blob.split(CONCEPT_SEPARATOR) if concepts_blob else []
+            category_ids = np.load(cache_path / 'category_ids.npy', mmap_mode='r')
+            label_ids = np.load(cache_path / 'label_ids.npy', mmap_mode='r')
+            values = np.load(cache_path / 'values.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if not len(concepts) == len(category_ids) == len(label_ids) == len(values):
+            return None
+        if touched:
+            # The file was touched but not changed: record its new mtime so the next load skips the hash.
+            meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            try:
+                _atomic_write(cache_path / 'meta.json', lambda f: f.write(json.dumps(meta).encode('utf-8')))
+            except OSError as e:
+                logging.warning(f"Could not update the lexicon cache metadata in {cache_path}: {e}")
+        return cls(concepts, meta['labels'], category_ids, label_ids, values, categories, meta['sha256'])
+
+    def _save_cache(self, cache_path: Path, source: Path) -> None:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        stat = source.stat()
+        meta = {
+            'format': CACHE_FORMAT_VERSION,
+            'source': str(source.resolve()),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': self.version or _file_sha256(source),
+            'categories': self.categories,
+            'labels': self.labels,
+        }
+        _atomic_write(cache_path / 'concepts.txt', lambda f: f.write(CONCEPT_SEPARATOR.join(self.concepts).encode('utf-8')))
+        _atomic_write(cache_path / 'category_ids.npy', lambda f: np.save(f, np.ascontiguousarray(self.category_ids)))
+        _atomic_write(cache_path / 'label_ids.npy', lambda f: np.save(f, np.ascontiguousarray(self.label_ids)))
+        _atomic_write(cache_path / 'values.npy', lambda f: np.save(f, np.ascontiguousarray(self.values)))
+        # meta.json goes last: its presence marks a complete cache.
+        _atomic_write(cache_path / 'meta.json', lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+    def get(self, concept: str) -> Optional[LexiconEntry]:
+        """
+        Look up a concept.
+
+        Args:
+            concept (str): The concept, lowercased.
+
+        Returns:
+            Optional[LexiconEntry]: The resolved entry, or None if the concept is not in SenticNet.
+        """
+        row = self.index.get(concept)
+        if row is None:
+            return None
+        max_category, min_category = self.category_ids[row].tolist()
+        max_label, min_label = self.label_ids[row].tolist()
+        max_score, min_score, polarity = self.values[row].tolist()
+        return LexiconEntry(
+            self.categories[max_category], self.categories[min_category],
+            self.labels[max_label], self.labels[min_label],
+            max_score, min_score, polarity
+        )
+
+    @property
+    def phrase_prefixes(self) -> FrozenSet[str]:
+        """
+        Every proper word prefix of the multi-word concepts (e.g. 'a' and 'a_lot' for 'a_lot_of'), built on first
+        access.
+
+        Returns:
+            FrozenSet[str]: The prefixes, joined with `PHRASE_SEPARATOR`.
+        """
+        if self._phrase_prefixes is None:
+            prefixes = set()
+            for concept in self.concepts:
+                end = concept.find(PHRASE_SEPARATOR)
+                while end != -1:
+                    prefixes.add(concept[:end])
+                    end = concept.find(PHRASE_SEPARATOR, end + 1)
+            self._phrase_prefixes = frozenset(prefixes)
+        return self._phrase_prefixes
+
+    def match_phrase(self, words: Sequence[str], start: int) -> int:
+        """
+        Find the longest concept made of consecutive words starting at `words[start]`.
+
+        The words are only extended while they form the prefix of a multi-word concept, so most lookups stop
+        after the first word.
+
+        Args:
+            words (Sequence[str]): The lowercased words of a sentence.
+            start (int): The position of the first word.
+
+        Returns:
+            int: The number of words in the longest matching concept, or 0 if none starts there.
+        """
+        prefixes = self.phrase_prefixes
+        phrase = words[start]
+        longest = 1 if phrase in self.index else 0
+        end = start + 1
+        while phrase in prefixes and end < len(words):
+            phrase = phrase + PHRASE_SEPARATOR + words[end]
+            end += 1
+            if phrase in self.index:
+                longest = end - start
+        return longest
+
+    def __contains__(self, concept: str) -> bool:
+        return concept in self.index
+
+    def __len__(self) -> int:
+        return len(self.concepts)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.concepts)
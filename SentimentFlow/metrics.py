@@ -0,0 +1,293 @@
+import bisect
+import contextlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds, in seconds, of the histogram buckets of stage timings.
+DEFAULT_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        """
+        Initialize the Histogram, which counts observations per bucket and keeps their sum.
+
+        Args:
+            buckets (Sequence[float]): The sorted upper bounds of the buckets; larger values go to +Inf.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets.")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        The cumulative bucket counts, as Prometheus reports them.
+
+        Returns:
+            List[Tuple[str, int]]: ('le' bound, number of observations up to it) pairs, ending with '+Inf'.
+        """
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        total = 0
+        cumulative = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Metrics:
+    def __init__(self, namespace: str = 'sentimentflow', buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Initialize the Metrics registry, which collects counters and histograms of a processing pipeline.
+
+        Recording a value is a dictionary update under a lock, cheap enough to leave on in production. Stage
+        timings are histograms of seconds labelled with the stage, e.g. `stage_seconds{stage="tokenize"}`.
+
+        Args:
+            namespace (str): Prefix of the exported metric names.
+            buckets (Sequence[float]): Upper bounds of the histogram buckets.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.listeners: List[Callable[[str, str, float, Dict[str, str]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[str, str, float, Dict[str, str]], None]) -> None:
+        """
+        Call a function on every recorded value, e.g. to forward it to another monitoring system.
+
+        Args:
+            listener (Callable[[str, str, float, Dict[str, str]], None]): Called with the kind ('counter' or
+                'histogram'), the metric name, the value and the labels.
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, kind: str, name: str, value: float, labels: Dict[str, str]) -> None:
+        for listener in self.listeners:
+            listener(kind, name, value, labels)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        Add to a counter.
+
+        Args:
+            name (str): The counter, e.g. 'tokens_total'.
+            value (float): The amount to add.
+            **labels (str): The labels of the series.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if self.listeners:
+            self._notify('counter', name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record a value in a histogram.
+
+        Args:
+            name (str): The histogram, e.g. 'stage_seconds'.
+            value (float): The observed value.
+            **labels (str): The labels of the series.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+        if self.listeners:
+            self._notify('histogram', name, value, labels)
+
+    def update(self, counters: Optional[Dict[str, float]] = None, timings: Optional[Dict[str, float]] = None) -> None:
+        """
+        Add to several unlabelled counters and record several stage timings at once, for hot loops.
+
+        Args:
+            counters (Optional[Dict[str, float]]): Amounts to add, by counter.
+            timings (Optional[Dict[str, float]]): Durations in seconds, by stage.
+        """
+        with self._lock:
+            for name, value in (counters or {}).items():
+                key = (name, ())
+                self.counters[key] = self.counters.get(key, 0) + value
+            for stage, seconds in (timings or {}).items():
+                key = ('stage_seconds', (('stage', stage),))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.buckets)
+                histogram.observe(seconds)
+        if self.listeners:
+            for name, value in (counters or {}).items():
+                self._notify('counter', name, value, {})
+            for stage, seconds in (timings or {}).items():
+                self._notify('histogram', 'stage_seconds', seconds, {'stage': stage})
+
+    def record_time(self, stage: str, seconds: float) -> None:
+        """
+        Record the duration of one run of a stage.
+
+        Args:
+            stage (str): The stage, e.g. 'tokenize' or 'solver'.
+            seconds (float): The duration.
+        """
+        self.observe('stage_seconds', seconds, stage=stage)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Time the body of a `with` statement as one run of a stage.
+
+        Args:
+            stage (str): The stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(stage, time.perf_counter() - start)
+
+    def timed(self, iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+        """
+        Time how long an iterable takes to produce each of its items.
+
+        Args:
+            iterable (Iterable[Any]): E.g. a lazy spaCy pipe.
+            stage (str): The stage.
+
+        Returns:
+            Iterator[Any]: The items.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record_time(stage, time.perf_counter() - start)
+            yield item
+
+    def merge(self, other: "Metrics") -> None:
+        """
+        Add the values of another registry, e.g. one filled in a worker process.
+
+        Args:
+            other (Metrics): The registry to add.
+        """
+        with self._lock:
+            for key, value in other.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, histogram in other.histograms.items():
+                if key in self.histograms:
+                    self.histograms[key].merge(histogram)
+                else:
+                    self.histograms[key] = Histogram(histogram.buckets)
+                    self.histograms[key].merge(histogram)
+
+    def reset(self) -> None:
+        """Drop every recorded value."""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def counter(self, name: str, **labels: str) -> float:
+        """
+        Read a counter.
+
+        Args:
+            name (str): The counter.
+            **labels (str): The labels of the series.
+
+        Returns:
+            float: Its value, 0 if nothing was recorded.
+        """
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        """
+        Read a histogram.
+
+        Args:
+            name (str): The histogram.
+            **labels (str): The labels of the series.
+
+        Returns:
+            Optional[Histogram]: The histogram, or None if nothing was recorded.
+        """
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Export the metrics as JSON-serializable data.
+
+        Returns:
+            Dict[str, Any]: 'counters' and 'histograms', each a list of series with their name and labels.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                           'buckets': dict(histogram.cumulative())}
+                          for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict())
+
+    def to_prometheus(self) -> str:
+        """
+        Export the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        def series(name: str, labels: Labels, value: float, extra: Labels = ()) -> str:
+            pairs = ','.join(f'{key}="{label}"' for key, label in labels + extra)
+            return f"{self.namespace}_{name}{{{pairs}}} {value!r}" if pairs else f"{self.namespace}_{name} {value!r}"
+
+        data = self.as_dict()
+        lines = []
+        for kind, samples in (('counter', data['counters']), ('histogram', data['histograms'])):
+            for i, sample in enumerate(samples):
+                name = sample['name']
+                labels = tuple(sample['labels'].items())
+                if i == 0 or samples[i - 1]['name'] != name:
+                    lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+                if kind == 'counter':
+                    lines.append(series(name, labels, sample['value']))
+                    continue
+                for bound, count in sample['buckets'].items():
+                    lines.append(series(f"{name}_bucket", labels, count, (('le', bound),)))
+                lines.append(series(f"{name}_sum", labels, sample['sum']))
+                lines.append(series(f"{name}_count", labels, sample['count']))
+        return '\n'.join(lines) + '\n'
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Listeners and the lock stay in the process that created them.
+        return {'namespace': self.namespace, 'buckets': self.buckets, 'counters': self.counters,
+                'histograms': self.histograms}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.listeners = []
+        self._lock = threading.Lock()
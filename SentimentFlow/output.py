@@ -0,0 +1,119 @@
+import concurrent.futures
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+
+from SentimentFlow.sinks import BackgroundSink, NullSink, ResultSink, open_sink
+from SentimentFlow.streaming import write_csv_atomic
+
+DEFAULT_RESULTS_DIR = 'results'
+
+
+class OutputPolicy:
+    def __init__(self, directory: Optional[Union[str, Path]] = DEFAULT_RESULTS_DIR, background: bool = False):
+        """
+        Initialize the OutputPolicy, which decides where the processor and the calculator write their results.
+
+        - `OutputPolicy()` keeps the original behaviour: the files go to `results/`;
+        - `OutputPolicy('runs/worker-3')` writes them to another directory, e.g. one per worker, so that
+          concurrent runs never write the same files;
+        - `OutputPolicy.memory()` writes nothing: the results are only returned.
+
+        Files are written atomically, through a temporary file that replaces them, so a reader never sees a
+        partially written file. With `background=True` the writes happen on a writer thread and the calls return
+        as soon as the results are computed; `wait()` blocks until they are on disk.
+
+        Args:
+            directory (Optional[Union[str, Path]]): Where the files are written, or None to write nothing.
+            background (bool): Write on a background thread.
+        """
+        self.directory = None if directory is None else Path(directory)
+        self.background = background
+        self._writer = None
+        self._pending: List[concurrent.futures.Future] = []
+
+    @classmethod
+    def memory(cls) -> "OutputPolicy":
+        """The policy of callers that only use the returned results, such as services."""
+        return cls(None)
+
+    def path(self, name: str) -> Optional[Path]:
+        """
+        The path of a result file.
+
+        Args:
+            name (str): The file name, e.g. 'processed_texts.csv'.
+
+        Returns:
+            Optional[Path]: Its path in the directory, or None if nothing is written.
+        """
+        return None if self.directory is None else self.directory / name
+
+    def write_frame(self, frame: pd.DataFrame, name: str) -> None:
+        """
+        Write a DataFrame as CSV, without its index.
+
+        Args:
+            frame (pd.DataFrame): The rows to write. In the background, a copy is written, so the caller can
+                keep using the frame.
+            name (str): The file name in the directory.
+        """
+        path = self.path(name)
+        if path is None:
+            return
+        logging.info(f"Saving results to {path}")
+        if not self.background:
+            write_csv_atomic(path, frame)
+            return
+        if self._writer is None:
+            self._writer = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='sentimentflow-output')
+        self._pending = [future for future in self._pending if not future.done() or future.exception()]
+        self._pending.append(self._writer.submit(write_csv_atomic, path, frame.copy()))
+
+    def open_sink(self, name: str) -> ResultSink:
+        """
+        Open the sink of a calculator run.
+
+        Args:
+            name (str): The file or directory name in the directory; see `sinks.open_sink`.
+
+        Returns:
+            ResultSink: A `NullSink` if nothing is written, the sink of the path otherwise.
+        """
+        path = self.path(name)
+        if path is None:
+            return NullSink()
+        logging.info(f"Saving results to {path}")
+        return self.wrap(open_sink(str(path)))
+
+    def wrap(self, sink: ResultSink) -> ResultSink:
+        """
+        Move the writes of a sink to a background thread if the policy asks for it.
+
+        Args:
+            sink (ResultSink): The sink.
+
+        Returns:
+            ResultSink: The sink, or a `BackgroundSink` around it.
+        """
+        return BackgroundSink(sink) if self.background else sink
+
+    def wait(self) -> None:
+        """
+        Block until the background writes of DataFrames are done.
+
+        Raises:
+            Exception: The error of the first write that failed.
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The writer thread and its pending writes stay in the process that started them.
+        return {'directory': self.directory, 'background': self.background}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
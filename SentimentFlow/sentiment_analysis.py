@@ -1,28 +1,102 @@
-import csv
-import json
-from pathlib import Path
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from scipy.integrate import odeint
-from tqdm.auto import tqdm
 import logging
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
 
 
+from SentimentFlow.cache import CacheStats, DocumentCache, cache_key, decode_array, encode_array
+from SentimentFlow.emotion_matrix import EmotionMatrix, dense_rows
+from SentimentFlow.integrators import FlowIntegrator, IntegrationStats
+from SentimentFlow.keyword_matcher import KeywordMatcher
+from SentimentFlow.metrics import Metrics
+from SentimentFlow.output import OutputPolicy
 from SentimentFlow.senti_keywords import keywords_example
+from SentimentFlow.sinks import ResultSink, open_sink
+from SentimentFlow.solver import FALLBACK_NORM, integrate_batch, pressure_terms
+from SentimentFlow.state import SpeakerState, SpeakerStateStore
+
+# Part of the flow cache keys; bump it when the flow changes so that cached trajectories are recomputed.
+FLOW_CACHE_VERSION = 1
+# Cached value of a flow that diverged.
+_DIVERGED = b''
+
+TEXT_RESULTS_NAME = 'navier_stocker_text_results.json'
+SPEECH_RESULTS_NAME = 'navier_stocker_speeches_results.json'
+
+_worker_calculator = None
+
+
+def _init_speaker_worker(calculator: "SentimentFlowCalculator") -> None:
+    global _worker_calculator
+    _worker_calculator = calculator
+
+
+def _simulate_speaker_task(task: Tuple[Any, ...]) -> Tuple[Any, Dict[str, Any], SpeakerState, Dict[str, Any]]:
+    # Each task reports its own integration work, metrics, diverged speeches and cache lookups for the parent to add up.
+    calculator = _worker_calculator
+    calculator._start_run()
+    calculator.metrics.reset()
+    if calculator.cache is not None:
+        calculator.cache.stats = CacheStats()
+    title, result, state = calculator._simulate_speaker(*task)
+    report = {'stats': calculator.integrator.stats, 'diverged': calculator.diverged, 'metrics': calculator.metrics}
+    if calculator.cache is not None:
+        calculator.cache.flush()
+        report['cache'] = calculator.cache.stats
+    return title, result, state, report
+
+
 class SentimentFlowCalculator:
-    def __init__(self):
+    def __init__(self, keywords: Optional[List[str]] = None, integrator: Optional[FlowIntegrator] = None,
+                 on_divergence: str = 'skip', cache: Optional[DocumentCache] = None,
+                 metrics: Optional[Metrics] = None, output: Optional[OutputPolicy] = None,
+                 resolution: Union[str, int] = 'full', dtype: Union[str, np.dtype] = 'float64'):
         """
         Initialize the SentimentFlowCalculator.
 
         Args:
-            keywords (List[str]): List of keywords.
+            keywords (List[str]): List of keywords. Defaults to `keywords_example`.
+            integrator (Optional[FlowIntegrator]): The ODE integrator of the per-text and per-speaker flows.
+                Defaults to `odeint` with its default settings.
+            on_divergence (str): What to do when the flow of a text or speech stops being finite: `'skip'` logs
+                it, records it in `diverged` and leaves it out of the results (a speaker's later speeches are
+                left out too, since they start from the diverged state); `'raise'` raises a ValueError.
+            cache (Optional[DocumentCache]): Persistent cache of trajectories, keyed by the initial state, the
+                flow parameters and the integrator settings. Flows found in it are not integrated again.
+            metrics (Optional[Metrics]): Where the stage timings ('solver', 'serialization') and the
+                'solver_failures_total' and 'nan_skips_total' counters are recorded. Defaults to a new registry.
+            output (Optional[OutputPolicy]): Where the results go when the calculate methods get no `sink`, and
+                whether sinks are written on a background thread. Defaults to JSON files in `results/`; pass
+                `OutputPolicy.memory()` to only return the results.
+            resolution (Union[str, int]): Which states of every flow are kept in the results. `'full'` keeps the
+                start and the end state of every unit step; `'final'` only the last state; an integer k the states
+                at every k-th time point, plus the last one. The flows are integrated the same way in all cases.
+            dtype (Union[str, np.dtype]): The dtype the kept states are stored in, `'float64'` or `'float32'`. The
+                flows are always integrated in float64.
         """
-        self.keywords = keywords_example
+        if on_divergence not in ('skip', 'raise'):
+            raise ValueError("on_divergence must be 'skip' or 'raise'.")
+        if resolution not in ('full', 'final') and not (isinstance(resolution, (int, np.integer))
+                                                        and not isinstance(resolution, bool) and resolution >= 1):
+            raise ValueError("resolution must be 'full', 'final' or a positive integer.")
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64.")
+        self.keywords = keywords_example if keywords is None else keywords
+        self.keyword_matcher = KeywordMatcher(self.keywords)
+        self.integrator = FlowIntegrator() if integrator is None else integrator
+        self.on_divergence = on_divergence
+        self.cache = cache
+        self.metrics = Metrics() if metrics is None else metrics
+        self.output = OutputPolicy() if output is None else output
+        self.resolution = resolution
+        self.dtype = np.dtype(dtype)
+        self.diverged = []
 
     @staticmethod
     def _calculate_sentiment_density(sentiment_scores: np.ndarray) -> float:
@@ -49,10 +123,35 @@ class SentimentFlowCalculator:
             float: Sentiment pressure.
         """
         pressure = 0
-        if any(keyword.lower() in text.lower() for keyword in self.keywords):
+        if self._contains_keyword(text):
             pressure += score
         return pressure
 
+    def _contains_keyword(self, text: str) -> bool:
+        """
+        Check whether a text contains any of the keywords (case-insensitive substring match).
+
+        Args:
+            text (str): Input text.
+
+        Returns:
+            bool: True if at least one keyword occurs in the text.
+        """
+        return self.keyword_matcher.contains(text)
+
+    def _calculate_sentiment_pressures(self, sentiment_scores: np.ndarray, text: str) -> np.ndarray:
+        """
+        Calculate the sentiment pressure of every emotion dimension, scanning the text for keywords once.
+
+        Args:
+            sentiment_scores (np.ndarray): Array of sentiment scores.
+            text (str): Input text.
+
+        Returns:
+            np.ndarray: Sentiment pressures, as `_calculate_sentiment_pressure` gives for each score.
+        """
+        return np.where(self._contains_keyword(text), np.asarray(sentiment_scores, dtype=float), 0.0)
+
     @staticmethod
     def _calculate_sentiment_viscosity(sentiment_scores: np.ndarray) -> float:
         """
@@ -139,149 +238,564 @@ class SentimentFlowCalculator:
 
         return dsdt
 
-    def calculate_navier_stocker_for_speeches(self, data: pd.DataFrame) -> Dict[str, List[Dict[str, Any]]]:
+    def _integrate(self, s0: np.ndarray, t: np.ndarray,
+                   speech_info: Tuple[float, np.ndarray, float, float]) -> Optional[np.ndarray]:
         """
-        Calculate the Navier-Stokes sentiment flow for each speech in a DataFrame.
+        Integrate the sentiment flow of one state with the configured integrator.
 
         Args:
-            data (pd.DataFrame): DataFrame containing 'title', 'speaker', 'speech', and emotion columns.
+            s0 (np.ndarray): Initial sentiment state.
+            t (np.ndarray): Time points.
+            speech_info (Tuple[float, np.ndarray, float, float]): Sentiment density, pressure, viscosity, and contextual force.
 
         Returns:
-            Dict[str, List[Dict[str, Any]]]: Dictionary with simulation results.
+            Optional[np.ndarray]: The sentiment states at the time points, or None if the flow diverged.
+
+        Raises:
+            ValueError: If the flow diverged and `on_divergence` is `'raise'`.
         """
-        all_s = {}
-        sentiment_columns = data.columns.difference(['title', 'speaker', 'speech', 'POLARITY'])
+        rho_sent, p_sent, nu_sent, g_context = speech_info
+        if self.cache is not None:
+            key = cache_key('flow', FLOW_CACHE_VERSION, self.integrator.config, np.asarray(s0, dtype=float),
+                            np.asarray(t, dtype=float), np.asarray(p_sent, dtype=float),
+                            np.array([rho_sent, nu_sent, g_context], dtype=float))
+            cached = self.cache.get(key)
+            if cached is not None:
+                if cached == _DIVERGED and self.on_divergence == 'raise':
+                    raise ValueError("Invalid sentiment flow calculation")
+                return None if cached == _DIVERGED else decode_array(cached)
+
+        pressure_term = pressure_terms(np.array([rho_sent], dtype=float), np.asarray(p_sent, dtype=float)[None])[0]
+        with self.metrics.timer('solver'):
+            if self.on_divergence == 'raise':
+                states = self.integrator.integrate(s0, t, pressure_term, nu_sent, g_context)
+            else:
+                states = self.integrator.try_integrate(s0, t, pressure_term, nu_sent, g_context)
+        if states is None:
+            self.metrics.increment('solver_failures_total')
+        if self.cache is not None:
+            self.cache.put(key, _DIVERGED if states is None else encode_array(states))
+        return states
+
+    def _skip_diverged(self, key: Any, description: str) -> None:
+        logging.warning(f"Sentiment flow diverged for {description}; skipping it.")
+        self.diverged.append(key)
+
+    def _start_run(self) -> None:
+        self.integrator.stats = IntegrationStats()
+        self.diverged = []
+
+    def _merge_worker_report(self, report: Dict[str, Any]) -> None:
+        self.integrator.stats += report['stats']
+        self.diverged.extend(report['diverged'])
+        self.metrics.merge(report['metrics'])
+        if 'cache' in report:
+            self.cache.stats += report['cache']
+
+    def _log_integration_stats(self) -> None:
+        logging.info(f"Integration work: {self.integrator.stats.as_dict()}")
+        if self.cache is not None:
+            self.cache.flush()
+            logging.info(f"Flow cache: {self.cache.stats.as_dict()}")
+        if self.diverged:
+            logging.warning(f"Skipped {len(self.diverged)} diverged flows; see `diverged`.")
+
+    def _open_sink(self, sink: Union[str, ResultSink, None], default_name: str) -> Tuple[ResultSink, bool]:
+        """
+        Resolve the `sink` argument of the calculate methods.
 
-        logging.info("Starting to calculate Navier-Stocker ...")
-        for speaker in tqdm(data['speaker'].unique(),total=len(data['speaker']), desc="Calculating Navier-Stocker for speeches"):
-            speaker_data = data[data['speaker'] == speaker]
-            title = speaker_data.iloc[0]['title']
-            initial_speaker = speaker_data.iloc[0]
-            s0 = initial_speaker[sentiment_columns].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy()
-            s0_g_context = self._calculate_external_contextual_force(initial_speaker['POLARITY'])
-            initial_speech = initial_speaker['speech']
-            current_time = 0
-            all_results = []
-            unique_all_results = []
-
-            for i in range(1, len(speaker_data)):
-                current_speech_data = speaker_data.iloc[i]
-                if i == 1:
-                    g_context = s0_g_context
-                    current_speech = initial_speech
-                else:
-                    g_context = self._calculate_external_contextual_force(current_speech_data['POLARITY'])
-                    current_speech = current_speech_data['speech']
-
-                t = np.array([current_time, current_time + 1])
-                speech_info = (
-                    self._calculate_sentiment_density(s0),
-                    np.array([self._calculate_sentiment_pressure(score, current_speech) for score in s0]),
-                    self._calculate_sentiment_viscosity(s0),
-                    g_context
+        Returns:
+            Tuple[ResultSink, bool]: The sink, and whether it was opened here (and must be closed here).
+        """
+        if isinstance(sink, ResultSink):
+            return sink, False
+        if sink is None:
+            return self.output.open_sink(default_name), True
+        logging.info(f"Saving results to {sink}")
+        return self.output.wrap(open_sink(sink)), True
+
+    def _close_sink(self, sink: ResultSink, owns_sink: bool) -> None:
+        # Close the sink if it was opened here, flush it otherwise; called from `finally`, so also after errors.
+        with self.metrics.timer('serialization'):
+            if owns_sink:
+                sink.close()
+            else:
+                sink.flush()
+
+    def _add_result(self, all_s: Dict[Any, List[Dict[str, Any]]], sink: ResultSink, key: Any,
+                    record: Dict[str, Any]) -> None:
+        all_s.setdefault(key, []).append(record)
+        with self.metrics.timer('serialization'):
+            sink.write(key, record)
+
+    def keep_states(self, states: np.ndarray, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select and convert the states of a flow that are kept in the results, following `resolution` and `dtype`.
+
+        Args:
+            states (np.ndarray): The (rows, d) states of the unit steps, two rows (start and end) per step.
+            times (np.ndarray): The time of every row.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The kept states and their times.
+        """
+        if self.resolution == 'full' or len(states) == 0:
+            keep = slice(None)
+        elif self.resolution == 'final':
+            keep = slice(-1, None)
+        else:
+            # The start of every step after the first repeats the end of the previous one.
+            point = np.concatenate([[True], times[1:] != times[:-1]])
+            keep = point & (times % self.resolution == 0)
+            keep[-1] = True
+        return states[keep].astype(self.dtype, copy=False), times[keep]
+
+    def _check_vectorized(self) -> None:
+        """
+        Make sure the vectorized solver gives the results the calculator's integrator would.
+
+        Raises:
+            ValueError: If the integrator is not the default one, whose `odeint` the vectorized solver falls back
+                to for the flows that blow up.
+        """
+        if self.integrator.config != FlowIntegrator().config:
+            raise ValueError("The vectorized solver only matches the default integrator; use vectorized=False "
+                             "with a custom integrator.")
+
+    def _integrate_batch(self, s0: np.ndarray, has_keyword: np.ndarray, g_context: np.ndarray,
+                         t: np.ndarray) -> np.ndarray:
+        """
+        Integrate a batch of text flows with the vectorized solver, looking them up in the cache first.
+
+        Args:
+            s0 (np.ndarray): Initial states, shape (n, d).
+            has_keyword (np.ndarray): Whether each text contains a keyword, shape (n,).
+            g_context (np.ndarray): External contextual force of each text, shape (n,).
+            t (np.ndarray): Time points.
+
+        Returns:
+            np.ndarray: The trajectories, shape (len(t), n, d); rows of diverged flows are NaN.
+        """
+        def integrate(rows: np.ndarray) -> np.ndarray:
+            with self.metrics.timer('solver'):
+                return integrate_batch(
+                    s0[rows],
+                    np.sum(np.abs(s0[rows]), axis=1),
+                    np.where(has_keyword[rows, None], s0[rows], 0.0),
+                    np.std(s0[rows], axis=1),
+                    g_context[rows],
+                    t,
+                    on_divergence=self.on_divergence
                 )
-                s = odeint(self._differential_equation, s0, t, args=(speech_info,))
 
-                for sim_result in s.tolist():
-                    all_results.append((sim_result, current_speech))
+        if self.cache is None:
+            return integrate(np.arange(len(s0)))
+
+        # The pressure, density and viscosity are functions of the initial state and the keyword flag.
+        # The fallback threshold is part of the key, since it decides which flows are integrated with odeint.
+        keys = [cache_key('flow-batched', FLOW_CACHE_VERSION, FALLBACK_NORM, s0[i], bool(has_keyword[i]),
+                          float(g_context[i]), np.asarray(t, dtype=float)) for i in range(len(s0))]
+        cached = self.cache.get_many(keys)
+        trajectories = np.empty((len(t),) + s0.shape)
+        missing = []
+        for i, key in enumerate(keys):
+            value = cached.get(key)
+            if value is None:
+                missing.append(i)
+            elif value == _DIVERGED:
+                if self.on_divergence == 'raise':
+                    raise ValueError("Invalid sentiment flow calculation")
+                trajectories[:, i] = np.nan
+            else:
+                trajectories[:, i] = decode_array(value)
+        if missing:
+            computed = integrate(np.array(missing))
+            for offset, i in enumerate(missing):
+                states = computed[:, offset]
+                trajectories[:, i] = states
+                self.cache.put(keys[i], _DIVERGED if np.isnan(states).any() else encode_array(states))
+        return trajectories
+
+    def integrate_texts(self, states: np.ndarray, texts: Sequence[str], polarity: Sequence[float]) -> np.ndarray:
+        """
+        Integrate the flows of a batch of texts over a unit of time with the vectorized solver, in memory.
 
-                s0 = s[-1]
-                current_time += 1
+        This is the core of the vectorized texts path, without progress bars, logging or sinks, for callers that
+        score small batches online.
 
-            simulation_results, speeches = zip(*unique_all_results) if unique_all_results else ([], [])
-            simulation_results = np.vstack(simulation_results) if simulation_results else np.array([])
+        Args:
+            states (np.ndarray): The (n, d) initial states, the texts' scores over the emotion dimensions.
+            texts (Sequence[str]): The n texts, whose keywords set the pressure.
+            polarity (Sequence[float]): The n polarities.
 
-            if title not in all_s:
-                all_s[title] = []
-            all_s[title].append({
-                'speaker': speaker,
-                'speech': speeches,
-                'simulation': simulation_results,
-                'emotion dimension': sentiment_columns
-            })
-        logging.info("Finished calculating speeches.")
-        logging.info(f"Processed {len(all_s)} speeches.")
+        Returns:
+            np.ndarray: The (2, n, d) trajectories; rows of diverged flows are NaN.
 
-        # Debug: Save the results to a CSV for inspection
-        logging.info("Saving results to results/navier_stocker_speeches_results.json")
-        Path("results/navier_stocker_speeches_results.json").parent.mkdir(parents=True, exist_ok=True)
-        processed_df = pd.DataFrame(all_s)
-        # Save the DataFrame to a JSON file
-        json_file_path = 'results/navier_stocker_text_results.json'
-        processed_df.to_json(json_file_path, orient='records', lines=True, indent=4)
-        #all_s_df = pd.DataFrame.from_dict(all_s, orient='index')
-        #all_s_df.to_csv('results/navier_stocker_speeches_results.csv', index=False)
-        return all_s
+        Raises:
+            ValueError: If the calculator's integrator is not the default one, or a flow diverged and
+                `on_divergence` is `'raise'`.
+        """
+        self._check_vectorized()
+        g_context = np.array([self._calculate_external_contextual_force(value) for value in polarity], dtype=float)
+        has_keyword = np.array([self._contains_keyword(text) for text in texts], dtype=bool)
+        return self._integrate_batch(np.asarray(states, dtype=float), has_keyword, g_context, np.array([0, 1]))
 
-    def calculate_navier_stocker_for_texts(self, data: pd.DataFrame) -> Dict[int, List[Dict[str, Any]]]:
+    def _text_arrays(self, data: Union[pd.DataFrame, EmotionMatrix]) -> Tuple[pd.Index, List[str], pd.Index, Any, np.ndarray]:
         """
-        Calculate the Navier-Stokes sentiment flow for each text in a DataFrame with 'text' and emotion columns.
+        Extract what the text flows need from processed texts, without iterating over DataFrame rows.
 
         Args:
-            data (pd.DataFrame): DataFrame containing 'text' and emotion columns.
+            data (Union[pd.DataFrame, EmotionMatrix]): The processed texts.
 
         Returns:
-            Dict[int, List[Dict[str, Any]]]: Dictionary with simulation results.
+            Tuple[pd.Index, List[str], pd.Index, Any, np.ndarray]: The index, the texts, the emotion dimensions,
+            the (texts, dimensions) initial states (dense, or sparse for an EmotionMatrix) and the polarities.
         """
-        all_s = {}
+        if isinstance(data, EmotionMatrix):
+            sentiment_columns = pd.Index(data.active_columns())
+            states = data.select(sentiment_columns)
+            polarity = data.column('POLARITY')
+            return data.metadata.index, data.metadata['text'].tolist(), sentiment_columns, states, polarity
         sentiment_columns = data.columns.difference(['text'])
-        logging.info("Starting to calculate Navier-Stocker...")
-        for idx, text_row in tqdm(data.iterrows(), total=data.shape[0], desc="Calculating Navier-Stocker for texts"):
-            text = text_row['text']
-            s0 = text_row[sentiment_columns].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy()
-            s0_g_context = self._calculate_external_contextual_force(text_row['POLARITY'])
-            current_time = 0
-            all_results = []
+        states = data[sentiment_columns].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+        polarity = data['POLARITY'].to_numpy()
+        return data.index, data['text'].tolist(), sentiment_columns, states, polarity
+
+    def _simulate_text(self, all_s: Dict[Any, List[Dict[str, Any]]], sink: ResultSink, idx: Any, text: str,
+                       s0: np.ndarray, polarity: float, sentiment_columns: pd.Index) -> None:
+        """
+        Simulate the sentiment flow of one text over a unit of time and store the result.
+
+        Args:
+            all_s (Dict[Any, List[Dict[str, Any]]]): The results so far.
+            sink (ResultSink): Where the results are written as they are produced.
+            idx (Any): The index of the text.
+            text (str): The text.
+            s0 (np.ndarray): The text's scores over the emotion dimensions.
+            polarity (float): The text's polarity.
+            sentiment_columns (pd.Index): The emotion dimensions.
+        """
+        t = np.array([0, 1])
+        speech_info = (
+            self._calculate_sentiment_density(s0),
+            self._calculate_sentiment_pressures(s0, text),
+            self._calculate_sentiment_viscosity(s0),
+            self._calculate_external_contextual_force(polarity)
+        )
+        s = self._integrate(s0, t, speech_info)
+        if s is None:
+            self._skip_diverged(idx, f"text {idx}")
+            return
+        self._add_result(all_s, sink, idx, {
+            'text': text,
+            'simulation': self.keep_states(s, t)[0],
+            'emotion dimension': sentiment_columns
+        })
+
+    def _simulate_texts_batched(self, index: pd.Index, texts: List[str], sentiment_columns: pd.Index, states: Any,
+                                polarity: np.ndarray, batch_size: int, sink: ResultSink) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Simulate the sentiment flow of all texts with the vectorized solver, `batch_size` texts at a time.
+
+        Args:
+            index (pd.Index): The index of the texts.
+            texts (List[str]): The texts.
+            sentiment_columns (pd.Index): The emotion dimensions.
+            states (Any): The (texts, dimensions) initial states, dense or sparse.
+            polarity (np.ndarray): The polarity of every text.
+            batch_size (int): The number of texts integrated together.
+            sink (ResultSink): Where the results are written as they are produced.
+
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: Dictionary with simulation results, as in the per-text path.
+        """
+        from tqdm.auto import tqdm
+
+        t = np.array([0, 1])
+        all_s = {}
+        for start in tqdm(range(0, len(texts), batch_size), desc="Calculating Navier-Stocker for texts (batched)"):
+            stop = min(start + batch_size, len(texts))
+            trajectories = self.integrate_texts(dense_rows(states, start, stop), texts[start:stop],
+                                                polarity[start:stop])
+            for offset, idx in enumerate(index[start:stop]):
+                if np.isnan(trajectories[:, offset]).any():
+                    self.metrics.increment('nan_skips_total')
+                    self._skip_diverged(idx, f"text {idx}")
+                    continue
+                self._add_result(all_s, sink, idx, {
+                    'text': texts[start + offset],
+                    'simulation': self.keep_states(trajectories[:, offset, :], t)[0],
+                    'emotion dimension': sentiment_columns
+                })
+        return all_s
+
+    def _speaker_tasks(self, data: Union[pd.DataFrame, EmotionMatrix],
+                       sentiment_columns: Optional[Sequence[str]] = None) -> List[Tuple[Any, ...]]:
+        """
+        Prepare the per-speaker inputs of the speech flows with one pass over the data.
 
-            # Debug: Print initial values
-            #print(f"Processing text index {idx}, Initial s0: {s0}, Initial g_context: {s0_g_context}")
+        Rows are grouped by speaker with a stable sort of the factorized speakers, so every speaker's speeches
+        keep their order and speakers come in order of first appearance. Only the first speech's emotions
+        start a speaker's flow, so only those rows are converted to floats.
 
-            # Since we are processing single texts, there will be only one iteration
-            current_text_row = text_row
-            g_context = self._calculate_external_contextual_force(current_text_row['POLARITY'])
+        Args:
+            data (Union[pd.DataFrame, EmotionMatrix]): The processed speeches.
+            sentiment_columns (Optional[Sequence[str]]): The emotion dimensions, e.g. those of a state store.
+                Columns the data does not have are zero, and columns of the data not among them are ignored.
+                Defaults to the emotion columns of the data (the non-zero ones of an EmotionMatrix), sorted.
+
+        Returns:
+            List[Tuple[Any, ...]]: The arguments of `_simulate_speaker` for every speaker.
+        """
+        metadata = data.metadata if isinstance(data, EmotionMatrix) else data
+        codes, speakers = pd.factorize(metadata['speaker'])
+        if (codes < 0).any():
+            logging.warning(f"Skipping {int((codes < 0).sum())} speeches without a speaker.")
+        order = np.argsort(codes, kind='stable')[np.count_nonzero(codes < 0):]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(speakers)))])
+        first_rows = order[bounds[:-1]]
+
+        if isinstance(data, EmotionMatrix):
+            data_columns = pd.Index([column for column in data.active_columns() if column != 'POLARITY'])
+        else:
+            data_columns = data.columns.difference(['title', 'speaker', 'speech', 'POLARITY'])
+        if sentiment_columns is None:
+            sentiment_columns = data_columns
+        else:
+            sentiment_columns = pd.Index(sentiment_columns)
+            ignored = data_columns.difference(sentiment_columns)
+            if len(ignored):
+                logging.warning(f"Ignoring emotion columns outside the flow's dimensions: {list(ignored)}")
+
+        if isinstance(data, EmotionMatrix):
+            known = set(data.columns)
+            positions = [i for i, column in enumerate(sentiment_columns) if column in known]
+            initial_states = np.zeros((len(first_rows), len(sentiment_columns)))
+            selected = data.select(sentiment_columns[positions])[first_rows]
+            initial_states[:, positions] = dense_rows(selected, 0, len(first_rows))
+            polarity = data.column('POLARITY')
+        else:
+            initial_states = (data.reindex(columns=sentiment_columns).iloc[first_rows]
+                              .apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float))
+            polarity = data['POLARITY'].to_numpy()
+        titles = metadata['title'].to_numpy()
+        speeches = metadata['speech'].to_numpy()
+
+        tasks = []
+        for j, speaker in enumerate(speakers):
+            rows = order[bounds[j]:bounds[j + 1]]
+            tasks.append((speaker, titles[rows[0]], speeches[rows].tolist(), initial_states[j], polarity[rows],
+                          sentiment_columns))
+        return tasks
+
+    def _simulate_speaker(self, speaker: Any, title: Any, speeches: List[str], s0: np.ndarray, polarity: np.ndarray,
+                          sentiment_columns: pd.Index,
+                          resume: Optional[SpeakerState] = None) -> Tuple[Any, Dict[str, Any], SpeakerState]:
+        """
+        Simulate the sentiment flow across the consecutive speeches of one speaker.
+
+        Every speech after the first advances the flow by one unit of time, starting from where the previous one
+        ended; the first step is driven by the first speech.
+
+        Args:
+            speaker (Any): The speaker.
+            title (Any): The title of the speaker's first speech.
+            speeches (List[str]): The speaker's speeches, in order.
+            s0 (np.ndarray): The emotions of the first speech, which start the flow.
+            polarity (np.ndarray): The polarity of every speech.
+            sentiment_columns (pd.Index): The emotion dimensions.
+            resume (Optional[SpeakerState]): Where an earlier run stopped. The speeches then follow the ones it
+                saw, `title` and `s0` are not used, and only the new steps are integrated and returned.
+
+        Returns:
+            Tuple[Any, Dict[str, Any], SpeakerState]: The title of the speaker's first speech, the speaker's
+            simulation results and where the flow stopped. The results hold the speech that drove every step
+            (step i goes from time i - 1 to time i), and the kept states with their times.
+        """
+        if resume is None:
+            resume = SpeakerState(title, s0, 0, 0, speeches[0], polarity[0], False)
+        title, s0, current_time, seen = resume.title, resume.state, resume.time, resume.rows
+        diverged = resume.diverged
+        steps = []
+        step_speeches = []
+
+        # Step i goes from speech i - 1 to speech i; speeches[i - seen] is speech i of the speaker.
+        for i in range(max(seen, 1), seen + len(speeches)):
+            if diverged:
+                break
+            if i == 1:
+                g_context = self._calculate_external_contextual_force(resume.first_polarity)
+                current_speech = resume.first_speech
+            else:
+                g_context = self._calculate_external_contextual_force(polarity[i - seen])
+                current_speech = speeches[i - seen]
 
             t = np.array([current_time, current_time + 1])
             speech_info = (
                 self._calculate_sentiment_density(s0),
-                np.array([self._calculate_sentiment_pressure(score, text) for score in s0]),
+                self._calculate_sentiment_pressures(s0, current_speech),
                 self._calculate_sentiment_viscosity(s0),
                 g_context
             )
-            s = odeint(self._differential_equation, s0, t, args=(speech_info,))
-
-            all_results.extend((sim_result, text) for sim_result in s.tolist())
+            s = self._integrate(s0, t, speech_info)
+            if s is None:
+                self._skip_diverged((speaker, i), f"speech {i} of speaker {speaker}")
+                diverged = True
+                break
+
+            steps.append(s)
+            step_speeches.append(current_speech)
             s0 = s[-1]
             current_time += 1
 
-            # Debug: Print intermediate results
-            #print(f"Iteration 1, s0: {s0}, g_context: {g_context}, Text: {text}")
+        states = np.concatenate(steps) if steps else np.empty((0, len(sentiment_columns)))
+        times = np.repeat(np.arange(current_time - len(steps), current_time), 2) + np.tile([0, 1], len(steps))
+        states, times = self.keep_states(states, times)
+
+        state = resume._replace(state=s0, time=current_time, rows=seen + len(speeches), diverged=diverged)
+        return title, {
+            'speaker': speaker,
+            'speech': tuple(step_speeches),
+            'time': times,
+            'simulation': states,
+            'emotion dimension': sentiment_columns
+        }, state
 
-            if all_results:
-                simulation_results, texts = zip(*all_results)
-                simulation_results = np.vstack(simulation_results)
+    @staticmethod
+    def _resume_task(task: Tuple[Any, ...], resume: Optional[SpeakerState], appended: bool) -> Tuple[Any, ...]:
+        """
+        Add where a speaker's flow stopped to its `_simulate_speaker` arguments.
+
+        Unless the speeches were appended since then, the ones the stored flow has already seen are dropped, so
+        that they are not integrated a second time.
+        """
+        if resume is None or appended:
+            return task + (resume,)
+        speaker, title, speeches, s0, polarity, sentiment_columns = task
+        return speaker, title, speeches[resume.rows:], s0, polarity[resume.rows:], sentiment_columns, resume
+
+    def calculate_navier_stocker_for_speeches(self, data: Union[pd.DataFrame, EmotionMatrix], n_workers: int = 1, chunksize: int = 1,
+                                              sink: Union[str, ResultSink, None] = None,
+                                              state_store: Optional[SpeakerStateStore] = None,
+                                              appended: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Calculate the Navier-Stokes sentiment flow for each speech in a DataFrame.
+
+        Args:
+            data (Union[pd.DataFrame, EmotionMatrix]): DataFrame containing 'title', 'speaker', 'speech', and
+                emotion columns, or the output of `SpeechProcessor.process_speeches_sparse`.
+            n_workers (int): Number of worker processes the speakers are spread across (-1 for all cores).
+                With 1, everything runs in the calling process.
+            chunksize (int): Number of speakers sent to a worker at a time.
+            sink (Union[str, ResultSink, None]): Where the results are written as they are produced: a path
+                (see `sinks.open_sink`) or an open sink, which is flushed but left open. Defaults to
+                `navier_stocker_speeches_results.json` in the directory of the calculator's `output` policy.
+            state_store (Optional[SpeakerStateStore]): Where the speakers' flows stopped in earlier runs. The
+                data holds every speaker's full history: the speeches of a stored speaker up to the number it has
+                seen are skipped, so only the later ones are integrated, from the stored state on, and only their
+                steps are returned. The flows use the store's emotion dimensions. The new states are saved when
+                the run is done.
+            appended (bool): With a `state_store`, the data only holds the speeches appended since the store was
+                saved, so none of a stored speaker's speeches are skipped.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Dictionary with simulation results.
+        """
+        from tqdm.auto import tqdm
+
+        all_s = {}
+        states = {}
+        if state_store is None:
+            tasks = self._speaker_tasks(data)
+        else:
+            tasks = self._speaker_tasks(data, state_store.emotion_dimensions)
+            resumed = state_store.get_many(task[0] for task in tasks)
+            logging.info(f"Resuming {len(resumed)} of {len(tasks)} speakers from {state_store.path}")
+            tasks = [self._resume_task(task, resumed.get(task[0]), appended) for task in tasks]
+
+        sink, owns_sink = self._open_sink(sink, SPEECH_RESULTS_NAME)
+        logging.info("Starting to calculate Navier-Stocker ...")
+        self._start_run()
+        if n_workers == -1:
+            n_workers = os.cpu_count() or 1
+        # A sink opened here is closed even when a flow raises, so its file handles are released.
+        try:
+            if n_workers > 1:
+                with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_speaker_worker,
+                                         initargs=(self,)) as executor:
+                    # map() yields in submission order, so the merge below is deterministic.
+                    results = executor.map(_simulate_speaker_task, tasks, chunksize=chunksize)
+                    for title, result, state, report in tqdm(results, total=len(tasks), desc="Calculating Navier-Stocker for speeches"):
+                        self._add_result(all_s, sink, title, result)
+                        self._merge_worker_report(report)
+                        states[result['speaker']] = state
             else:
-                simulation_results, texts = [], []
+                for task in tqdm(tasks, desc="Calculating Navier-Stocker for speeches"):
+                    title, result, state = self._simulate_speaker(*task)
+                    self._add_result(all_s, sink, title, result)
+                    states[result['speaker']] = state
+        finally:
+            self._close_sink(sink, owns_sink)
+        logging.info("Finished calculating speeches.")
+        self._log_integration_stats()
+        logging.info(f"Processed {len(all_s)} speeches.")
+        if state_store is not None and tasks:
+            state_store.save(states, tasks[0][5])
+        return all_s
 
-            if idx not in all_s:
-                all_s[idx] = []
-            all_s[idx].append({
-                'text': texts,
-                'simulation': simulation_results,
-                'emotion dimension': sentiment_columns
-            })
+    def calculate_navier_stocker_for_texts(self, data: Union[pd.DataFrame, EmotionMatrix], vectorized: bool = False,
+                                           batch_size: int = 1024,
+                                           sink: Union[str, ResultSink, None] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Calculate the Navier-Stokes sentiment flow for each text in a DataFrame with 'text' and emotion columns.
 
-        logging.info("Finished calculating texts.")
-        logging.info(f"Processed {len(all_s)} texts.")
-        # Debug: Save the results to a CSV for inspection
+        Args:
+            data (Union[pd.DataFrame, EmotionMatrix]): DataFrame containing 'text' and emotion columns, or the
+                sparse output of `SpeechProcessor.process_texts_sparse`, which is only densified `batch_size`
+                texts at a time. The emotion dimensions are the columns with a non-zero score, sorted by name.
+            vectorized (bool): Integrate `batch_size` texts at a time as one stacked ODE system instead of one
+                integrator call per text. Results agree with the default per-text path within about 1e-5
+                relative; flows that blow up are integrated per text, as in that path (see
+                `solver.integrate_batch`). Requires the default `integrator`.
+            batch_size (int): The number of texts integrated together in vectorized mode.
+            sink (Union[str, ResultSink, None]): Where the results are written as they are produced: a path
+                (see `sinks.open_sink`) or an open sink, which is flushed but left open. Defaults to
+                `navier_stocker_text_results.json` in the directory of the calculator's `output` policy.
 
-        logging.info("Saving results to results/navier_stocker_text_results.json")
-        Path("results/navier_stocker_text_results.json").parent.mkdir(parents=True, exist_ok=True)
-        processed_df = pd.DataFrame(all_s)
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: Dictionary with simulation results.
+
+        Raises:
+            ValueError: If `vectorized` is set and the calculator's integrator is not the default one, or a flow
+                diverged and `on_divergence` is `'raise'`.
+        """
+        from tqdm.auto import tqdm
 
-        # Save the DataFrame to a JSON file
-        json_file_path = 'results/navier_stocker_text_results.json'
-        processed_df.to_json(json_file_path, orient='records', lines=True, indent=4)
+        if vectorized:
+            self._check_vectorized()
+        index, texts, sentiment_columns, states, polarity = self._text_arrays(data)
+        sink, owns_sink = self._open_sink(sink, TEXT_RESULTS_NAME)
+        logging.info("Starting to calculate Navier-Stocker...")
+        self._start_run()
+        try:
+            if vectorized:
+                all_s = self._simulate_texts_batched(index, texts, sentiment_columns, states, polarity, batch_size,
+                                                     sink)
+            else:
+                all_s = {}
+                with tqdm(total=len(texts), desc="Calculating Navier-Stocker for texts") as progress:
+                    for start in range(0, len(texts), batch_size):
+                        block = dense_rows(states, start, start + batch_size)
+                        for offset, s0 in enumerate(block):
+                            i = start + offset
+                            self._simulate_text(all_s, sink, index[i], texts[i], s0, polarity[i], sentiment_columns)
+                        progress.update(len(block))
+        finally:
+            self._close_sink(sink, owns_sink)
 
+        logging.info("Finished calculating texts.")
+        self._log_integration_stats()
+        logging.info(f"Processed {len(all_s)} texts.")
         return all_s
 
 
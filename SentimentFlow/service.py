@@ -0,0 +1,466 @@
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import json
+import logging
+import time
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from SentimentFlow.data_processing import DEFAULT_NLP_MODEL, SpeechProcessor
+from SentimentFlow.metrics import Metrics
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.tokenizers import TOKENIZERS, make_tokenizer
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServiceOverloaded(RuntimeError):
+    """Raised when a request would take more texts than the service lets wait."""
+
+
+class RequestTooLarge(ValueError):
+    """Raised when a single request holds more texts than the service ever lets wait."""
+
+
+_worker_service = None
+
+
+def _init_service_worker(processor: SpeechProcessor, calculator: SentimentFlowCalculator,
+                         dimensions: List[str]) -> None:
+    global _worker_service
+    _worker_service = (processor, calculator, dimensions)
+    # Load the tokenizer (e.g. spaCy) before the first batch rather than while it waits.
+    processor.tokenizer.load()
+
+
+def _warm_up_worker() -> None:
+    # Runs once per worker process, so that all of them have started, and loaded the tokenizer, before serving.
+    _worker_service[0].tokenizer.load()
+
+
+def _score_batch_task(texts: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    # Each batch also reports the processor's and the calculator's metrics for the parent to add up.
+    processor, calculator, dimensions = _worker_service
+    processor.metrics.reset()
+    calculator.metrics.reset()
+    results, report = _score_batch(processor, calculator, dimensions, texts)
+    report['processor_metrics'] = processor.metrics
+    if calculator.metrics is not processor.metrics:
+        report['calculator_metrics'] = calculator.metrics
+    return results, report
+
+
+def _score_batch(processor: SpeechProcessor, calculator: SentimentFlowCalculator, dimensions: List[str],
+                 texts: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Score a batch of texts and simulate their flows, on a worker thread or in a worker process.
+
+    Args:
+        processor (SpeechProcessor): Scores the texts.
+        calculator (SentimentFlowCalculator): Simulates the flows.
+        dimensions (List[str]): The emotion dimensions of the flows.
+        texts (List[str]): The texts.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Dict[str, Any]]: The result of every text, as returned by
+        `ScoringService.score`, and the 'seconds' the batch took and the number of flows that 'diverged', for
+        the service's metrics.
+    """
+    start = time.perf_counter()
+    positions = {dimension: i for i, dimension in enumerate(dimensions)}
+    scores = processor.score_texts(texts)
+    states = np.zeros((len(texts), len(dimensions)))
+    for row, text_scores in enumerate(scores):
+        for column, value in text_scores.items():
+            position = positions.get(column)
+            if position is not None:
+                states[row, position] = value
+    polarity = [text_scores['POLARITY'] for text_scores in scores]
+    trajectories = calculator.integrate_texts(states, texts, polarity)
+
+    results = []
+    n_diverged = 0
+    for row, text in enumerate(texts):
+        simulation = trajectories[:, row]
+        diverged = bool(np.isnan(simulation).any())
+        if diverged:
+            n_diverged += 1
+        else:
+            simulation = calculator.keep_states(simulation, np.array([0, 1]))[0]
+        results.append({'text': text, 'scores': {column: value for column, value in scores[row].items() if value},
+                        'simulation': None if diverged else simulation.tolist()})
+    return results, {'seconds': time.perf_counter() - start, 'diverged': n_diverged}
+
+
+class ScoringService:
+    def __init__(self, processor: SpeechProcessor, calculator: SentimentFlowCalculator,
+                 dimensions: Optional[Sequence[str]] = None, max_batch_size: int = 64, max_wait: float = 0.005,
+                 max_pending: int = 4096, n_workers: int = 1, processes: bool = False,
+                 executor: Optional[concurrent.futures.Executor] = None, metrics: Optional[Metrics] = None):
+        """
+        Initialize the ScoringService, which scores texts online by coalescing concurrent requests.
+
+        Texts are queued as they arrive and scored in micro-batches: a batch is closed when it holds
+        `max_batch_size` texts or `max_wait` seconds after its first text arrived, whichever comes first. Each
+        batch goes through one spaCy pipe and one call of the vectorized solver on a worker, so the event loop
+        keeps accepting requests meanwhile. At most `n_workers` batches run at a time; while they do, the queue
+        fills up and the next batch is larger. Once `max_pending` texts are waiting, new requests are rejected
+        with `ServiceOverloaded` (HTTP 503) instead of queueing for ever longer; a request with more than
+        `max_pending` texts could never be accepted and is rejected with `RequestTooLarge` (HTTP 413).
+
+        Scoring is CPU-bound, so worker threads mostly take turns holding the GIL: with `processes`, batches are
+        scored in `n_workers` worker processes instead, which get a copy of the processor and the calculator
+        when they start and report their metrics back with every batch.
+
+        Nothing is written to disk and no progress bar is shown.
+
+        Args:
+            processor (SpeechProcessor): Scores the texts. Its `cache`, if any, must not be used by the workers,
+                since SQLite connections stay in the thread that opened them.
+            calculator (SentimentFlowCalculator): Simulates the flows. Keep the default `on_divergence='skip'`,
+                otherwise a diverged text fails its whole batch.
+            dimensions (Optional[Sequence[str]]): The emotion dimensions of the flows. Defaults to every column the
+                processor can produce, sorted by name, so that the result of a text does not depend on the texts
+                it is batched with. Pass the columns of an offline run to reproduce its flows.
+            max_batch_size (int): Maximum number of texts per batch.
+            max_wait (float): Maximum number of seconds the first text of a batch waits for others.
+            max_pending (int): Maximum number of texts waiting for a batch.
+            n_workers (int): Maximum number of batches scored at a time.
+            processes (bool): Score batches in worker processes instead of threads.
+            executor (Optional[concurrent.futures.Executor]): Where batches are scored. Defaults to a pool of
+                `n_workers` threads (or processes), which is shut down with the service. The processor and the
+                calculator are sent along with every batch to an executor passed here, so pass a thread pool.
+            metrics (Optional[Metrics]): Where the request and batch counters are recorded. Defaults to a new
+                registry. `/metrics` reports it together with the processor's and the calculator's.
+        """
+        if processor.cache is not None or calculator.cache is not None:
+            raise ValueError("The scoring service cannot use a DocumentCache; pass cache=None.")
+        self.processor = processor
+        self.calculator = calculator
+        self.dimensions = sorted(processor.emotion_columns) if dimensions is None else list(dimensions)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.n_workers = n_workers
+        self.processes = processes
+        self.metrics = Metrics() if metrics is None else metrics
+        self._owns_executor = executor is None
+        self._executor = executor
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+        self._batches = set()
+
+    @property
+    def pending(self) -> int:
+        """The number of texts waiting for a batch."""
+        return 0 if self._queue is None else self._queue.qsize()
+
+    async def start(self) -> None:
+        """Start batching; called by `serve`, or directly to use `score` without the HTTP front-end."""
+        if self._batcher is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._executor is None and self.processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.n_workers, initializer=_init_service_worker,
+                initargs=(self.processor, self.calculator, self.dimensions))
+            # Start the workers, which load the tokenizer, before the first request rather than while it waits.
+            await asyncio.gather(*(loop.run_in_executor(self._executor, _warm_up_worker)
+                                   for _ in range(self.n_workers)))
+        else:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.n_workers,
+                                                                       thread_name_prefix='sentimentflow')
+            await loop.run_in_executor(self._executor, self.processor.tokenizer.load)
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.n_workers)
+        self._batcher = asyncio.get_running_loop().create_task(self._run_batcher())
+
+    async def stop(self) -> None:
+        """Finish the running batches, fail the waiting texts and release the worker threads."""
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(ServiceOverloaded("The service stopped."))
+        if self._owns_executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def score(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Score texts and simulate their flows, batched with the texts of concurrent calls.
+
+        Args:
+            texts (Sequence[str]): The texts.
+
+        Returns:
+            List[Dict[str, Any]]: For every text, its 'text', its nonzero 'scores' and its 'simulation', the
+            states of its trajectory kept by the calculator's `resolution` (both by default, as a
+            (2, len(dimensions)) nested list), or None if the flow diverged.
+
+        Raises:
+            RequestTooLarge: If there are more texts than `max_pending`.
+            ServiceOverloaded: If the texts would exceed `max_pending` together with the waiting ones.
+        """
+        if self._batcher is None:
+            raise RuntimeError("Call start() before scoring.")
+        if len(texts) > self.max_pending:
+            self.metrics.increment('requests_rejected_total')
+            raise RequestTooLarge(f"{len(texts)} texts are more than the {self.max_pending} a request may hold.")
+        if self._queue.qsize() + len(texts) > self.max_pending:
+            self.metrics.increment('requests_rejected_total')
+            raise ServiceOverloaded(f"{self._queue.qsize()} texts are already waiting.")
+        self.metrics.increment('requests_total')
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self._queue.get_nowait())
+        # Texts whose request went away are not scored.
+        return [(text, future) for text, future in batch if not future.done()]
+
+    async def _run_batcher(self) -> None:
+        while True:
+            # A batch is only formed once a worker is free, so texts keep joining it while the workers are busy.
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        if self._owns_executor and self.processes:
+            score_batch = _score_batch_task
+        else:
+            score_batch = functools.partial(_score_batch, self.processor, self.calculator, self.dimensions)
+        try:
+            results, report = await asyncio.get_running_loop().run_in_executor(self._executor, score_batch, texts)
+        except Exception as error:
+            logging.exception("Failed to score a batch of %d texts", len(texts))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            self._merge_batch_report(len(texts), report)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def _merge_batch_report(self, n_texts: int, report: Dict[str, Any]) -> None:
+        if report['diverged']:
+            self.metrics.increment('nan_skips_total', report['diverged'])
+        self.metrics.update(counters={'batches_total': 1, 'batched_texts_total': n_texts},
+                            timings={'batch': report['seconds']})
+        if 'processor_metrics' in report:
+            self.processor.metrics.merge(report['processor_metrics'])
+        if 'calculator_metrics' in report:
+            self.calculator.metrics.merge(report['calculator_metrics'])
+
+    def export_metrics(self) -> str:
+        """
+        The service's, the processor's and the calculator's metrics, in the Prometheus text format.
+
+        Returns:
+            str: The metrics of every distinct registry, added up.
+        """
+        combined = Metrics(self.metrics.namespace, self.metrics.buckets)
+        registries = {id(registry): registry for registry in (self.metrics, self.processor.metrics,
+                                                              self.calculator.metrics)}
+        for registry in registries.values():
+            combined.merge(registry)
+        return combined.to_prometheus()
+
+    async def _respond(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, str, bytes]:
+        """
+        Answer an HTTP request.
+
+        Returns:
+            Tuple[HTTPStatus, str, bytes]: The status, the content type and the body of the response.
+        """
+        if path == '/health' and method == 'GET':
+            payload = {'status': 'ok', 'pending': self.pending}
+            return HTTPStatus.OK, 'application/json', json.dumps(payload).encode('utf-8')
+        if path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, 'text/plain; version=0.0.4', self.export_metrics().encode('utf-8')
+        if path != '/score':
+            return HTTPStatus.NOT_FOUND, 'text/plain', b'Not found\n'
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b'Use POST\n'
+
+        try:
+            request = json.loads(body)
+            texts = [request['text']] if 'text' in request else request['texts']
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            message = b'Expected a JSON object with a "text" string or a "texts" list of strings\n'
+            return HTTPStatus.BAD_REQUEST, 'text/plain', message
+        try:
+            results = await self.score(texts)
+        except RequestTooLarge as error:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'text/plain', f"{error}\n".encode('utf-8')
+        except ServiceOverloaded as error:
+            return HTTPStatus.SERVICE_UNAVAILABLE, 'text/plain', f"{error}\n".encode('utf-8')
+        except Exception:
+            # The batch error is logged by `_run_batch`.
+            return HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain', b'Failed to score the texts\n'
+        payload = {'emotion_dimensions': self.dimensions, 'results': results}
+        return HTTPStatus.OK, 'application/json', json.dumps(payload).encode('utf-8')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the HTTP/1.1 requests of a connection, keeping it open between requests."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                start = time.perf_counter()
+                if length < 0:
+                    # The body cannot be skipped without its length, so the connection is closed after answering.
+                    status, content_type, body = HTTPStatus.BAD_REQUEST, 'text/plain', b'Invalid Content-Length\n'
+                    keep_alive = False
+                elif length > MAX_BODY_BYTES:
+                    status, content_type, body = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'text/plain', b'Too large\n'
+                    keep_alive = False
+                else:
+                    status, content_type, body = await self._respond(method, path.split('?')[0],
+                                                                     await reader.readexactly(length))
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                if path.startswith('/score'):
+                    self.metrics.observe('request_seconds', time.perf_counter() - start, status=str(status.value))
+
+                head = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+                        f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    head.append("Retry-After: 1")
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080,
+                    unix_socket: Optional[str] = None) -> asyncio.AbstractServer:
+        """
+        Start batching and listen for HTTP requests.
+
+        - `POST /score` with `{"text": "..."}` or `{"texts": [...]}` returns the 'emotion_dimensions' and the
+          'results' of `score`;
+        - `GET /metrics` returns the metrics in the Prometheus text format;
+        - `GET /health` returns the number of texts waiting.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The TCP port, 0 for any free port.
+            unix_socket (Optional[str]): Listen on this Unix socket instead of TCP.
+
+        Returns:
+            asyncio.AbstractServer: The server; close it, then `stop()` the service.
+        """
+        await self.start()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.info(f"Serving on {unix_socket or server.sockets[0].getsockname()}")
+        return server
+
+
+async def _serve_forever(service: ScoringService, host: str, port: int, unix_socket: Optional[str]) -> None:
+    server = await service.serve(host, port, unix_socket)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Score texts online over HTTP.")
+    parser.add_argument('senticnet', help="SenticNet TSV")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="TCP port")
+    parser.add_argument('--unix-socket', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--nlp-model', default=DEFAULT_NLP_MODEL, help="spaCy model, e.g. blank:en")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default='spacy', help="tokenizer backend")
+    parser.add_argument('--match-phrases', action='store_true', help="also match multi-word concepts")
+    parser.add_argument('--max-batch-size', type=int, default=64, help="maximum number of texts per batch")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="maximum wait for a batch to fill up")
+    parser.add_argument('--max-pending', type=int, default=4096, help="waiting texts before requests are rejected")
+    parser.add_argument('--workers', type=int, default=1, help="batches scored at a time")
+    parser.add_argument('--processes', action='store_true', help="score batches in worker processes")
+    args = parser.parse_args(argv)
+
+    processor = SpeechProcessor(args.senticnet, match_phrases=args.match_phrases,
+                                tokenizer=make_tokenizer(args.tokenizer, args.nlp_model))
+    service = ScoringService(processor, SentimentFlowCalculator(), max_batch_size=args.max_batch_size,
+                             max_wait=args.max_wait_ms / 1000, max_pending=args.max_pending, n_workers=args.workers,
+                             processes=args.processes)
+    asyncio.run(_serve_forever(service, args.host, args.port, args.unix_socket))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.data_processing import DEFAULT_NLP_MODEL, SpeechProcessor
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.sinks import NpySink, load_results
+from SentimentFlow.streaming import ChunkWriter, read_chunks, write_csv_atomic, write_json_atomic
+from SentimentFlow.tokenizers import TOKENIZERS, make_tokenizer
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# The position of a document in the input, which orders the merged results.
+ROW_COLUMN = '_row'
+INPUT_COLUMNS = {'texts': ['text'], 'speeches': ['title', 'speaker', 'speech']}
+PHASES = ('score', 'flow')
+
+
+class ShardedRun:
+    def __init__(self, directory: str):
+        """
+        Open a sharded run planned with `ShardedRun.plan`.
+
+        A sharded run processes a corpus too large for one machine as independent shards that can run as
+        separate processes or on separate nodes sharing the run directory:
+
+        1. `plan` splits the input into `n_shards` by a hash of the document (of the speaker for speeches, so
+           that every speaker's flow stays on one shard) and writes the manifest;
+        2. `score(shard, processor)` scores the documents of a shard;
+        3. `flow(shard, calculator)` simulates their flows, once every shard is scored: the flows are computed
+           over the union of the emotion columns found in all shards, as in an unsharded run;
+        4. `merge()` combines the shards' outputs in input order.
+
+        Every phase of a shard records its status in its own file, written atomically, so nodes never write the
+        same file. A failed phase can be run again on its own.
+
+        Args:
+            directory (str): The run directory, holding the manifest.
+        """
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / MANIFEST_NAME).read_text(encoding='utf-8'))
+        if self.manifest['version'] != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {self.manifest['version']} in {self.directory}.")
+        self.kind = self.manifest['kind']
+        self.n_shards = self.manifest['n_shards']
+
+    @classmethod
+    def plan(cls, input_path: str, directory: str, n_shards: int, kind: str = 'texts', text_column: str = 'text',
+             chunk_size: int = 100_000) -> "ShardedRun":
+        """
+        Split an input file into shards and write the manifest of the run.
+
+        Args:
+            input_path (str): A `.csv` or `.jsonl` file of texts, or of speeches with 'title', 'speaker' and
+                'speech' columns.
+            directory (str): The run directory, which must not hold a run yet.
+            n_shards (int): The number of shards.
+            kind (str): 'texts' or 'speeches'.
+            text_column (str): The column of the texts, for 'texts'.
+            chunk_size (int): The number of rows read at a time.
+
+        Returns:
+            ShardedRun: The planned run.
+        """
+        if kind not in INPUT_COLUMNS:
+            raise ValueError(f"kind must be one of {list(INPUT_COLUMNS)}.")
+        directory = Path(directory)
+        if (directory / MANIFEST_NAME).exists():
+            raise FileExistsError(f"{directory} already holds a sharded run.")
+
+        columns = [ROW_COLUMN, *INPUT_COLUMNS[kind]]
+        writers = [ChunkWriter(str(cls._shard_path(directory, shard) / 'input.csv'), columns)
+                   for shard in range(n_shards)]
+        rows = np.zeros(n_shards, dtype=np.int64)
+        total = 0
+        skipped = 0
+        try:
+            # Texts such as 'NA' stay strings; only an empty speaker is missing.
+            csv_options = {'keep_default_na': False, 'na_values': {'speaker': ['']}, 'dtype': str}
+            for chunk in read_chunks(input_path, chunk_size, **csv_options):
+                chunk = chunk.rename(columns={text_column: 'text'}) if kind == 'texts' else chunk
+                chunk.insert(0, ROW_COLUMN, np.arange(total, total + len(chunk)))
+                total += len(chunk)
+                if kind == 'speeches':
+                    # An unsharded run skips these too; the row numbers still count them.
+                    skipped += int(chunk['speaker'].isna().sum())
+                    chunk = chunk[chunk['speaker'].notna()]
+                    keys = chunk['speaker'].astype(str)
+                else:
+                    keys = chunk[ROW_COLUMN]
+                shards = pd.util.hash_pandas_object(keys, index=False).to_numpy() % n_shards
+                for shard, part in chunk.groupby(shards, sort=False):
+                    writers[shard].write(part)
+                    rows[shard] += len(part)
+        finally:
+            for writer in writers:
+                writer.close()
+        for shard in np.flatnonzero(rows == 0):
+            write_csv_atomic(cls._shard_path(directory, shard) / 'input.csv', pd.DataFrame(columns=columns))
+        if skipped:
+            logging.warning(f"Skipped {skipped} speeches without a speaker.")
+
+        write_json_atomic(directory / MANIFEST_NAME, {
+            'version': MANIFEST_VERSION,
+            'kind': kind,
+            'input': str(input_path),
+            'n_shards': n_shards,
+            'rows': total,
+            'shard_rows': rows.tolist(),
+            'created': time.time(),
+        })
+        logging.info(f"Planned {n_shards} shards of {total} {kind} in {directory}")
+        return cls(str(directory))
+
+    @staticmethod
+    def _shard_path(directory: Path, shard: int) -> Path:
+        return directory / f"shard-{shard:05d}"
+
+    def shard_path(self, shard: int) -> Path:
+        """The directory of a shard, holding its input, outputs and status files."""
+        if not 0 <= shard < self.n_shards:
+            raise ValueError(f"Shard {shard} is not in [0, {self.n_shards}).")
+        return self._shard_path(self.directory, shard)
+
+    def phase_status(self, shard: int, phase: str) -> Optional[Dict[str, Any]]:
+        """
+        Read the status of a phase of a shard.
+
+        Returns:
+            Optional[Dict[str, Any]]: Its 'state' ('running', 'done' or 'failed'), host, pid, times and outputs,
+            or None if it never started.
+        """
+        path = self.shard_path(shard) / f"{phase}.json"
+        return json.loads(path.read_text(encoding='utf-8')) if path.exists() else None
+
+    def status(self) -> pd.DataFrame:
+        """
+        The status of every phase of every shard.
+
+        Returns:
+            pd.DataFrame: One row per shard, with its number of documents and the state of each phase.
+        """
+        rows = []
+        for shard in range(self.n_shards):
+            row = {'shard': shard, 'rows': self.manifest['shard_rows'][shard]}
+            for phase in PHASES:
+                status = self.phase_status(shard, phase)
+                row[phase] = None if status is None else status['state']
+                if status is not None and status['state'] != 'done':
+                    row[f'{phase}_host'] = status['host']
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def _run_phase(self, shard: int, phase: str, work: Callable[[Path], Dict[str, Any]]) -> None:
+        """Run a phase of a shard, recording in its status file that it is running, then done or failed."""
+        path = self.shard_path(shard)
+        status = {'state': 'running', 'host': socket.gethostname(), 'pid': os.getpid(), 'started': time.time()}
+        write_json_atomic(path / f"{phase}.json", status)
+        try:
+            outputs = work(path)
+        except BaseException:
+            write_json_atomic(path / f"{phase}.json", {**status, 'state': 'failed', 'finished': time.time(),
+                                                       'error': traceback.format_exc()})
+            raise
+        write_json_atomic(path / f"{phase}.json", {**status, 'state': 'done', 'finished': time.time(), **outputs})
+        logging.info(f"Shard {shard}: {phase} done")
+
+    def _read_csv(self, path: Path) -> pd.DataFrame:
+        # Texts such as 'NA' stay strings, and scores read back exactly as they were written.
+        text_columns = {column: str for column in INPUT_COLUMNS[self.kind]}
+        return pd.read_csv(path, dtype=text_columns, keep_default_na=False, float_precision='round_trip')
+
+    def score(self, shard: int, processor: SpeechProcessor) -> None:
+        """
+        Score the documents of a shard into its `scores.csv`, and record which emotion columns they have.
+
+        Args:
+            shard (int): The shard.
+            processor (SpeechProcessor): The processor; every shard must use the same settings.
+        """
+        def work(path: Path) -> Dict[str, Any]:
+            documents = self._read_csv(path / 'input.csv')
+            if self.kind == 'texts':
+                matrix = processor.process_texts_sparse(documents['text'].tolist())
+            else:
+                matrix = processor.process_speeches_sparse(documents[INPUT_COLUMNS['speeches']])
+            scores = matrix.to_frame()
+            scores.insert(0, ROW_COLUMN, documents[ROW_COLUMN].to_numpy())
+            write_csv_atomic(path / 'scores.csv', scores)
+            return {'active_columns': matrix.active_columns(), 'vocabulary': matrix.columns}
+
+        self._run_phase(shard, 'score', work)
+
+    def emotion_columns(self) -> List[str]:
+        """
+        The union of the emotion columns found in all shards, in lexicon order, as in an unsharded run.
+
+        Returns:
+            List[str]: The columns, always including 'POLARITY'.
+
+        Raises:
+            RuntimeError: If some shards are not scored yet.
+        """
+        statuses = [self.phase_status(shard, 'score') for shard in range(self.n_shards)]
+        missing = [shard for shard, status in enumerate(statuses) if status is None or status['state'] != 'done']
+        if missing:
+            raise RuntimeError(f"Shards {missing} are not scored yet.")
+        active = {'POLARITY'}.union(*(status['active_columns'] for status in statuses))
+        return [column for column in statuses[0]['vocabulary'] if column in active]
+
+    def _scores(self, shard: int, columns: List[str]) -> pd.DataFrame:
+        scores = self._read_csv(self.shard_path(shard) / 'scores.csv')
+        metadata = [ROW_COLUMN, *INPUT_COLUMNS[self.kind]]
+        return scores.reindex(columns=metadata + columns).fillna({column: 0.0 for column in columns})
+
+    def flow(self, shard: int, calculator: SentimentFlowCalculator, vectorized: bool = False) -> None:
+        """
+        Simulate the flows of a shard into its `flows` results directory (see `sinks.load_results`).
+
+        Args:
+            shard (int): The shard.
+            calculator (SentimentFlowCalculator): The calculator; every shard must use the same settings.
+            vectorized (bool): Use the vectorized solver for texts.
+        """
+        columns = self.emotion_columns()
+
+        def work(path: Path) -> Dict[str, Any]:
+            # Texts are keyed by their row in the input, as in an unsharded run over the whole input.
+            data = self._scores(shard, columns).set_index(ROW_COLUMN, drop=True).rename_axis(None)
+            sink = NpySink(str(path / 'flows'))
+            try:
+                if self.kind == 'texts':
+                    all_s = calculator.calculate_navier_stocker_for_texts(data, vectorized=vectorized, sink=sink)
+                else:
+                    all_s = calculator.calculate_navier_stocker_for_speeches(data, sink=sink)
+            finally:
+                sink.close()
+            return {'records': len(all_s)}
+
+        self._run_phase(shard, 'flow', work)
+
+    def merge(self) -> Path:
+        """
+        Combine the outputs of all shards into the run's `merged` directory, in input order.
+
+        - `processed.csv`: the scores of every document, over the union of the emotion columns;
+        - `flows`: the flows of every text, by input row, or of every speaker, in order of first appearance.
+
+        The result does not depend on the number of shards or on the order they ran in.
+
+        Returns:
+            Path: The `merged` directory.
+
+        Raises:
+            RuntimeError: If some shards have not finished.
+        """
+        columns = self.emotion_columns()
+        unfinished = [shard for shard in range(self.n_shards)
+                      if (self.phase_status(shard, 'flow') or {}).get('state') != 'done']
+        if unfinished:
+            raise RuntimeError(f"Shards {unfinished} have not finished.")
+        merged_path = self.directory / 'merged'
+
+        scores = pd.concat([self._scores(shard, columns) for shard in range(self.n_shards)], ignore_index=True)
+        scores = scores.sort_values(ROW_COLUMN, kind='stable').reset_index(drop=True)
+        write_csv_atomic(merged_path / 'processed.csv', scores.drop(columns=ROW_COLUMN))
+
+        records = []
+        for shard in range(self.n_shards):
+            if self.manifest['shard_rows'][shard] == 0:
+                continue
+            results = load_results(self.shard_path(shard) / 'flows')
+            for _, row in results.metadata.iterrows():
+                records.append((row, results.states, results.emotion_dimensions))
+        if self.kind == 'texts':
+            order = [row['key'] for row, _, _ in records]
+        else:
+            # Speakers are read as strings both from the scores and from the shards' results.
+            first_rows = scores.groupby('speaker', sort=False)[ROW_COLUMN].min()
+            order = [first_rows[row['speaker']] for row, _, _ in records]
+
+        with NpySink(str(merged_path / 'flows')) as sink:
+            for i in np.argsort(np.asarray(order), kind='stable'):
+                row, states, emotion_dimensions = records[i]
+                record = {field: value for field, value in row.items() if field not in ('key', 'start', 'stop')}
+                record['simulation'] = states[row['start']:row['stop']]
+                record['emotion dimension'] = emotion_dimensions
+                sink.write(row['key'], record)
+        logging.info(f"Merged {self.n_shards} shards into {merged_path}")
+        return merged_path
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run SentimentFlow over a corpus in shards.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan = commands.add_parser('plan', help="split the input into shards")
+    plan.add_argument('input', help="CSV or JSON-lines input")
+    plan.add_argument('directory', help="run directory")
+    plan.add_argument('--shards', type=int, required=True, help="number of shards")
+    plan.add_argument('--kind', choices=list(INPUT_COLUMNS), default='texts', help="texts or speeches")
+    plan.add_argument('--text-column', default='text', help="column of the texts")
+    score = commands.add_parser('score', help="score the documents of a shard")
+    score.add_argument('directory', help="run directory")
+    score.add_argument('--shard', type=int, required=True, help="shard to score")
+    score.add_argument('--senticnet', required=True, help="SenticNet TSV")
+    score.add_argument('--nlp-model', default=DEFAULT_NLP_MODEL, help="spaCy model, e.g. blank:en")
+    score.add_argument('--tokenizer', choices=TOKENIZERS, default='spacy', help="tokenizer backend")
+    score.add_argument('--match-phrases', action='store_true', help="also match multi-word concepts")
+    flow = commands.add_parser('flow', help="simulate the flows of a shard, once all shards are scored")
+    flow.add_argument('directory', help="run directory")
+    flow.add_argument('--shard', type=int, required=True, help="shard to simulate")
+    flow.add_argument('--vectorized', action='store_true', help="use the vectorized solver for texts")
+    flow.add_argument('--resolution', default='full', help="states kept per flow: full, final or every k-th")
+    flow.add_argument('--float32', action='store_true', help="store the states as float32")
+    merge = commands.add_parser('merge', help="combine the outputs of all shards")
+    merge.add_argument('directory', help="run directory")
+    status = commands.add_parser('status', help="show the status of every shard")
+    status.add_argument('directory', help="run directory")
+    args = parser.parse_args(argv)
+
+    if args.command == 'plan':
+        ShardedRun.plan(args.input, args.directory, args.shards, args.kind, args.text_column)
+        return
+    run = ShardedRun(args.directory)
+    if args.command == 'score':
+        processor = SpeechProcessor(args.senticnet, match_phrases=args.match_phrases, output=OutputPolicy.memory(),
+                                    tokenizer=make_tokenizer(args.tokenizer, args.nlp_model))
+        run.score(args.shard, processor)
+    elif args.command == 'flow':
+        resolution = int(args.resolution) if args.resolution.isdigit() else args.resolution
+        calculator = SentimentFlowCalculator(output=OutputPolicy.memory(), resolution=resolution,
+                                             dtype='float32' if args.float32 else 'float64')
+        run.flow(args.shard, calculator, args.vectorized)
+    elif args.command == 'merge':
+        print(run.merge())
+    else:
+        print(run.status().to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,444 @@
+import abc
+import io
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.streaming import ChunkWriter, write_atomic, write_json_atomic
+
+NPY_FORMAT_VERSION = 1
+# List fields of the records that hold integers; the others hold texts.
+_INTEGER_LIST_FIELDS = ('time',)
+
+
+class Results(NamedTuple):
+    """Simulation results read back from a sink: one metadata row per record, one state row per time point."""
+    metadata: pd.DataFrame
+    states: np.ndarray
+    emotion_dimensions: List[str]
+
+
+def _split_record(key: Any, record: Dict[str, Any], d: int) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Split a simulation record over d emotion dimensions into its metadata and its (rows, d) states.
+
+    float32 states stay float32; any other states become float64.
+    """
+    metadata = {'key': key}
+    for field, value in record.items():
+        if field not in ('simulation', 'emotion dimension'):
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            metadata[field] = list(value) if isinstance(value, tuple) else value
+    states = np.asarray(record['simulation'])
+    if states.dtype != np.float32:
+        states = states.astype(float)
+    return metadata, states.reshape(-1, d)
+
+
+class ResultSink(abc.ABC):
+    def __init__(self, path: Optional[str], buffer_size: int = 1024):
+        """
+        Initialize the ResultSink, which stores simulation records as they are produced.
+
+        Records are buffered and handed to the storage `buffer_size` at a time.
+
+        Args:
+            path (Optional[str]): Where the results are stored, or None for sinks that store nothing.
+            buffer_size (int): The number of records written at a time.
+        """
+        self.path = None if path is None else Path(path)
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._dimensions_source = None
+        self.emotion_dimensions = None
+
+    def write(self, key: Any, record: Dict[str, Any]) -> None:
+        """
+        Add the simulation record of a text (keyed by its index) or a speaker (keyed by the title).
+
+        Args:
+            key (Any): The key of the record in the calculator's results.
+            record (Dict[str, Any]): The record, with 'simulation' and 'emotion dimension' fields.
+        """
+        self._buffer.append((key, record))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered records."""
+        if self._buffer:
+            self._write_records(self._buffer)
+            self._buffer = []
+
+    def close(self) -> None:
+        """Write the buffered records and finalize the storage."""
+        self.flush()
+
+    @abc.abstractmethod
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        """Store a batch of buffered (key, record) pairs, in order."""
+
+    def _check_dimensions(self, record: Dict[str, Any]) -> int:
+        # Records of a run share one emotion dimension index, so it is only compared when it changes.
+        source = record['emotion dimension']
+        if source is not self._dimensions_source:
+            emotion_dimensions = [str(dimension) for dimension in source]
+            if self.emotion_dimensions is None:
+                self.emotion_dimensions = emotion_dimensions
+            elif emotion_dimensions != self.emotion_dimensions:
+                raise ValueError(f"{self.path} holds results over different emotion dimensions.")
+            self._dimensions_source = source
+        return len(self.emotion_dimensions)
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class JsonSink(ResultSink):
+    def __init__(self, path: str):
+        """
+        Initialize the JsonSink, which writes the results as one JSON document when it is closed.
+
+        This is the original output format, `pd.DataFrame(results).to_json(orient='records', lines=True)`. It
+        cannot be appended to and stores the trajectories as nested JSON lists, so prefer `NpySink` or
+        `ParquetSink` for large runs.
+
+        Args:
+            path (str): The `.json` file to write.
+        """
+        super().__init__(path)
+        self._results = {}
+
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        for key, record in records:
+            self._results.setdefault(key, []).append(record)
+
+    def close(self) -> None:
+        self.flush()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        frame = pd.DataFrame(self._results)
+        write_atomic(self.path, lambda f: frame.to_json(f, orient='records', lines=True, indent=4))
+
+
+class NpySink(ResultSink):
+    def __init__(self, path: str, buffer_size: int = 1024):
+        """
+        Initialize the NpySink, which appends the results to a directory of NumPy and CSV files.
+
+        - `states.npy`: every simulated state, as one contiguous (rows, d) array, float32 if the first record's
+          states are float32 and float64 otherwise;
+        - `metadata.csv`: one row per record, with its key, speaker and texts (as JSON lists) and the `start`
+          and `stop` rows of its states;
+        - `meta.json`: the emotion dimensions, the number of rows and which fields hold texts, written when the
+          sink is closed.
+
+        Use `load_results` to read the directory back with the states memory-mapped.
+
+        Args:
+            path (str): The output directory. Existing results in it are replaced.
+            buffer_size (int): The number of records written at a time.
+        """
+        super().__init__(path, buffer_size)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name in ('meta.json', 'metadata.csv'):
+            if (self.path / name).exists():
+                (self.path / name).unlink()
+        self._states = open(self.path / 'states.npy', 'w+b')
+        self._metadata = None
+        self._list_fields = []
+        self._string_fields = []
+        self._dtype = np.dtype('<f8')
+        self.rows = 0
+
+    def _states_header(self, d: int) -> bytes:
+        # numpy pads the header so that it keeps its size while the first dimension grows.
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr': self._dtype.str, 'fortran_order': False,
+                                                      'shape': (self.rows, d)})
+        return header.getvalue()
+
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        rows = []
+        for key, record in records:
+            if self.emotion_dimensions is None:
+                if np.asarray(record['simulation']).dtype == np.float32:
+                    self._dtype = np.dtype('<f4')
+                self._states.write(self._states_header(len(record['emotion dimension'])))
+            metadata, states = _split_record(key, record, self._check_dimensions(record))
+            for field, value in metadata.items():
+                if isinstance(value, list):
+                    metadata[field] = json.dumps(value)
+                    if field not in self._list_fields:
+                        self._list_fields.append(field)
+                elif isinstance(value, str) and field not in self._string_fields:
+                    self._string_fields.append(field)
+            metadata.update(start=self.rows, stop=self.rows + len(states))
+            rows.append(metadata)
+            self._states.write(states.astype(self._dtype, copy=False).tobytes())
+            self.rows += len(states)
+        self._states.flush()
+
+        chunk = pd.DataFrame(rows)
+        if self._metadata is None:
+            self._metadata = ChunkWriter(str(self.path / 'metadata.csv'), list(chunk.columns))
+        self._metadata.write(chunk)
+
+    def close(self) -> None:
+        if self._states.closed:
+            return
+        try:
+            self.flush()
+        except BaseException:
+            # The files are released, but meta.json is not written: the directory is not a complete result.
+            self._states.close()
+            if self._metadata is not None:
+                self._metadata.close()
+            raise
+        try:
+            if self.emotion_dimensions is None:
+                self._states.write(self._states_header(0))
+            else:
+                header = self._states_header(len(self.emotion_dimensions))
+                size = len(header) + self.rows * len(self.emotion_dimensions) * self._dtype.itemsize
+                if self._states.seek(0, io.SEEK_END) != size:
+                    raise RuntimeError(f"{self.path / 'states.npy'} does not match its header.")
+                self._states.seek(0)
+                self._states.write(header)
+        finally:
+            self._states.close()
+            if self._metadata is not None:
+                self._metadata.close()
+        write_json_atomic(self.path / 'meta.json', {
+            'format': NPY_FORMAT_VERSION,
+            'emotion_dimensions': self.emotion_dimensions or [],
+            'rows': self.rows,
+            'list_fields': self._list_fields,
+            'string_fields': self._string_fields,
+        })
+
+
+class ParquetSink(ResultSink):
+    def __init__(self, path: str, buffer_size: int = 1024, compression: str = 'zstd'):
+        """
+        Initialize the ParquetSink, which appends the results to a Parquet file, one row group per buffer.
+
+        Each record is one row with its key, speaker and texts, and its trajectory in a `simulation` column of
+        fixed-size float64 (or float32) lists, so all states are stored contiguously. Requires pyarrow.
+
+        Args:
+            path (str): The `.parquet` file to write. An existing file is replaced.
+            buffer_size (int): The number of records per row group.
+            compression (str): The Parquet compression codec.
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as error:
+            raise ImportError("ParquetSink requires pyarrow; install it with `pip install pyarrow`.") from error
+        super().__init__(path, buffer_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self._writer = None
+
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {}
+        all_states = []
+        for key, record in records:
+            metadata, states = _split_record(key, record, self._check_dimensions(record))
+            for field, value in metadata.items():
+                columns.setdefault(field, []).append(value)
+            all_states.append(states)
+
+        d = len(self.emotion_dimensions)
+        offsets = np.concatenate([[0], np.cumsum([len(states) for states in all_states])]).astype(np.int32)
+        flat = np.concatenate(all_states).ravel() if all_states else np.empty(0)
+        simulation = pa.ListArray.from_arrays(pa.array(offsets), pa.FixedSizeListArray.from_arrays(pa.array(flat), d))
+        arrays = [pa.array(values, type=None if not isinstance(values[0], list)
+                           else pa.list_(pa.int64() if field in _INTEGER_LIST_FIELDS else pa.string()))
+                  for field, values in columns.items()]
+        table = pa.Table.from_arrays([*arrays, simulation], names=[*columns, 'simulation'])
+
+        if self._writer is None:
+            schema = table.schema.with_metadata({'emotion_dimensions': json.dumps(self.emotion_dimensions)})
+            self._writer = pq.ParquetWriter(str(self.path), schema, compression=self.compression)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+class NullSink(ResultSink):
+    def __init__(self):
+        """Initialize the NullSink, which stores nothing: the results are only returned by the calculator."""
+        super().__init__(None, 0)
+
+    def write(self, key: Any, record: Dict[str, Any]) -> None:
+        pass
+
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        pass
+
+
+# Control messages of a BackgroundSink's queue, next to the (key, record) pairs.
+_FLUSH = object()
+_CLOSE = object()
+
+
+class BackgroundSink(ResultSink):
+    def __init__(self, sink: ResultSink, max_pending: int = 4096):
+        """
+        Initialize the BackgroundSink, which hands records to another sink on a writer thread.
+
+        The caller only pays for putting the record in a queue; the serialization and the disk I/O happen on the
+        thread. Once `max_pending` records are waiting, `write` blocks until the thread catches up. An error of
+        the wrapped sink is raised by the next `flush` or `close`; the wrapped sink is closed all the same.
+
+        Args:
+            sink (ResultSink): The sink that stores the records; it is closed with this one.
+            max_pending (int): Maximum number of records waiting for the thread.
+        """
+        self.sink = sink
+        super().__init__(sink.path, sink.buffer_size)
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.path}", daemon=True)
+        self._thread.start()
+
+    @property
+    def emotion_dimensions(self) -> Optional[List[str]]:
+        return self.sink.emotion_dimensions
+
+    @emotion_dimensions.setter
+    def emotion_dimensions(self, value: Optional[List[str]]) -> None:
+        # The wrapped sink sets and checks the dimensions on the writer thread; only the base class's None is
+        # accepted here.
+        if value is not None:
+            raise AttributeError("The emotion dimensions of a BackgroundSink are those of the sink it wraps.")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _CLOSE:
+                    # The wrapped sink is closed even after an error, so that it releases its files.
+                    self.sink.close()
+                elif self._error is not None:
+                    continue
+                elif item is _FLUSH:
+                    self.sink.flush()
+                else:
+                    self.sink.write(*item)
+            except BaseException as error:
+                if self._error is None:
+                    self._error = error
+            finally:
+                self._queue.task_done()
+                if item is _CLOSE:
+                    return
+
+    def _raise_error(self) -> None:
+        # Records after a failed one are dropped, so the error is raised again by every later call.
+        if self._error is not None:
+            raise self._error
+
+    def write(self, key: Any, record: Dict[str, Any]) -> None:
+        # Records are not buffered here: the queue is the buffer.
+        self._write_records([(key, record)])
+
+    def _write_records(self, records: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        for item in records:
+            self._queue.put(item)
+
+    def flush(self) -> None:
+        """Wait until the thread has written every record, and flush the wrapped sink."""
+        self._queue.put(_FLUSH)
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        self._raise_error()
+
+
+def open_sink(path: str, buffer_size: int = 1024) -> ResultSink:
+    """
+    Open the sink matching a path: `.json` for `JsonSink`, `.parquet` for `ParquetSink`, a directory otherwise.
+
+    Args:
+        path (str): Where the results are stored.
+        buffer_size (int): The number of records written at a time.
+
+    Returns:
+        ResultSink: The sink.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.json':
+        return JsonSink(path)
+    if suffix == '.parquet':
+        return ParquetSink(path, buffer_size)
+    return NpySink(path, buffer_size)
+
+
+def load_results(path: Union[str, Path], mmap_mode: Optional[str] = 'r') -> Results:
+    """
+    Read back the results of an `NpySink` directory or a `ParquetSink` file.
+
+    Record i's trajectory is `states[metadata['start'][i]:metadata['stop'][i]]`.
+
+    Args:
+        path (Union[str, Path]): The results directory or `.parquet` file.
+        mmap_mode (Optional[str]): How `states.npy` is memory-mapped (None to read it into memory). Parquet
+            files are memory-mapped while they are decoded.
+
+    Returns:
+        Results: The metadata, the states and the emotion dimensions.
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.parquet':
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(str(path), memory_map=True)
+        emotion_dimensions = json.loads(table.schema.metadata[b'emotion_dimensions'])
+        simulation = table.column('simulation').combine_chunks()
+        metadata = table.drop_columns(['simulation']).to_pandas()
+        stop = np.cumsum(pc.list_value_length(simulation).to_numpy(zero_copy_only=False))
+        metadata['start'] = stop - pc.list_value_length(simulation).to_numpy(zero_copy_only=False)
+        metadata['stop'] = stop
+        states = simulation.flatten().flatten().to_numpy().reshape(-1, len(emotion_dimensions))
+        return Results(metadata, states, emotion_dimensions)
+
+    meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+    if meta['format'] != NPY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported results format {meta['format']} in {path}.")
+    metadata_path = path / 'metadata.csv'
+    if metadata_path.exists():
+        # Texts such as 'NA', '007' or '1e3' stay strings; only empty fields are missing.
+        text_fields = {field: str for field in [*meta.get('string_fields', []), *meta['list_fields']]}
+        metadata = pd.read_csv(metadata_path, dtype=text_fields, keep_default_na=False, na_values=[''])
+    else:
+        metadata = pd.DataFrame(columns=['key', 'start', 'stop'])
+    for field in meta['list_fields']:
+        metadata[field] = metadata[field].map(lambda value: json.loads(value) if isinstance(value, str) else value)
+    states = np.load(path / 'states.npy', mmap_mode=mmap_mode)
+    return Results(metadata, states, meta['emotion_dimensions'])
@@ -0,0 +1,330 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Dormand-Prince 5(4) coefficients (the pair used by scipy's RK45).
+_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+]
+_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+_E = np.array([71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40])
+# States whose components grow beyond this are integrated with odeint, as in the per-state path; see
+# `integrate_batch`.
+FALLBACK_NORM = 10.0
+
+
+def pressure_terms(rho_sent: np.ndarray, p_sent: np.ndarray) -> np.ndarray:
+    """
+    Calculate the pressure term of the sentiment flow for a batch of states.
+
+    The pressure does not depend on the state, so this only needs to be computed once per integration.
+
+    Args:
+        rho_sent (np.ndarray): (n,) sentiment densities.
+        p_sent (np.ndarray): (n, d) sentiment pressures.
+
+    Returns:
+        np.ndarray: (n, d) pressure terms, zero where the density is zero.
+    """
+    pressure_term = np.zeros_like(p_sent, dtype=float)
+    nonzero = rho_sent != 0
+    pressure_term[nonzero] = (-1 / rho_sent[nonzero])[:, None] * np.gradient(p_sent[nonzero], axis=1)
+    return pressure_term
+
+
+def gradient(f: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Gradient along the last axis with unit spacing.
+
+    Same formulas, and therefore bit-identical results, as `np.gradient(f, axis=-1)`: central differences
+    inside, first-order one-sided differences at the edges. It skips `np.gradient`'s argument handling,
+    which dominates the cost for the short emotion vectors integrated here.
+
+    Args:
+        f (np.ndarray): (..., d) values, d >= 2.
+        out (Optional[np.ndarray]): Float array of the same shape to write the gradient into.
+
+    Returns:
+        np.ndarray: (..., d) gradient.
+    """
+    if out is None:
+        out = np.empty_like(f, dtype=float)
+    np.subtract(f[..., 2:], f[..., :-2], out=out[..., 1:-1])
+    out[..., 1:-1] /= 2.0
+    np.subtract(f[..., 1:2], f[..., 0:1], out=out[..., 0:1])
+    np.subtract(f[..., -1:], f[..., -2:-1], out=out[..., -1:])
+    return out
+
+
+def _batched_rhs(s: np.ndarray, pressure_term: np.ndarray, nu_sent: np.ndarray,
+                 g_context: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    grad_s = gradient(s)
+    laplacian_s = gradient(grad_s)
+    rhs = s * grad_s + pressure_term + nu_sent[:, None] * laplacian_s + g_context[:, None]
+    np.clip(rhs, -1e10, 1e10, out=rhs)
+    finite = np.isfinite(s).all(axis=1) & np.isfinite(grad_s).all(axis=1) & ~np.isnan(rhs).any(axis=1)
+    return rhs, finite
+
+
+def batched_navier_stokes_rhs(s: np.ndarray, pressure_term: np.ndarray, nu_sent: np.ndarray,
+                              g_context: np.ndarray) -> np.ndarray:
+    """
+    Calculate the Navier-Stokes sentiment flow for a batch of states at once.
+
+    Row i is computed exactly as `SentimentFlowCalculator._navier_stokes_sentiment_flow` would for state i.
+
+    Args:
+        s (np.ndarray): (n, d) sentiment states.
+        pressure_term (np.ndarray): (n, d) pressure terms, see `pressure_terms`.
+        nu_sent (np.ndarray): (n,) sentiment viscosities.
+        g_context (np.ndarray): (n,) external contextual forces.
+
+    Returns:
+        np.ndarray: (n, d) sentiment flows.
+
+    Raises:
+        ValueError: If a state, its gradient or its flow is not finite.
+    """
+    rhs, finite = _batched_rhs(s, pressure_term, nu_sent, g_context)
+    if not finite.all():
+        raise ValueError("Invalid sentiment flow calculation")
+    return rhs
+
+
+def navier_stokes_rhs(s: np.ndarray, _t: float, pressure_term: np.ndarray, nu_sent: float,
+                      g_context: float) -> np.ndarray:
+    """
+    Calculate the Navier-Stokes sentiment flow of a single state, in `odeint` argument order.
+
+    Args:
+        s (np.ndarray): (d,) sentiment state.
+        _t (float): Time (the flow is autonomous).
+        pressure_term (np.ndarray): (d,) pressure term, see `pressure_terms`.
+        nu_sent (float): Sentiment viscosity.
+        g_context (float): External contextual force.
+
+    Returns:
+        np.ndarray: (d,) sentiment flow.
+
+    Raises:
+        ValueError: If the state, its gradient or its flow is not finite.
+    """
+    grad_s = gradient(s)
+    if not (np.isfinite(s).all() and np.isfinite(grad_s).all()):
+        raise ValueError("Invalid sentiment flow calculation")
+    rhs = s * grad_s + pressure_term + nu_sent * gradient(grad_s) + g_context
+    np.clip(rhs, -1e10, 1e10, out=rhs)
+    if np.isnan(rhs).any():
+        raise ValueError("Invalid sentiment flow calculation")
+    return rhs
+
+
+class FlowRHS:
+    def __init__(self, pressure_term: np.ndarray, nu_sent: float, g_context: float):
+        """
+        Initialize the FlowRHS, the allocation-free, non-raising flow of one document for the ODE solvers.
+
+        Every evaluation works in buffers allocated here and returns the same output buffer, so callers that
+        keep the result across evaluations must copy it (`odeint` does). Instead of raising, a non-finite state,
+        gradient or flow sets `diverged`, and from then on the flow is zero so the solver finishes quickly;
+        the integration result is then meaningless and the document should be skipped.
+
+        Args:
+            pressure_term (np.ndarray): (d,) pressure term, see `pressure_terms`.
+            nu_sent (float): Sentiment viscosity.
+            g_context (float): External contextual force.
+        """
+        self.pressure_term = np.asarray(pressure_term, dtype=float)
+        self.nu_sent = nu_sent
+        self.g_context = g_context
+        self.diverged = False
+        d = len(self.pressure_term)
+        # The gradient and the clipped flow share one buffer so that a single scan checks both: the flow is
+        # clipped first, so it can only be non-finite by being NaN, as in `navier_stokes_rhs`.
+        self._buffer = np.empty((2, d))
+        self._grad_s, self._rhs = self._buffer
+        self._laplacian_s = np.empty(d)
+        self._finite = np.empty((2, d), dtype=bool)
+
+    def __call__(self, s: np.ndarray, _t: float = 0.0) -> np.ndarray:
+        """
+        Evaluate the flow, with the same results as `navier_stokes_rhs`.
+
+        A non-finite state always shows up in its gradient, so the gradient is checked instead of the state.
+
+        Args:
+            s (np.ndarray): (d,) sentiment state.
+            _t (float): Time (the flow is autonomous).
+
+        Returns:
+            np.ndarray: (d,) sentiment flow, in a buffer reused by the next evaluation.
+        """
+        rhs = self._rhs
+        if self.diverged:
+            return rhs
+        grad_s = gradient(s, out=self._grad_s)
+        laplacian_s = gradient(grad_s, out=self._laplacian_s)
+        np.multiply(s, grad_s, out=rhs)
+        rhs += self.pressure_term
+        laplacian_s *= self.nu_sent
+        rhs += laplacian_s
+        rhs += self.g_context
+        np.clip(rhs, -1e10, 1e10, out=rhs)
+        if not np.isfinite(self._buffer, out=self._finite).all():
+            self.diverged = True
+            rhs.fill(0.0)
+        return rhs
+
+
+def _rms(x: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.mean(x * x, axis=1))
+
+
+def _dopri5(y0: np.ndarray, t0: float, t1: float, pressure_term: np.ndarray, nu_sent: np.ndarray,
+            g_context: np.ndarray, rtol: float, atol: float, max_steps: int,
+            fallback_norm: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Integrate every row from t0 to t1 with its own adaptive Dormand-Prince step size.
+
+    Rows are independent systems: each one gets its own step size and error control, so a stiff or exploding
+    row never forces smaller steps (or a different error norm) on the others. Every step evaluates the RHS
+    for all rows that have not reached t1 yet in a single vectorized call. A trial step that produces a
+    non-finite flow is rejected like an inaccurate one. A row is dropped once a component of its state grows
+    beyond `fallback_norm` in magnitude.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The states at t1, and the rows that did not reach t1 within `max_steps`
+            steps or were dropped (their states are meaningless).
+    """
+    def rhs(s: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return _batched_rhs(s, pressure_term[rows], nu_sent[rows], g_context[rows])
+
+    y = np.array(y0, dtype=float)
+    n = len(y)
+    rows = np.arange(n)
+    f, finite = rhs(y, rows)
+    remaining = np.where(finite, float(t1 - t0), np.inf)
+
+    # Initial step size, as in Hairer, Norsett & Wanner (and scipy's select_initial_step).
+    with np.errstate(all='ignore'):
+        scale = atol + rtol * np.abs(y)
+        d0 = _rms(y / scale)
+        d1 = _rms(f / scale)
+        h0 = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / d1)
+        f1, _ = rhs(y + h0[:, None] * f, rows)
+        d2 = _rms((f1 - f) / scale) / h0
+        d12 = np.maximum(d1, d2)
+        h1 = np.where(d12 <= 1e-15, np.maximum(1e-6, h0 * 1e-3), (0.01 / d12) ** (1 / 5))
+    h = np.minimum(np.minimum(100 * h0, h1), float(t1 - t0))
+    h = np.where(np.isfinite(h), h, 1e-6)
+
+    active = rows[finite]
+    dropped = np.zeros(n, dtype=bool)
+    for _ in range(max_steps):
+        if active.size == 0:
+            break
+        ya, ha = y[active], h[active][:, None]
+        k = [f[active]]
+        stages_finite = np.ones(len(active), dtype=bool)
+        with np.errstate(all='ignore'):
+            for a_row in _A[1:]:
+                k_j, finite = rhs(ya + ha * sum(a * k_i for a, k_i in zip(a_row, k)), active)
+                k.append(k_j)
+                stages_finite &= finite
+            y_new = ya + ha * sum(b * k_i for b, k_i in zip(_B, k) if b != 0)
+            k_last, finite = rhs(y_new, active)
+            k.append(k_last)
+            stages_finite &= finite
+
+            error = ha * sum(e * k_i for e, k_i in zip(_E, k) if e != 0)
+            error_norm = _rms(error / (atol + rtol * np.maximum(np.abs(ya), np.abs(y_new))))
+        error_norm[~stages_finite | np.isnan(error_norm)] = np.inf
+        accepted = error_norm <= 1
+
+        done = active[accepted]
+        y[done] = y_new[accepted]
+        f[done] = k_last[accepted]
+        last_step = h[done] >= remaining[done]
+        remaining[done] = np.where(last_step, 0.0, remaining[done] - h[done])
+
+        with np.errstate(divide='ignore'):
+            factor = np.where(error_norm == 0, 10.0, 0.9 * error_norm ** (-1 / 5))
+        factor = np.where(accepted, np.clip(factor, 0.2, 10.0), np.clip(factor, 0.2, 1.0))
+        h[active] = np.minimum(h[active] * factor, remaining[active])
+        active = active[remaining[active] > 0]
+
+        grown = done[np.abs(y[done]).max(axis=1) > fallback_norm]
+        if grown.size:
+            dropped[grown] = True
+            active = active[~dropped[active]]
+
+    return y, np.flatnonzero((remaining > 0) | dropped)
+
+
+def integrate_batch(s0: np.ndarray, rho_sent: np.ndarray, p_sent: np.ndarray, nu_sent: np.ndarray,
+                    g_context: np.ndarray, t: np.ndarray, rtol: float = 1e-8, atol: float = 1e-10,
+                    max_steps: int = 500, on_divergence: str = 'raise',
+                    fallback_norm: float = FALLBACK_NORM) -> np.ndarray:
+    """
+    Integrate the sentiment flow of many independent states together.
+
+    The states are stacked into one (n, d) array and advanced with a vectorized Dormand-Prince scheme in which
+    every row keeps its own adaptive step size. The RHS is evaluated once per stage for all states instead of
+    once per state.
+
+    The two solvers only agree within their tolerances while a flow stays small: once it blows up, the error of
+    each is amplified, and their results drift apart by far more than the tolerances (about 1e-4 relative for a
+    state that grows to 1e3). States that grow beyond `fallback_norm`, that do not reach the next time point
+    within `max_steps` steps, or whose flow stops being finite are therefore integrated on their own with
+    `odeint`, exactly as the per-state path does, and give the same results. With the default `fallback_norm`,
+    every other state is within about 1e-5 relative of the per-state path. If the flow of a state integrated
+    with `odeint` stops being finite, the state has diverged.
+
+    Args:
+        s0 (np.ndarray): (n, d) initial sentiment states.
+        rho_sent (np.ndarray): (n,) sentiment densities.
+        p_sent (np.ndarray): (n, d) sentiment pressures.
+        nu_sent (np.ndarray): (n,) sentiment viscosities.
+        g_context (np.ndarray): (n,) external contextual forces.
+        t (np.ndarray): The time points to report, starting with the time of `s0`.
+        rtol (float): Relative tolerance of every state.
+        atol (float): Absolute tolerance of every state.
+        max_steps (int): Maximum number of vectorized steps per state between two time points.
+        on_divergence (str): `'raise'` to raise on a diverged state, `'skip'` to fill its trajectory with NaN.
+        fallback_norm (float): The largest magnitude of a state component integrated with the vectorized scheme.
+
+    Returns:
+        np.ndarray: (len(t), n, d) trajectories.
+
+    Raises:
+        ValueError: If a state diverges and `on_divergence` is `'raise'`.
+    """
+    from scipy.integrate import odeint
+
+    s0 = np.asarray(s0, dtype=float)
+    pressure_term = pressure_terms(np.asarray(rho_sent, dtype=float), np.asarray(p_sent, dtype=float))
+    nu_sent = np.asarray(nu_sent, dtype=float)
+    g_context = np.asarray(g_context, dtype=float)
+
+    trajectories = np.empty((len(t),) + s0.shape)
+    trajectories[0] = s0
+    batched = np.arange(len(s0))
+    for i in range(1, len(t)):
+        states, fallback = _dopri5(trajectories[i - 1, batched], t[i - 1], t[i], pressure_term[batched],
+                                   nu_sent[batched], g_context[batched], rtol, atol, max_steps, fallback_norm)
+        trajectories[i, batched] = states
+        for row in batched[fallback]:
+            flow = FlowRHS(pressure_term[row], nu_sent[row], g_context[row])
+            trajectories[i - 1:, row] = odeint(flow, trajectories[i - 1, row], t[i - 1:])
+            if flow.diverged:
+                if on_divergence == 'raise':
+                    raise ValueError("Invalid sentiment flow calculation")
+                trajectories[:, row] = np.nan
+        batched = np.delete(batched, fallback)
+    return trajectories
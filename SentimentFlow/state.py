@@ -0,0 +1,140 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from SentimentFlow.cache import decode_array, encode_array
+
+STATE_SCHEMA_VERSION = 1
+# SQLite limits the number of parameters of a statement.
+_MAX_PARAMETERS = 500
+
+
+class SpeakerState(NamedTuple):
+    """
+    Where the sentiment flow of a speaker stopped, so that later speeches continue from there.
+
+    Attributes:
+        title (Any): The title of the speaker's first speech, which keys the speaker's results.
+        state (np.ndarray): The last state of the flow.
+        time (int): The time of the last state; every speech advances the flow by one unit.
+        rows (int): The number of speeches of the speaker seen so far.
+        first_speech (str): The first speech, which drives the first step of the flow.
+        first_polarity (float): Its polarity.
+        diverged (bool): Whether the flow diverged; later speeches are then skipped.
+    """
+    title: Any
+    state: np.ndarray
+    time: int
+    rows: int
+    first_speech: str
+    first_polarity: float
+    diverged: bool
+
+
+def _encode_key(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+class SpeakerStateStore:
+    def __init__(self, path: str):
+        """
+        Initialize the SpeakerStateStore, a persistent record of where every speaker's sentiment flow stopped.
+
+        Passed to `SentimentFlowCalculator.calculate_navier_stocker_for_speeches`, it lets a run only integrate
+        the speeches appended since the previous one, starting from the stored states. The number of speeches
+        seen per speaker tells which speeches of a full history are new. The store fixes the
+        emotion dimensions of the flows the first time it is saved to; later runs use the same dimensions.
+        It is an SQLite database, and a run's states are saved in one transaction when the run is done.
+
+        Args:
+            path (str): The SQLite database file, created if needed.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS speakers (
+                    speaker TEXT PRIMARY KEY, title TEXT NOT NULL, state BLOB NOT NULL, time INTEGER NOT NULL,
+                    rows INTEGER NOT NULL, first_speech TEXT NOT NULL, first_polarity REAL NOT NULL,
+                    diverged INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+                INSERT OR IGNORE INTO meta VALUES ('schema', '%d');
+            """ % STATE_SCHEMA_VERSION)
+        schema = int(self._meta('schema'))
+        if schema != STATE_SCHEMA_VERSION:
+            raise ValueError(f"{self.path} is a state store of schema {schema}; expected {STATE_SCHEMA_VERSION}.")
+
+    def _meta(self, name: str) -> Optional[str]:
+        row = self._connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    @property
+    def emotion_dimensions(self) -> Optional[List[str]]:
+        """The emotion dimensions of the stored states, or None if nothing was saved yet."""
+        value = self._meta('emotion_dimensions')
+        return None if value is None else json.loads(value)
+
+    def get_many(self, speakers: Iterable[Any]) -> Dict[Any, SpeakerState]:
+        """
+        Look up the states of several speakers.
+
+        Args:
+            speakers (Iterable[Any]): The speakers.
+
+        Returns:
+            Dict[Any, SpeakerState]: The stored state of every speaker that has one.
+        """
+        speakers = {_encode_key(speaker): speaker for speaker in speakers}
+        keys = list(speakers)
+        found = {}
+        for start in range(0, len(keys), _MAX_PARAMETERS):
+            batch = keys[start:start + _MAX_PARAMETERS]
+            query = (f"SELECT speaker, title, state, time, rows, first_speech, first_polarity, diverged "
+                     f"FROM speakers WHERE speaker IN ({','.join('?' * len(batch))})")
+            for key, title, state, time, rows, first_speech, first_polarity, diverged in (
+                    self._connection.execute(query, batch)):
+                found[speakers[key]] = SpeakerState(json.loads(title), decode_array(state), time, rows, first_speech,
+                                                    first_polarity, bool(diverged))
+        return found
+
+    def save(self, states: Dict[Any, SpeakerState], emotion_dimensions: Sequence[str]) -> None:
+        """
+        Store the states of a run, in one transaction.
+
+        Args:
+            states (Dict[Any, SpeakerState]): The new state of every speaker of the run.
+            emotion_dimensions (Sequence[str]): The emotion dimensions of the states.
+
+        Raises:
+            ValueError: If the store holds states over other emotion dimensions.
+        """
+        emotion_dimensions = [str(dimension) for dimension in emotion_dimensions]
+        stored = self.emotion_dimensions
+        if stored is not None and stored != emotion_dimensions:
+            raise ValueError(f"{self.path} holds states over different emotion dimensions.")
+        with self._connection:
+            if stored is None:
+                self._connection.execute("INSERT INTO meta VALUES ('emotion_dimensions', ?)",
+                                         (json.dumps(emotion_dimensions),))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO speakers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(_encode_key(speaker), _encode_key(state.title), encode_array(state.state), int(state.time),
+                  int(state.rows), str(state.first_speech), float(state.first_polarity), int(state.diverged))
+                 for speaker, state in states.items()]
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM speakers").fetchone()[0]
+
+    def __enter__(self) -> "SpeakerStateStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,194 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List
+
+import pandas as pd
+
+
+def read_chunks(input_path: str, chunk_size: int, skip_rows: int = 0, **csv_options: Any) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or JSON-lines file in chunks of rows.
+
+    Args:
+        input_path (str): The path of the input file (`.csv`, `.jsonl` or `.json` with one record per line).
+        chunk_size (int): The number of rows per chunk.
+        skip_rows (int): The number of leading data rows to skip, e.g. when resuming from a checkpoint.
+        **csv_options (Any): Further arguments of `pd.read_csv` for CSV files, e.g. `keep_default_na=False`.
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks, in file order.
+    """
+    suffix = Path(input_path).suffix.lower()
+    if suffix == '.csv':
+        # Skipped rows are never parsed; the header (line 0) is kept.
+        yield from pd.read_csv(input_path, chunksize=chunk_size, skiprows=range(1, skip_rows + 1), **csv_options)
+    elif suffix in ('.jsonl', '.json'):
+        for chunk in pd.read_json(input_path, lines=True, chunksize=chunk_size):
+            if skip_rows >= len(chunk):
+                skip_rows -= len(chunk)
+                continue
+            yield chunk.iloc[skip_rows:]
+            skip_rows = 0
+    else:
+        raise ValueError(f"Unsupported input format: {input_path}. Use .csv or .jsonl")
+
+
+def write_atomic(path: Path, write: Callable[[IO[str]], None]) -> None:
+    """
+    Write a text file so that readers never see it partially written.
+
+    The content goes to a temporary file next to `path`, which then replaces it. Concurrent writers of the same
+    path do not interleave; the last one to finish wins.
+
+    Args:
+        path (Path): The destination path.
+        write (Callable[[IO[str]], None]): Writes the content to the open temporary file.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
+    """
+    Write a JSON document so that readers never see a partially written file.
+
+    Args:
+        path (Path): The destination path.
+        payload (Dict[str, Any]): The JSON-serializable document.
+    """
+    write_atomic(path, lambda f: json.dump(payload, f))
+
+
+def write_csv_atomic(path: Path, frame: pd.DataFrame) -> None:
+    """
+    Write a DataFrame as CSV, without its index, so that readers never see a partially written file.
+
+    Args:
+        path (Path): The destination path; its directory is created if needed.
+        frame (pd.DataFrame): The rows to write.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, lambda f: frame.to_csv(f, index=False))
+
+
+class ChunkWriter:
+    def __init__(self, output_path: str, columns: List[str], truncate_to: int = 0):
+        """
+        Initialize the ChunkWriter, which appends result chunks to a CSV or JSON-lines file.
+
+        CSV files get the fixed `columns` as header, so chunks with different emotions line up. JSON-lines
+        files get one record per row with the zero emotions left out.
+
+        Args:
+            output_path (str): The path of the output file (`.csv` or `.jsonl`).
+            columns (List[str]): The full, ordered list of output columns.
+            truncate_to (int): Size in bytes to truncate an existing output file to before appending;
+                anything written after the last checkpoint is discarded.
+        """
+        self.output_path = Path(output_path)
+        self.columns = columns
+        self.format = self.output_path.suffix.lower()
+        if self.format not in ('.csv', '.jsonl'):
+            raise ValueError(f"Unsupported output format: {output_path}. Use .csv or .jsonl")
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.output_path.exists() and self.output_path.stat().st_size < truncate_to:
+            raise ValueError(f"{output_path} is shorter than its checkpoint; cannot resume.")
+        self._file = open(self.output_path, 'a+b')
+        self._file.truncate(truncate_to)
+        self._file.seek(truncate_to)
+
+    def write(self, chunk: pd.DataFrame) -> int:
+        """
+        Append a chunk and flush it to disk.
+
+        Args:
+            chunk (pd.DataFrame): The result rows, with a subset of the writer's columns.
+
+        Returns:
+            int: The size of the output file after the write, in bytes.
+        """
+        chunk = chunk.reindex(columns=self.columns)
+        if self.format == '.csv':
+            data = chunk.to_csv(index=False, header=self._file.tell() == 0)
+        else:
+            data = ''.join(
+                json.dumps({key: value for key, value in record.items() if not (isinstance(value, float) and value == 0)}) + '\n'
+                for record in chunk.to_dict(orient='records')
+            )
+        self._file.write(data.encode('utf-8'))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Checkpoint:
+    def __init__(self, path: str, input_path: str, output_path: str):
+        """
+        Initialize the Checkpoint, which records how far a chunked run has gone.
+
+        Args:
+            path (str): Where the checkpoint is stored.
+            input_path (str): The input file of the run.
+            output_path (str): The output file of the run.
+        """
+        self.path = Path(path)
+        self.input_path = str(input_path)
+        self.output_path = str(output_path)
+        self.rows_done = 0
+        self.output_bytes = 0
+
+    def load(self) -> "Checkpoint":
+        """
+        Restore the progress of a previous run, if any.
+
+        Returns:
+            Checkpoint: This checkpoint.
+        """
+        if not self.path.exists():
+            return self
+        state = json.loads(self.path.read_text(encoding='utf-8'))
+        if (state['input_path'], state['output_path']) != (self.input_path, self.output_path):
+            raise ValueError(f"Checkpoint {self.path} belongs to a run of {state['input_path']} -> {state['output_path']}.")
+        self.rows_done = state['rows_done']
+        self.output_bytes = state['output_bytes']
+        return self
+
+    def save(self, rows_done: int, output_bytes: int) -> None:
+        """
+        Record the progress, once the corresponding output has been flushed.
+
+        Args:
+            rows_done (int): The number of input rows processed so far.
+            output_bytes (int): The size of the output file holding exactly those rows.
+        """
+        self.rows_done = rows_done
+        self.output_bytes = output_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.path, {
+            'input_path': self.input_path,
+            'output_path': self.output_path,
+            'rows_done': rows_done,
+            'output_bytes': output_bytes,
+        })
+
@@ -0,0 +1,279 @@
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.cache import CacheStats
+from SentimentFlow.emotion_matrix import EmotionMatrix, dense_rows
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.solver import integrate_batch
+
+# The multipliers of a parameter set, in the order of the flow's terms: the density divides the pressure
+# gradient, the viscosity scales the Laplacian and the context force is added to the flow.
+PARAMETERS = ('density', 'pressure', 'viscosity', 'context')
+
+# The maximum number of batches of flows a chunk of parameter sets holds.
+_CHUNK_BATCHES = 64
+
+_worker_sweep = None
+
+
+def _init_sweep_worker(sweep: "ParameterSweep") -> None:
+    global _worker_sweep
+    _worker_sweep = sweep
+
+
+def _sweep_task(task: Tuple[np.ndarray, int]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    # Each task reports its own integration work, metrics and cache lookups for the parent to add up.
+    calculator = _worker_sweep.calculator
+    calculator._start_run()
+    calculator.metrics.reset()
+    if calculator.cache is not None:
+        calculator.cache.stats = CacheStats()
+    states = _worker_sweep._final_states(*task)
+    report = {'stats': calculator.integrator.stats, 'diverged': [], 'metrics': calculator.metrics}
+    if calculator.cache is not None:
+        calculator.cache.flush()
+        report['cache'] = calculator.cache.stats
+    return states, report
+
+
+def parameter_grid(**values: Sequence[float]) -> pd.DataFrame:
+    """
+    Build every combination of the given multipliers, like nested loops with the last parameter innermost.
+
+    Args:
+        **values (Sequence[float]): The multipliers to try for some of `PARAMETERS`, e.g.
+            `viscosity=[0.5, 1, 2]`. The other parameters are 1.
+
+    Returns:
+        pd.DataFrame: One row per parameter set, with one column per parameter.
+
+    Raises:
+        ValueError: If a name is not one of `PARAMETERS`.
+    """
+    unknown = set(values).difference(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}; use {list(PARAMETERS)}.")
+    names = [name for name in PARAMETERS if name in values]
+    grid = pd.DataFrame(list(itertools.product(*(values[name] for name in names))), columns=names, dtype=float)
+    return grid.reindex(columns=list(PARAMETERS), fill_value=1.0)
+
+
+class SweepResults(NamedTuple):
+    """
+    The final states of a parameter sweep.
+
+    Attributes:
+        parameters (pd.DataFrame): One row per parameter set, with one column per parameter.
+        keys (pd.Index): The documents: the index of the texts, or the title of every speaker's first speech,
+            as in the calculator's results.
+        emotion_dimensions (List[str]): The emotion dimensions.
+        states (np.ndarray): The (parameter sets, documents, dimensions) final states; NaN where a flow diverged
+            or has no steps.
+        steps (Optional[np.ndarray]): The number of unit steps of every document's flow. A speaker with a single
+            speech has none: the calculator returns an empty simulation for it, and its final states are NaN.
+    """
+    parameters: pd.DataFrame
+    keys: pd.Index
+    emotion_dimensions: List[str]
+    states: np.ndarray
+    steps: Optional[np.ndarray] = None
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Flatten the results into one row per parameter set and document.
+
+        Returns:
+            pd.DataFrame: The parameters, the `key` of the document, whether its flow `diverged`, and one
+            column per emotion dimension.
+        """
+        n_sets, n_keys = self.states.shape[:2]
+        frame = self.parameters.loc[self.parameters.index.repeat(n_keys)].reset_index(drop=True)
+        frame.insert(0, 'parameter_set', np.repeat(np.arange(n_sets), n_keys))
+        frame['key'] = np.tile(self.keys.to_numpy(dtype=object), n_sets)
+        states = self.states.reshape(n_sets * n_keys, -1)
+        diverged = np.isnan(states).any(axis=1)
+        if self.steps is not None:
+            diverged &= np.tile(self.steps > 0, n_sets)
+        frame['diverged'] = diverged
+        return pd.concat([frame, pd.DataFrame(states, columns=self.emotion_dimensions)], axis=1)
+
+
+class ParameterSweep:
+    def __init__(self, calculator: SentimentFlowCalculator, data: Union[pd.DataFrame, EmotionMatrix]):
+        """
+        Initialize the ParameterSweep, which runs the flow model over one processed corpus with many scalings of
+        its terms.
+
+        The emotion states, the keyword flags and the polarities are extracted from the data once, here. Every
+        parameter set then multiplies the sentiment density, the pressure, the viscosity and the contextual
+        force of the flows by its values. Flows that come out identical under several parameter sets are only
+        integrated once.
+
+        The text flows of all parameter sets are integrated together with the vectorized solver of
+        `calculate_navier_stocker_for_texts(vectorized=True)`, so a set of ones gives the final states of that
+        path. Speaker flows are integrated one by one with the calculator's `integrator` and `cache`, as
+        `calculate_navier_stocker_for_speeches` does, and a set of ones gives its final states: they chain many
+        steps and often grow until the flow is clipped, where a different solver ends up somewhere else.
+
+        Args:
+            calculator (SentimentFlowCalculator): Gives the keywords, the integrator and cache of the speaker
+                flows, `on_divergence`, the `dtype` of the results and the metrics registry.
+            data (Union[pd.DataFrame, EmotionMatrix]): Processed texts, or processed speeches (with a
+                'speaker' column), as the calculate methods take them.
+
+        Raises:
+            ValueError: If the data are texts and the calculator's integrator is not the default one.
+        """
+        self.calculator = calculator
+        metadata = data.metadata if isinstance(data, EmotionMatrix) else data
+        self.kind = 'speeches' if 'speaker' in metadata.columns else 'texts'
+        if self.kind == 'texts':
+            calculator._check_vectorized()
+            index, texts, sentiment_columns, states, polarity = calculator._text_arrays(data)
+            self.keys = pd.Index(index)
+            self.s0 = dense_rows(states, 0, len(texts))
+            # A text's flow is a single unit step.
+            self.has_keyword = np.array([calculator._contains_keyword(text) for text in texts], dtype=bool)[:, None]
+            self.g_context = np.array([calculator._calculate_external_contextual_force(value) for value in polarity],
+                                      dtype=float)[:, None]
+            self.steps = np.ones(len(texts), dtype=int)
+        else:
+            tasks = calculator._speaker_tasks(data)
+            sentiment_columns = tasks[0][5] if tasks else pd.Index([])
+            self.keys = pd.Index([task[1] for task in tasks])
+            self.s0 = np.array([task[3] for task in tasks], dtype=float).reshape(len(tasks), len(sentiment_columns))
+            # Step 1 of a speaker is driven by the first speech, step i > 1 by speech i, as in `_simulate_speaker`.
+            self.steps = np.array([len(task[2]) - 1 for task in tasks], dtype=int)
+            max_steps = int(self.steps.max()) if tasks else 0
+            self.has_keyword = np.zeros((len(tasks), max_steps), dtype=bool)
+            self.g_context = np.zeros((len(tasks), max_steps))
+            for j, (_, _, speeches, _, polarity, _) in enumerate(tasks):
+                drivers = [0] + list(range(2, len(speeches)))
+                self.has_keyword[j, :len(drivers)] = [calculator._contains_keyword(speeches[i]) for i in drivers]
+                self.g_context[j, :len(drivers)] = [calculator._calculate_external_contextual_force(polarity[i])
+                                                    for i in drivers]
+        self.emotion_dimensions = [str(column) for column in sentiment_columns]
+
+    def _final_states(self, multipliers: np.ndarray, batch_size: int) -> np.ndarray:
+        """
+        Integrate the flows of every document under some parameter sets.
+
+        Args:
+            multipliers (np.ndarray): The (sets, len(PARAMETERS)) multipliers.
+            batch_size (int): The number of text flows integrated together.
+
+        Returns:
+            np.ndarray: The (sets, documents, dimensions) final states; NaN where a flow diverged or has no steps.
+        """
+        n_sets, n_keys, d = len(multipliers), len(self.keys), self.s0.shape[1]
+        density, pressure, viscosity, context = (np.repeat(column, n_keys) for column in multipliers.T)
+        document = np.tile(np.arange(n_keys), n_sets)
+        states = np.tile(self.s0, (n_sets, 1))
+        # Every (set, document) row takes as many unit steps as the document; each step is integrated for all
+        # the rows that still have it.
+        for step in range(int(self.steps.max()) if n_keys else 0):
+            rows = np.flatnonzero((self.steps[document] > step) & ~np.isnan(states).any(axis=1))
+            s0 = states[rows]
+            # The pressure term is the pressure gradient over the density, so only their ratio matters, and
+            # only where a keyword switches the pressure on.
+            inputs = np.column_stack([
+                s0,
+                np.where(self.has_keyword[document[rows], step], pressure[rows] / density[rows], 0.0),
+                np.std(s0, axis=1) * viscosity[rows],
+                self.g_context[document[rows], step] * context[rows],
+            ])
+            # Parameter sets that leave a flow unchanged, e.g. the pressure of a text without keywords, give
+            # identical rows, which are integrated once. Rows are integrated independently, so this does not
+            # change the results.
+            unique, inverse = np.unique(inputs, axis=0, return_inverse=True)
+            s, pressure_scale, nu_sent, g_context = unique[:, :d], unique[:, d], unique[:, d + 1], unique[:, d + 2]
+            rho_sent = np.sum(np.abs(s), axis=1)
+            p_sent = np.where(pressure_scale[:, None] != 0, s * pressure_scale[:, None], 0.0)
+            t = np.array([step, step + 1])
+            final = np.empty_like(s)
+            if self.kind == 'texts':
+                for start in range(0, len(s), batch_size):
+                    batch = slice(start, start + batch_size)
+                    with self.calculator.metrics.timer('solver'):
+                        final[batch] = integrate_batch(s[batch], rho_sent[batch], p_sent[batch], nu_sent[batch],
+                                                       g_context[batch], t,
+                                                       on_divergence=self.calculator.on_divergence)[-1]
+            else:
+                for i in range(len(s)):
+                    trajectory = self.calculator._integrate(s[i], t, (rho_sent[i], p_sent[i], nu_sent[i],
+                                                                      g_context[i]))
+                    final[i] = np.nan if trajectory is None else trajectory[-1]
+            states[rows] = final[inverse.ravel()]
+        # A flow without steps has no final state, as its simulation in the calculator's results is empty.
+        states[self.steps[document] == 0] = np.nan
+        return states.reshape(n_sets, n_keys, -1)
+
+    def run(self, grid: Union[pd.DataFrame, Dict[str, Sequence[float]]], batch_size: int = 4096,
+            n_workers: int = 1) -> SweepResults:
+        """
+        Evaluate the flows of the corpus under every parameter set of a grid.
+
+        Args:
+            grid (Union[pd.DataFrame, Dict[str, Sequence[float]]]): The parameter sets, one per row, with a column
+                for some of `PARAMETERS` (the others are 1), or the values of each parameter to combine with
+                `parameter_grid`.
+            batch_size (int): The number of text flows integrated together.
+            n_workers (int): Number of worker processes the parameter sets are spread across (-1 for all
+                cores). With 1, everything runs in the calling process.
+
+        Returns:
+            SweepResults: The final state of every document under every parameter set.
+
+        Raises:
+            ValueError: If the grid has columns other than `PARAMETERS` or a multiplier that is not positive, or a
+                flow diverged and the calculator's `on_divergence` is `'raise'`.
+        """
+        from tqdm.auto import tqdm
+
+        if isinstance(grid, dict):
+            grid = parameter_grid(**grid)
+        unknown = set(grid.columns).difference(PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters {sorted(unknown)}; use {list(PARAMETERS)}.")
+        parameters = grid.reindex(columns=list(PARAMETERS), fill_value=1.0).astype(float).reset_index(drop=True)
+        multipliers = parameters.to_numpy()
+        # The density divides the pressure, so a zero density has no finite flow; negative multipliers flip terms.
+        if not (multipliers > 0).all():
+            raise ValueError("Sweep multipliers must be positive.")
+        if n_workers == -1:
+            n_workers = os.cpu_count() or 1
+
+        logging.info(f"Sweeping {len(parameters)} parameter sets over {len(self.keys)} {self.kind}...")
+        # Parameter sets are integrated together in chunks of at most `_CHUNK_BATCHES` batches of flows, which
+        # bounds the memory, and are spread evenly across the workers.
+        sets_per_chunk = max(1, min(_CHUNK_BATCHES * batch_size // max(len(self.keys), 1),
+                                    -(-len(parameters) // n_workers)))
+        chunks = [(multipliers[start:start + sets_per_chunk], batch_size)
+                  for start in range(0, len(parameters), sets_per_chunk)]
+        self.calculator._start_run()
+        if n_workers > 1:
+            results = []
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_sweep_worker,
+                                     initargs=(self,)) as executor:
+                for chunk_states, report in tqdm(executor.map(_sweep_task, chunks), total=len(chunks),
+                                                 desc="Sweeping"):
+                    results.append(chunk_states)
+                    self.calculator._merge_worker_report(report)
+        else:
+            results = [self._final_states(*chunk) for chunk in tqdm(chunks, desc="Sweeping")]
+        self.calculator._log_integration_stats()
+        states = (np.concatenate(results) if results
+                  else np.empty((0, len(self.keys), len(self.emotion_dimensions))))
+
+        diverged = int((np.isnan(states).any(axis=2) & (self.steps > 0)).sum())
+        if diverged:
+            self.calculator.metrics.increment('nan_skips_total', diverged)
+            logging.warning(f"{diverged} flows diverged; their final states are NaN.")
+        return SweepResults(parameters, self.keys, self.emotion_dimensions,
+                            states.astype(self.calculator.dtype, copy=False), self.steps)
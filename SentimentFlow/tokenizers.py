@@ -0,0 +1,228 @@
+import abc
+import functools
+import logging
+import re
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple
+
+DEFAULT_NLP_MODEL = "en_core_web_sm"
+# Scoring only needs tokens and sentence boundaries: keep the English tokenizer, drop the statistical
+# components and split sentences with the rule-based sentencizer.
+NLP_EXCLUDED_COMPONENTS = ("tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter")
+SENTENCE_COMPONENTS = ("parser", "senter", "sentencizer")
+TOKENIZERS = ('spacy', 'regex')
+# Part of the document cache keys of the regex tokenizer; bump it when its tokens change.
+REGEX_TOKENIZER_VERSION = 1
+
+_CLITICS = r"(?:s|m|d|re|ve|ll)\b"
+# The lowercased tokens spaCy's English tokenizer gives for everyday text. Contractions are split as spaCy
+# does ("don't" -> "do", "n't"; "it's" -> "it", "'s"), abbreviations, titles, emoticons and decimal numbers
+# stay whole, and every other punctuation character is a token of its own. SenticNet concepts are lowercased
+# words, so the cases that matter for scoring are the word boundaries; punctuation is kept for the token counts.
+_TOKEN = re.compile(rf"""
+    https?://\S+[^\W_]/?|www\.\S+[^\W_]/?          # URLs
+    | @\w+                                          # handles
+    | (?<!\w)(?:[:;=]-?[()/pod]|<3)(?!\w)          # emoticons
+    | \b(?:mr|mrs|ms|dr|prof|st|jr|sr|vs|co)\.      # titles
+    | \bgon(?=na\b) | \bgot(?=ta\b)                 # gonna -> gon + na, gotta -> got + ta
+    | [^\W_]+(?=n['’]t\b) | n['’]t\b                 # negated verbs: do + n't, ca + n't
+    | ['’]{_CLITICS}                                # 's, 'm, 'd, 're, 've, 'll
+    | (?:[^\W\d_]\.){{2,}} | [a-z]\.                 # abbreviations and initials: u.s., e.g., a.
+    | \d+(?:[.,:]\d+)*                              # numbers: 3.5, 1,000, 10:30
+    | [^\W_]+(?:['’](?!{_CLITICS})[^\W_]+)*         # words, with inner apostrophes as in o'clock
+    | \.\.+                                         # ellipses
+    | [^\w\s]                                       # any other character
+""", re.VERBOSE)
+# The characters that end a sentence for spaCy's sentencizer, in the scripts the regex tokenizer handles.
+_SENTENCE_END = frozenset('.!?։؟۔।॥‼‽⁇⁈⁉！．？｡。')
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+# Words that spaCy splits although they are all letters.
+_SPLIT_WORDS = frozenset(['gonna', 'gotta'])
+_CHUNK_MEMO_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=_CHUNK_MEMO_SIZE)
+def _split_chunk(chunk: str) -> Tuple[Tuple[str, ...], bool]:
+    # The tokens of a lowercased, whitespace-free chunk of text, and whether one of them ends a sentence.
+    tokens = (chunk,) if chunk.isalpha() and chunk not in _SPLIT_WORDS else tuple(_TOKEN.findall(chunk))
+    return tokens, any(token in _SENTENCE_END for token in tokens)
+
+
+@functools.lru_cache(maxsize=None)
+def load_nlp(model: str = DEFAULT_NLP_MODEL, exclude: Tuple[str, ...] = NLP_EXCLUDED_COMPONENTS) -> "spacy.Language":
+    """
+    Load a spaCy pipeline once per process.
+
+    A rule-based sentencizer is added when none of the remaining components sets sentence boundaries.
+
+    Args:
+        model (str): The name or path of the spaCy model.
+        exclude (Tuple[str, ...]): The pipeline components not to load.
+
+    Returns:
+        spacy.Language: The loaded pipeline.
+    """
+    import spacy
+
+    logging.info(f"Loading spaCy model {model}")
+    nlp = spacy.load(model, exclude=list(exclude))
+    if not any(name in nlp.pipe_names for name in SENTENCE_COMPONENTS):
+        nlp.add_pipe("sentencizer")
+    return nlp
+
+
+class Tokenizer(abc.ABC):
+    """
+    Splits texts into sentences of lowercased tokens for `SpeechProcessor`.
+
+    A backend tokenizes texts in `pipe`, into documents of its own type, and `sentences` gives the lowercased
+    tokens of such a document, one list per sentence. Sentences only matter for phrase matching, which does not
+    cross them.
+    """
+
+    @property
+    @abc.abstractmethod
+    def config(self) -> Tuple[Any, ...]:
+        """The settings that determine the tokens, e.g. for cache keys."""
+
+    def load(self) -> None:
+        """Load what the tokenizer needs ahead of the first text."""
+
+    @abc.abstractmethod
+    def pipe(self, records: Iterable[Tuple[str, Any]], batch_size: int = 256,
+             n_process: int = 1) -> Iterator[Tuple[Any, Any]]:
+        """
+        Tokenize texts in order.
+
+        Args:
+            records (Iterable[Tuple[str, Any]]): (text, context) pairs; the context is passed through untouched.
+            batch_size (int): Number of texts tokenized per batch, for backends that batch.
+            n_process (int): Number of processes, for backends that can use several.
+
+        Returns:
+            Iterator[Tuple[Any, Any]]: The tokenized documents with their context, in input order.
+        """
+
+    @abc.abstractmethod
+    def sentences(self, doc: Any) -> Iterable[List[str]]:
+        """
+        The lowercased tokens of a tokenized document.
+
+        Args:
+            doc (Any): A document from `pipe`.
+
+        Returns:
+            Iterable[List[str]]: The tokens of every sentence.
+        """
+
+
+class SpacyTokenizer(Tokenizer):
+    def __init__(self, nlp_model: str = DEFAULT_NLP_MODEL, nlp_exclude: Sequence[str] = NLP_EXCLUDED_COMPONENTS):
+        """
+        Initialize the SpacyTokenizer, which tokenizes with a spaCy pipeline.
+
+        Args:
+            nlp_model (str): The spaCy model. It is loaded on first use and shared per process.
+            nlp_exclude (Sequence[str]): The spaCy components not to load.
+        """
+        self.nlp_model = nlp_model
+        self.nlp_exclude = tuple(nlp_exclude)
+
+    @property
+    def config(self) -> Tuple[Any, ...]:
+        return self.nlp_model, self.nlp_exclude
+
+    @property
+    def nlp(self) -> "spacy.Language":
+        """The spaCy pipeline, loaded on first access."""
+        return load_nlp(self.nlp_model, self.nlp_exclude)
+
+    def load(self) -> None:
+        self.nlp
+
+    def pipe(self, records: Iterable[Tuple[str, Any]], batch_size: int = 256,
+             n_process: int = 1) -> Iterator[Tuple["spacy.tokens.Doc", Any]]:
+        return self.nlp.pipe(records, as_tuples=True, batch_size=batch_size, n_process=n_process)
+
+    def sentences(self, doc: "spacy.tokens.Doc") -> Iterator[List[str]]:
+        return ([token.lower_ for token in sent] for sent in doc.sents)
+
+
+class RegexTokenizer(Tokenizer):
+    def __init__(self):
+        """
+        Initialize the RegexTokenizer, a pure-Python tokenizer that needs neither spaCy nor a model.
+
+        It splits words, contractions, numbers and punctuation as spaCy's English tokenizer does for everyday
+        text, and sentences after '.', '!' and '?' as spaCy's sentencizer does, at a fraction of the cost. It
+        only covers the most common of spaCy's special cases and infix rules (e.g. spaCy keeps "x*y" and "yes.no"
+        whole), so the scores of some texts differ; `python -m benchmarks.parity` measures how many on a sample
+        of a corpus.
+        """
+
+    @property
+    def config(self) -> Tuple[Any, ...]:
+        return 'regex', REGEX_TOKENIZER_VERSION
+
+    def pipe(self, records: Iterable[Tuple[str, Any]], batch_size: int = 256,
+             n_process: int = 1) -> Iterator[Tuple[List[List[str]], Any]]:
+        return ((self.tokenize(text), context) for text, context in records)
+
+    def sentences(self, doc: List[List[str]]) -> List[List[str]]:
+        return doc
+
+    @staticmethod
+    def tokenize(text: str) -> List[List[str]]:
+        """
+        Split a text into sentences of lowercased tokens.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            List[List[str]]: The tokens of every sentence.
+        """
+        sentences = []
+        sentence = []
+        ended = False
+        # Like spaCy, split on whitespace first; the chunks repeat a lot, so their tokens are memoized.
+        for chunk in text.lower().split():
+            tokens, ends_sentence = _split_chunk(chunk)
+            if not (ended or ends_sentence):
+                sentence.extend(tokens)
+                continue
+            for token in tokens:
+                # As in spaCy's sentencizer, a sentence starts at the first token after an end-of-sentence
+                # character that is not punctuation; punctuation in between, e.g. a closing quote, stays behind.
+                if token in _SENTENCE_END:
+                    ended = True
+                elif ended and not _PUNCTUATION.fullmatch(token):
+                    sentences.append(sentence)
+                    sentence = []
+                    ended = False
+                sentence.append(token)
+        if sentence:
+            sentences.append(sentence)
+        return sentences
+
+
+def make_tokenizer(name: str, nlp_model: str = DEFAULT_NLP_MODEL,
+                   nlp_exclude: Sequence[str] = NLP_EXCLUDED_COMPONENTS) -> Tokenizer:
+    """
+    Create a tokenizer by name, e.g. from a command-line option.
+
+    Args:
+        name (str): 'spacy' or 'regex'.
+        nlp_model (str): The spaCy model of the 'spacy' tokenizer.
+        nlp_exclude (Sequence[str]): The spaCy components the 'spacy' tokenizer does not load.
+
+    Returns:
+        Tokenizer: The tokenizer.
+
+    Raises:
+        ValueError: If the name is not one of `TOKENIZERS`.
+    """
+    if name == 'spacy':
+        return SpacyTokenizer(nlp_model, nlp_exclude)
+    if name == 'regex':
+        return RegexTokenizer()
+    raise ValueError(f"Unknown tokenizer {name!r}. Choose one of {', '.join(TOKENIZERS)}.")
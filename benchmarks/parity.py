@@ -0,0 +1,158 @@
+"""
+Score a sample corpus with two tokenizers and report how often their scores agree and how fast each one is.
+
+    python -m benchmarks.parity --input posts.csv --text-column text --sample 5000 --output parity.json
+
+Without `--input`, a synthetic corpus is scored. Use `--nlp-model blank:en` without a trained spaCy model.
+"""
+import argparse
+import collections
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from SentimentFlow.data_processing import DEFAULT_NLP_MODEL, SpeechProcessor
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.streaming import read_chunks
+from SentimentFlow.tokenizers import TOKENIZERS, make_tokenizer
+
+from benchmarks.run import FIXTURE_LEXICON, _measure, _versions
+from benchmarks.synthetic import make_corpus
+
+PARITY_FORMAT_VERSION = 1
+
+
+def _score_difference(reference: Dict[str, float], candidate: Dict[str, float]) -> float:
+    # Emotions missing from one side score 0 there, as in the processed frames.
+    return max((abs(reference.get(emotion, 0.0) - candidate.get(emotion, 0.0))
+                for emotion in reference.keys() | candidate.keys()), default=0.0)
+
+
+def tokenizer_parity(texts: Sequence[str], lexicon_path: str = str(FIXTURE_LEXICON),
+                     nlp_model: str = DEFAULT_NLP_MODEL, reference: str = 'spacy', candidate: str = 'regex',
+                     match_phrases: bool = False, batch_size: int = 256, tolerance: float = 1e-9,
+                     n_examples: int = 5) -> Dict[str, Any]:
+    """
+    Score texts with a reference and a candidate tokenizer and compare the results.
+
+    Each backend scores the texts with a fresh `SpeechProcessor`, after loading its tokenizer, and reports its
+    wall time, documents and tokens per second and the peak RSS of the process so far. A text matches when
+    every emotion and the polarity agree within `tolerance`.
+
+    Args:
+        texts (Sequence[str]): The sample corpus.
+        lexicon_path (str): The SenticNet TSV. Defaults to the bundled fixture.
+        nlp_model (str): The spaCy model of the 'spacy' backend.
+        reference (str): The backend whose scores are taken as correct.
+        candidate (str): The backend compared with it.
+        match_phrases (bool): Whether the processors match multi-word concepts.
+        batch_size (int): Number of texts tokenized per batch.
+        tolerance (float): The largest score difference of matching texts.
+        n_examples (int): Number of mismatching texts reported, with the tokens only one backend gives.
+
+    Returns:
+        Dict[str, Any]: The parameters, the environment, the throughput of both backends, the speedup of the
+        candidate, the share of texts whose scores and whose tokens match, the largest score difference and
+        the examples.
+
+    Raises:
+        ValueError: If there are no texts.
+    """
+    texts = list(texts)
+    if not texts:
+        raise ValueError("The sample corpus is empty.")
+    runs = {}
+    scores = {}
+    processors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for role, name in (('reference', reference), ('candidate', candidate)):
+            processor = SpeechProcessor(lexicon_path, lexicon_cache_dir=tmp, batch_size=batch_size,
+                                        match_phrases=match_phrases, output=OutputPolicy.memory(),
+                                        tokenizer=make_tokenizer(name, nlp_model))
+            processor.tokenizer.load()
+            runs[role], scores[role] = _measure(lambda: processor.score_texts(texts), len(texts))
+            n_tokens = processor.metrics.counter('tokens_total')
+            runs[role].update({'tokenizer': name, 'tokens': n_tokens,
+                               'tokens_per_sec': n_tokens / runs[role]['seconds'] if runs[role]['seconds'] else None})
+            processors[role] = processor
+
+    tokens = {
+        role: [[word for words in processor.tokenizer.sentences(doc) for word in words]
+               for doc, _ in processor.tokenizer.pipe(((text, None) for text in texts), batch_size=batch_size)]
+        for role, processor in processors.items()
+    }
+    differences = [_score_difference(expected, actual) for expected, actual in zip(scores['reference'],
+                                                                                  scores['candidate'])]
+    examples = []
+    for i, difference in enumerate(differences):
+        if difference > tolerance and len(examples) < n_examples:
+            reference_tokens = collections.Counter(tokens['reference'][i])
+            candidate_tokens = collections.Counter(tokens['candidate'][i])
+            examples.append({'text': texts[i], 'score_difference': difference,
+                             'reference_only': sorted((reference_tokens - candidate_tokens).elements()),
+                             'candidate_only': sorted((candidate_tokens - reference_tokens).elements())})
+
+    candidate_seconds = runs['candidate']['seconds']
+    return {
+        'format': PARITY_FORMAT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'parameters': {'docs': len(texts), 'lexicon': str(lexicon_path), 'nlp_model': nlp_model,
+                       'match_phrases': match_phrases, 'batch_size': batch_size, 'tolerance': tolerance},
+        'environment': _versions(),
+        'reference': runs['reference'],
+        'candidate': runs['candidate'],
+        'speedup': runs['reference']['seconds'] / candidate_seconds if candidate_seconds else None,
+        'match_rate': sum(difference <= tolerance for difference in differences) / len(texts),
+        'token_match_rate': sum(a == b for a, b in zip(tokens['reference'], tokens['candidate'])) / len(texts),
+        'max_score_difference': max(differences),
+        'mismatches': examples,
+    }
+
+
+def _read_texts(input_path: str, text_column: str, sample: int) -> List[str]:
+    texts = []
+    for chunk in read_chunks(input_path, min(sample, 10000), keep_default_na=False):
+        texts.extend(chunk[text_column].astype(str).tolist())
+        if len(texts) >= sample:
+            break
+    return texts[:sample]
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Compare the scores and throughput of two tokenizers.")
+    parser.add_argument('--input', help="sample corpus (.csv or .jsonl); defaults to a synthetic corpus")
+    parser.add_argument('--text-column', default='text', help="column holding the texts")
+    parser.add_argument('--sample', type=int, default=10000, help="number of leading texts of the input scored")
+    parser.add_argument('--docs', type=int, default=2000, help="number of synthetic documents")
+    parser.add_argument('--doc-length', type=int, default=60, help="mean number of words per synthetic document")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the corpus generator")
+    parser.add_argument('--lexicon', default=str(FIXTURE_LEXICON), help="SenticNet TSV (defaults to the fixture)")
+    parser.add_argument('--nlp-model', default=DEFAULT_NLP_MODEL, help="spaCy model, e.g. blank:en")
+    parser.add_argument('--reference', choices=TOKENIZERS, default='spacy', help="reference tokenizer")
+    parser.add_argument('--candidate', choices=TOKENIZERS, default='regex', help="tokenizer compared with it")
+    parser.add_argument('--match-phrases', action='store_true', help="also match multi-word concepts")
+    parser.add_argument('--batch-size', type=int, default=256, help="texts tokenized per batch")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        texts = _read_texts(args.input, args.text_column, args.sample)
+    else:
+        vocabulary = pd.read_csv(args.lexicon, delimiter='\t')['CONCEPT'].dropna().tolist()
+        texts = make_corpus(vocabulary, args.docs, args.doc_length, seed=args.seed)['speech'].tolist()
+    report = tokenizer_parity(texts, args.lexicon, args.nlp_model, args.reference, args.candidate,
+                              args.match_phrases, args.batch_size)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Time every stage of SentimentFlow on a synthetic corpus and write the results as JSON.
+
+    python -m benchmarks.run --docs 2000 --doc-length 60 --speakers 50 --output benchmark.json
+
+Use `--nlp-model blank:en` to benchmark without a trained spaCy model.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.data_processing import DEFAULT_NLP_MODEL, SpeechProcessor, load_nlp
+from SentimentFlow.lexicon import SenticNetLexicon
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.tokenizers import TOKENIZERS, make_tokenizer
+
+from benchmarks.synthetic import CATEGORIES, make_corpus
+
+BENCHMARK_FORMAT_VERSION = 1
+FIXTURE_LEXICON = Path(__file__).parent / 'data' / 'senticnet_fixture.tsv'
+STAGES = ('lexicon_parse', 'lexicon_load_cached', 'nlp_load', 'tokenize', 'score', 'process_texts',
+          'flow_texts', 'flow_texts_vectorized', 'flow_speeches')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """The peak resident set size of the process so far, in MiB, or None where it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def _measure(function: Callable[[], Any], items: Optional[int] = None, tokens: Optional[int] = None,
+             unit: str = 'docs') -> Tuple[Dict[str, Any], Any]:
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    stage = {'seconds': seconds}
+    for name, count in ((unit, items), ('tokens', tokens)):
+        if count is not None:
+            stage.update({name: count, f"{name}_per_sec": count / seconds if seconds else None})
+    stage['peak_rss_mb'] = peak_rss_mb()
+    return stage, result
+
+
+def _versions() -> Dict[str, str]:
+    import scipy
+    import spacy
+
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'scipy': scipy.__version__, 'spacy': spacy.__version__}
+
+
+def run_benchmarks(n_docs: int = 2000, doc_length: int = 60, n_speakers: int = 50, seed: int = 0,
+                   lexicon_path: str = str(FIXTURE_LEXICON), nlp_model: str = DEFAULT_NLP_MODEL,
+                   batch_size: int = 256, n_process: int = 1, stages: Optional[List[str]] = None,
+                   tokenizer: str = 'spacy') -> Dict[str, Any]:
+    """
+    Time the stages of `SpeechProcessor` and `SentimentFlowCalculator` separately on a synthetic corpus.
+
+    Every stage reports its wall time, documents per second, tokens per second where tokens are processed,
+    the peak RSS of the process so far and, for the flow stages, the number of flow (RHS) evaluations.
+
+    Args:
+        n_docs (int): Number of documents in the corpus.
+        doc_length (int): Mean number of words per document.
+        n_speakers (int): Number of speakers the documents are dealt to.
+        seed (int): Seed of the corpus generator.
+        lexicon_path (str): The SenticNet TSV. Defaults to the bundled fixture.
+        nlp_model (str): The spaCy model to tokenize with.
+        batch_size (int): spaCy batch size.
+        n_process (int): Number of spaCy processes.
+        stages (Optional[List[str]]): The stages to run (see `STAGES`). Defaults to all of them.
+        tokenizer (str): The tokenizer backend, 'spacy' or 'regex'.
+
+    Returns:
+        Dict[str, Any]: The parameters, the environment and the results of every stage.
+    """
+    stages = list(STAGES) if stages is None else stages
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}; expected some of {list(STAGES)}.")
+    lexicon_data = pd.read_csv(lexicon_path, delimiter='\t')
+    corpus = make_corpus(lexicon_data['CONCEPT'].dropna().tolist(), n_docs, doc_length, n_speakers, seed=seed)
+    texts = corpus['speech'].tolist()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'lexicon_parse' in stages:
+            results['lexicon_parse'], _ = _measure(
+                lambda: SenticNetLexicon.from_tsv(lexicon_path, CATEGORIES), len(lexicon_data), unit='concepts')
+        SenticNetLexicon.load(lexicon_path, CATEGORIES, cache_dir=tmp)
+        if 'lexicon_load_cached' in stages:
+            results['lexicon_load_cached'], _ = _measure(
+                lambda: SenticNetLexicon.load(lexicon_path, CATEGORIES, cache_dir=tmp),
+                len(lexicon_data), unit='concepts')
+        processor = SpeechProcessor(lexicon_path, lexicon_cache_dir=tmp, batch_size=batch_size,
+                                    n_process=n_process, tokenizer=make_tokenizer(tokenizer, nlp_model))
+        if 'nlp_load' in stages:
+            load_nlp.cache_clear()
+            results['nlp_load'], _ = _measure(processor.tokenizer.load)
+
+        if {'tokenize', 'score', 'process_texts'} & set(stages):
+            docs = [doc for doc, _ in processor._pipe((text, None) for text in texts)]
+            n_tokens = sum(len(words) for doc in docs for words in processor.tokenizer.sentences(doc))
+        if 'tokenize' in stages:
+            results['tokenize'], _ = _measure(
+                lambda: sum(1 for _ in processor._pipe((text, None) for text in texts)), len(texts), n_tokens)
+        if 'score' in stages:
+            results['score'], _ = _measure(lambda: [processor._score_doc(doc) for doc in docs], len(docs), n_tokens)
+            results['score']['token_memo'] = processor.token_memo_stats
+        docs = None
+
+        if 'process_texts' in stages:
+            fresh = SpeechProcessor(lexicon_path, lexicon_cache_dir=tmp, batch_size=batch_size, n_process=n_process,
+                                    tokenizer=make_tokenizer(tokenizer, nlp_model))
+            results['process_texts'], _ = _measure(lambda: fresh.process_texts_sparse(texts), len(texts), n_tokens)
+
+        calculator = SentimentFlowCalculator()
+        if {'flow_texts', 'flow_texts_vectorized'} & set(stages):
+            processed = processor.process_texts_sparse(texts).to_frame()
+        for stage, vectorized in (('flow_texts', False), ('flow_texts_vectorized', True)):
+            if stage in stages:
+                results[stage], _ = _measure(lambda: calculator.calculate_navier_stocker_for_texts(
+                    processed, vectorized=vectorized, sink=str(Path(tmp) / stage)), len(processed))
+                # The vectorized solver does not go through the calculator's integrator.
+                if not vectorized:
+                    results[stage].update(calculator.integrator.stats.as_dict())
+        if 'flow_speeches' in stages:
+            speeches = processor.process_speeches_sparse(corpus)
+            results['flow_speeches'], _ = _measure(lambda: calculator.calculate_navier_stocker_for_speeches(
+                speeches, sink=str(Path(tmp) / 'flow_speeches')), len(corpus))
+            results['flow_speeches'].update(calculator.integrator.stats.as_dict())
+
+    return {
+        'format': BENCHMARK_FORMAT_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'parameters': {'n_docs': n_docs, 'doc_length': doc_length, 'n_speakers': n_speakers, 'seed': seed,
+                       'lexicon': str(lexicon_path), 'nlp_model': nlp_model, 'tokenizer': tokenizer,
+                       'batch_size': batch_size, 'n_process': n_process},
+        'environment': _versions(),
+        'stages': results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark SentimentFlow on a synthetic corpus.")
+    parser.add_argument('--docs', type=int, default=2000, help="number of documents")
+    parser.add_argument('--doc-length', type=int, default=60, help="mean number of words per document")
+    parser.add_argument('--speakers', type=int, default=50, help="number of speakers")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the corpus generator")
+    parser.add_argument('--lexicon', default=str(FIXTURE_LEXICON), help="SenticNet TSV (defaults to the fixture)")
+    parser.add_argument('--nlp-model', default=DEFAULT_NLP_MODEL, help="spaCy model, e.g. blank:en")
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default='spacy', help="tokenizer backend")
+    parser.add_argument('--batch-size', type=int, default=256, help="spaCy batch size")
+    parser.add_argument('--n-process', type=int, default=1, help="number of spaCy processes")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, help="stages to run (default: all)")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.docs, args.doc_length, args.speakers, args.seed, args.lexicon, args.nlp_model,
+                            args.batch_size, args.n_process, args.stages, args.tokenizer)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ['INTROSPECTION', 'TEMPER', 'ATTITUDE', 'SENSITIVITY']
+EMOTIONS = ['#joy', '#sadness', '#anger', '#fear', '#calmness', '#eagerness', '#pleasantness', '#disgust']
+EMOTION_WORDS = [
+    'happy', 'sad', 'joy', 'anger', 'love', 'hate', 'good', 'bad', 'fear', 'calm', 'hope', 'worry', 'delight',
+    'tough', 'great', 'progress', 'excited', 'anxious', 'proud', 'ashamed', 'grateful', 'lonely', 'relief',
+    'frustration', 'optimistic', 'disappointed', 'content', 'overwhelmed', 'elated', 'uncertain',
+]
+FILLER_WORDS = ['the', 'a', 'of', 'and', 'to', 'in', 'i', 'it', 'is', 'was', 'that', 'for', 'on', 'with', 'we', 'my']
+_SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'sa', 'tor', 'vi', 'nel', 'pa', 'dor', 'shi', 'ma', 'qua', 'li', 'zen', 'fo']
+
+
+def _pseudo_words(n: int, rng: np.random.Generator, exclude: set) -> List[str]:
+    words = []
+    seen = set(exclude)
+    while len(words) < n:
+        word = ''.join(rng.choice(_SYLLABLES, size=rng.integers(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def make_lexicon(n_concepts: int = 1000, n_phrases: int = 100, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a SenticNet-like lexicon with the columns `SpeechProcessor` reads.
+
+    Args:
+        n_concepts (int): Number of single-word concepts, starting with common emotion words.
+        n_phrases (int): Number of two-word concepts, joined with '_' as in SenticNet.
+        seed (int): Seed of the generator.
+
+    Returns:
+        pd.DataFrame: The lexicon, one row per concept.
+    """
+    rng = np.random.default_rng(seed)
+    words = EMOTION_WORDS[:n_concepts] + _pseudo_words(max(n_concepts - len(EMOTION_WORDS), 0), rng,
+                                                       set(EMOTION_WORDS) | set(FILLER_WORDS))
+    phrases = {f"{first}_{second}" for first, second in zip(rng.choice(words, n_phrases * 2),
+                                                           rng.choice(words, n_phrases * 2)) if first != second}
+    concepts = words + sorted(phrases)[:n_phrases]
+
+    scores = np.round(rng.uniform(-1, 1, size=(len(concepts), len(CATEGORIES))), 3)
+    scores[rng.random(scores.shape) < 0.3] = 0
+    polarity = np.round(scores.mean(axis=1) + rng.normal(0, 0.2, len(concepts)), 3).clip(-1, 1)
+    lexicon = pd.DataFrame(scores, columns=CATEGORIES)
+    lexicon.insert(0, 'CONCEPT', concepts)
+    lexicon['PRIMARY EMOTION'] = rng.choice(EMOTIONS, len(concepts))
+    lexicon['SECONDARY EMOTION'] = rng.choice(EMOTIONS, len(concepts))
+    lexicon['POLARITY VALUE'] = np.where(polarity >= 0, 'positive', 'negative')
+    lexicon['POLARITY INTENSITY'] = polarity
+    return lexicon
+
+
+def make_corpus(vocabulary: List[str], n_docs: int = 1000, doc_length: int = 60, n_speakers: int = 20,
+                zipf_exponent: float = 1.1, sentence_length: int = 15, seed: int = 0,
+                out_of_lexicon: Optional[int] = None) -> pd.DataFrame:
+    """
+    Generate a deterministic corpus of speeches with a Zipfian word distribution.
+
+    Words are drawn from filler words, the lexicon vocabulary (phrases split into their words) and words that
+    are not in the lexicon. The probability of the k-th most frequent word is proportional to
+    1 / k ** zipf_exponent.
+
+    Args:
+        vocabulary (List[str]): The lexicon concepts.
+        n_docs (int): Number of documents.
+        doc_length (int): Mean number of words per document; lengths are uniform in
+            [doc_length / 2, 3 * doc_length / 2].
+        n_speakers (int): Number of speakers the documents are dealt to.
+        zipf_exponent (float): Exponent of the word frequency distribution.
+        sentence_length (int): Number of words per sentence.
+        seed (int): Seed of the generator.
+        out_of_lexicon (Optional[int]): Number of distinct words not in the lexicon. Defaults to the size of the
+            lexicon vocabulary.
+
+    Returns:
+        pd.DataFrame: 'title', 'speaker' and 'speech' columns, one row per document.
+    """
+    rng = np.random.default_rng(seed)
+    lexicon_words = list(dict.fromkeys(word for concept in vocabulary for word in concept.split('_')))
+    unknown = _pseudo_words(len(lexicon_words) if out_of_lexicon is None else out_of_lexicon, rng,
+                            set(lexicon_words) | set(FILLER_WORDS))
+    # Filler words are the most frequent; lexicon and unknown words are mixed over the remaining ranks.
+    content_words = np.array(lexicon_words + unknown)
+    words = np.concatenate([FILLER_WORDS, content_words[rng.permutation(len(content_words))]])
+    ranks = np.arange(1, len(words) + 1)
+    probabilities = 1 / ranks ** zipf_exponent
+    probabilities /= probabilities.sum()
+
+    lengths = rng.integers(max(doc_length // 2, 1), doc_length * 3 // 2 + 1, n_docs)
+    tokens = rng.choice(words, size=int(lengths.sum()), p=probabilities)
+    speeches = []
+    start = 0
+    for length in lengths:
+        document = tokens[start:start + length]
+        start += length
+        sentences = [' '.join(document[i:i + sentence_length]).capitalize() + '.'
+                     for i in range(0, len(document), sentence_length)]
+        speeches.append(' '.join(sentences))
+    speakers = rng.integers(0, max(n_speakers, 1), n_docs)
+    return pd.DataFrame({
+        'title': [f"Debate {i // max(n_speakers, 1)}" for i in range(n_docs)],
+        'speaker': [f"Speaker {speaker}" for speaker in speakers],
+        'speech': speeches,
+    })
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='SentimentFlow',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     install_requires=[
         'spacy',
         'tqdm',
@@ -11,6 +11,10 @@ setup(
         'pandas',
         'scipy',
     ],
+    extras_require={
+        'numba': ['numba'],
+        'parquet': ['pyarrow'],
+    },
     author="Your Name",
     author_email="your.email@example.com",
     description="A package for processing and analyzing sentiment flow in texts using principles from fluid dynamics.",
@@ -20,5 +24,5 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
 )
@@ -0,0 +1,53 @@
+"""
+Data factories shared by the test modules, which import them with `from conftest import ...`.
+"""
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ('ATTITUDE', 'TEMPER')
+TEXTS = ('a calm day', 'an awful day', 'hope', 'rain')
+
+
+def make_senticnet_data() -> pd.DataFrame:
+    """A small SenticNet table; 'happy' appears twice and 'calm' has no primary emotion."""
+    return pd.DataFrame({
+        'CONCEPT': ['happy', 'sad', 'happy', 'calm'],
+        'INTROSPECTION': [0.8, -0.6, 0.1, 0.0],
+        'TEMPER': [0.0, 0.0, 0.1, 0.5],
+        'ATTITUDE': [0.2, -0.9, 0.1, 0.0],
+        'SENSITIVITY': [0.0, 0.1, 0.1, 0.0],
+        'PRIMARY EMOTION': ['#joy', '#sadness', '#anger', np.nan],
+        'SECONDARY EMOTION': ['#eagerness', np.nan, '#fear', '#calmness'],
+        'POLARITY INTENSITY': [0.75, -0.8, 0.1, 0.3],
+    })
+
+
+def make_states(n: int, d: int, seed: int = 0) -> np.ndarray:
+    """Random emotion states in [-0.3, 0.3], about half of them zero."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-0.3, 0.3, size=(n, d)) * (rng.random((n, d)) > 0.5)
+
+
+def _scores(n: int, seed: int, dimensions: Sequence[str]) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.uniform(-0.3, 0.3, size=(n, len(dimensions) + 1)), columns=[*dimensions, 'POLARITY'])
+
+
+def make_texts(n: int = 6, seed: int = 0, dimensions: Sequence[str] = DIMENSIONS,
+               texts: Sequence[str] = TEXTS) -> pd.DataFrame:
+    """Processed texts: 'text', then random scores over `dimensions` and 'POLARITY'. The texts repeat."""
+    data = _scores(n, seed, dimensions)
+    data.insert(0, 'text', [texts[i % len(texts)] for i in range(n)])
+    return data
+
+
+def make_speeches(n: int = 12, seed: int = 0, dimensions: Sequence[str] = DIMENSIONS,
+                  speakers: Sequence[str] = ('A', 'B', 'C')) -> pd.DataFrame:
+    """Processed speeches: 'title', 'speaker', 'speech', then random scores. Speakers take turns."""
+    data = _scores(n, seed, dimensions)
+    data.insert(0, 'speech', [f'speech {i}' for i in range(n)])
+    data.insert(0, 'speaker', [speakers[i % len(speakers)] for i in range(n)])
+    data.insert(0, 'title', [f'T{i}' for i in range(n)])
+    return data
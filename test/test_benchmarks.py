@@ -0,0 +1,54 @@
+import importlib.util
+import unittest
+
+import pandas as pd
+
+from benchmarks.parity import tokenizer_parity
+from benchmarks.run import FIXTURE_LEXICON, run_benchmarks
+from benchmarks.synthetic import make_corpus, make_lexicon
+
+HAS_SPACY = importlib.util.find_spec('spacy') is not None
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_fixture_is_the_generated_lexicon(self):
+        fixture = pd.read_csv(FIXTURE_LEXICON, delimiter='\t')
+        pd.testing.assert_frame_equal(fixture, make_lexicon(), check_exact=False)
+
+    def test_corpus_is_deterministic(self):
+        vocabulary = make_lexicon(n_concepts=50, n_phrases=5)['CONCEPT'].tolist()
+        corpus = make_corpus(vocabulary, n_docs=20, doc_length=10, n_speakers=3, seed=1)
+        pd.testing.assert_frame_equal(corpus, make_corpus(vocabulary, n_docs=20, doc_length=10, n_speakers=3, seed=1))
+        self.assertEqual(corpus['speaker'].nunique(), 3)
+        self.assertFalse(corpus.equals(make_corpus(vocabulary, n_docs=20, doc_length=10, n_speakers=3, seed=2)))
+
+    @unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+    def test_report(self):
+        report = run_benchmarks(n_docs=12, doc_length=8, n_speakers=3, nlp_model='blank:en',
+                                stages=['score', 'flow_texts', 'flow_speeches'])
+        self.assertEqual(list(report['stages']), ['score', 'flow_texts', 'flow_speeches'])
+        self.assertEqual(report['stages']['score']['docs'], 12)
+        self.assertGreater(report['stages']['score']['tokens_per_sec'], 0)
+        self.assertEqual(report['stages']['flow_texts']['integrations'], 12)
+        self.assertGreater(report['stages']['flow_texts']['rhs_evaluations'], 0)
+        with self.assertRaises(ValueError):
+            run_benchmarks(stages=['unknown'])
+
+    @unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+    def test_tokenizer_parity(self):
+        # spaCy keeps 'happy*sad' whole; the regex tokenizer scores both words.
+        report = tokenizer_parity(['I am happy.', 'So happy*sad today', 'Calm, sad.'], nlp_model='blank:en')
+        self.assertEqual((report['reference']['tokenizer'], report['candidate']['tokenizer']), ('spacy', 'regex'))
+        self.assertEqual(report['reference']['docs'], 3)
+        self.assertGreater(report['candidate']['tokens_per_sec'], 0)
+        self.assertAlmostEqual(report['match_rate'], 2 / 3)
+        self.assertAlmostEqual(report['token_match_rate'], 2 / 3)
+        self.assertEqual(len(report['mismatches']), 1)
+        self.assertEqual(report['mismatches'][0]['reference_only'], ['happy*sad'])
+        self.assertEqual(report['mismatches'][0]['candidate_only'], ['*', 'happy', 'sad'])
+        with self.assertRaises(ValueError):
+            tokenizer_parity([])
+
+
+if __name__ == '__main__':
+    unittest.main()
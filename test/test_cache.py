@@ -0,0 +1,78 @@
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from SentimentFlow.cache import DocumentCache, cache_key, decode_array, encode_array
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from conftest import make_texts
+
+
+class TestDocumentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'cache.sqlite'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_key(self):
+        self.assertEqual(cache_key('scores', 1, 'text'), cache_key('scores', 1, 'text'))
+        self.assertNotEqual(cache_key('ab', 'c'), cache_key('a', 'bc'))
+        self.assertNotEqual(cache_key(np.zeros(2)), cache_key(np.zeros(2, dtype=np.float32)))
+        self.assertNotEqual(cache_key(np.zeros(4)), cache_key(np.zeros((2, 2))))
+
+    def test_entries_persist(self):
+        array = np.arange(6.0).reshape(2, 3)
+        with DocumentCache(str(self.path)) as cache:
+            cache.put('a', encode_array(array))
+            self.assertIsNone(cache.get('b'))
+        with DocumentCache(str(self.path)) as cache:
+            np.testing.assert_array_equal(decode_array(cache.get('a')), array)
+            self.assertEqual(cache.stats.as_dict(), {'hits': 1, 'misses': 0, 'writes': 0, 'evictions': 0})
+            self.assertEqual(cache.total_bytes, len(encode_array(array)))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        with DocumentCache(str(self.path), max_bytes=250) as cache:
+            for key in 'abc':
+                cache.put(key, b'x' * 100)
+                cache.flush()
+            self.assertEqual(sorted(cache.get_many('abc')), ['b', 'c'])
+            cache.get('b')
+            cache.put('d', b'x' * 100)
+            cache.flush()
+            self.assertEqual(sorted(cache.get_many('bcd')), ['b', 'd'])
+            self.assertEqual(cache.stats.evictions, 2)
+            self.assertLessEqual(cache.total_bytes, 250)
+
+    def test_pickled_cache_reconnects(self):
+        with DocumentCache(str(self.path)) as cache:
+            cache.put('a', b'value')
+            cache.flush()
+            copy = pickle.loads(pickle.dumps(cache))
+            self.assertEqual(copy.get('a'), b'value')
+            copy.close()
+
+    def test_warm_run_reuses_trajectories(self):
+        data = make_texts()
+        for vectorized in (False, True):
+            with self.subTest(vectorized=vectorized), DocumentCache(str(self.path)) as cache:
+                expected = SentimentFlowCalculator().calculate_navier_stocker_for_texts(
+                    data, vectorized=vectorized, sink=str(Path(self.tmp.name) / 'expected'))
+                calculator = SentimentFlowCalculator(cache=cache)
+                for _ in range(2):
+                    all_s = calculator.calculate_navier_stocker_for_texts(
+                        data, vectorized=vectorized, sink=str(Path(self.tmp.name) / 'texts'))
+                    self.assertEqual(list(all_s), list(expected))
+                    for idx in expected:
+                        np.testing.assert_array_equal(all_s[idx][0]['simulation'], expected[idx][0]['simulation'])
+                self.assertEqual(cache.stats.hits, len(data))
+                self.assertEqual(cache.stats.writes, len(data))
+                if not vectorized:
+                    self.assertEqual(calculator.integrator.stats.integrations, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
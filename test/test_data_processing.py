@@ -0,0 +1,62 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from SentimentFlow.data_processing import SpeechProcessor
+from conftest import make_senticnet_data
+
+HAS_SPACY = importlib.util.find_spec('spacy') is not None
+
+
+@unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        import spacy
+
+        self.tmp = tempfile.TemporaryDirectory()
+        tsv_path = Path(self.tmp.name) / 'senticnet.tsv'
+        make_senticnet_data().to_csv(tsv_path, sep='\t', index=False)
+        self.processor = SpeechProcessor(str(tsv_path), lexicon_cache=False)
+        self.nlp = spacy.blank('en')
+        self.nlp.add_pipe('sentencizer')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scores_average_token_contributions(self):
+        scores = self.processor._score_doc(self.nlp('Happy, sad and happy. Calm? Unknown words.'))
+        self.assertEqual(list(scores), ['INTROSPECTION#joy', 'TEMPER#eagerness', 'SENSITIVITY#sadness', 'ATTITUDE',
+                                        'TEMPER', 'INTROSPECTION#calmness', 'POLARITY'])
+        self.assertAlmostEqual(scores['INTROSPECTION#joy'], 0.8)
+        self.assertAlmostEqual(scores['SENSITIVITY#sadness'], 0.1)
+        self.assertAlmostEqual(scores['ATTITUDE'], -0.9)
+        self.assertAlmostEqual(scores['TEMPER'], 0.5)
+        self.assertAlmostEqual(scores['POLARITY'], (0.75 - 0.8 + 0.75 + 0.3) / 4)
+        self.assertEqual(self.processor._score_doc(self.nlp('Nothing here.')), {'POLARITY': 0})
+
+    def test_phrases_are_matched_when_enabled(self):
+        data = pd.concat([make_senticnet_data(), make_senticnet_data().iloc[[3]].assign(CONCEPT='very_happy')])
+        tsv_path = Path(self.tmp.name) / 'phrases.tsv'
+        data.to_csv(tsv_path, sep='\t', index=False)
+        text = self.nlp('Very happy, happy.')
+        self.assertEqual(SpeechProcessor(str(tsv_path), lexicon_cache=False)._score_doc(text)['POLARITY'], 0.75)
+        processor = SpeechProcessor(str(tsv_path), lexicon_cache=False, match_phrases=True)
+        words = [token.lower_ for token in next(text.sents)]
+        self.assertEqual(list(processor._phrases(words)), ['very_happy', ',', 'happy', '.'])
+        self.assertAlmostEqual(processor._score_doc(text)['POLARITY'], (0.3 + 0.75) / 2)
+
+    def test_token_memo_stats(self):
+        self.processor._score_doc(self.nlp('happy HAPPY Happy unknown unknown'))
+        stats = self.processor.token_memo_stats
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (3, 2, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 0.6)
+        metrics = self.processor.metrics
+        self.assertEqual((metrics.counter('tokens_total'), metrics.counter('tokens_matched_total')), (5, 3))
+        self.assertEqual(metrics.histogram('stage_seconds', stage='lexicon_lookup').count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
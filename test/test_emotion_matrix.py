@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.emotion_matrix import EmotionMatrixBuilder
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+
+COLUMNS = ['TEMPER#anger', 'ATTITUDE#joy', 'INTROSPECTION', 'SENSITIVITY#fear', 'POLARITY']
+
+
+def make_scores(n: int = 6, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    texts = ['a calm day', 'an awful day', 'hope'] * (n // 3)
+    scores = []
+    for _ in texts:
+        emotions = rng.choice(COLUMNS[:2], size=2, replace=False)
+        scores.append({**{emotion: rng.uniform(-0.3, 0.3) for emotion in emotions}, 'POLARITY': rng.uniform(-1, 1)})
+    return texts, scores
+
+
+class TestEmotionMatrix(unittest.TestCase):
+    def setUp(self):
+        self.texts, self.scores = make_scores()
+        builder = EmotionMatrixBuilder(COLUMNS)
+        for scores in self.scores:
+            builder.add(scores)
+        self.matrix = builder.build(pd.DataFrame({'text': self.texts}))
+
+    def test_scores_are_sparse(self):
+        self.assertEqual(self.matrix.scores.shape, (len(self.texts), len(COLUMNS)))
+        self.assertEqual(self.matrix.scores.nnz, sum(len(scores) for scores in self.scores))
+        self.assertEqual(self.matrix.active_columns(), ['ATTITUDE#joy', 'POLARITY', 'TEMPER#anger'])
+        np.testing.assert_array_equal(self.matrix.column('POLARITY'), [scores['POLARITY'] for scores in self.scores])
+
+    def test_to_frame_matches_dense_layout(self):
+        expected = pd.DataFrame([{'text': text, **scores} for text, scores in zip(self.texts, self.scores)]).fillna(0)
+        frame = self.matrix.to_frame()
+        pd.testing.assert_frame_equal(frame[expected.columns], expected)
+
+    def test_calculator_accepts_matrix(self):
+        dense = self.matrix.to_frame()
+        calculator = SentimentFlowCalculator()
+        with tempfile.TemporaryDirectory() as tmp:
+            for vectorized in (False, True):
+                expected = calculator.calculate_navier_stocker_for_texts(
+                    dense, vectorized=vectorized, sink=str(Path(tmp) / 'dense'))
+                all_s = calculator.calculate_navier_stocker_for_texts(
+                    self.matrix, vectorized=vectorized, batch_size=4, sink=str(Path(tmp) / 'sparse'))
+                self.assertEqual(list(all_s), list(expected))
+                for idx in expected:
+                    self.assertEqual(list(all_s[idx][0]['emotion dimension']),
+                                     list(expected[idx][0]['emotion dimension']))
+                    np.testing.assert_array_equal(all_s[idx][0]['simulation'], expected[idx][0]['simulation'])
+
+
+if __name__ == '__main__':
+    unittest.main()
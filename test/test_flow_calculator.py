@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.emotion_matrix import EmotionMatrixBuilder
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+
+
+# Speeches with a missing speaker and a score stored as text.
+def make_mixed_speeches() -> pd.DataFrame:
+    return pd.DataFrame({
+        'title': ['T1', 'T2', 'T3', 'T4', 'T5', 'T6'],
+        'speaker': ['B', 'A', 'B', None, 'A', 'B'],
+        'speech': ['b1', 'a1', 'b2', 'x', 'a2', 'b3'],
+        'TEMPER': [0.1, 0.0, '0.3', 0.2, 0.5, 0.6],
+        'ATTITUDE': [0.0, -0.2, 0.1, 0.0, 0.0, 0.4],
+        'POLARITY': [0.5, -0.5, 0.25, 0.0, 0.75, -0.25],
+    })
+
+
+class TestSpeakerTasks(unittest.TestCase):
+    def test_rows_are_grouped_by_speaker_in_order(self):
+        tasks = SentimentFlowCalculator()._speaker_tasks(make_mixed_speeches())
+        self.assertEqual([task[0] for task in tasks], ['B', 'A'])
+        speaker, title, speeches, s0, polarity, sentiment_columns = tasks[0]
+        self.assertEqual(title, 'T1')
+        self.assertEqual(speeches, ['b1', 'b2', 'b3'])
+        self.assertEqual(list(sentiment_columns), ['ATTITUDE', 'TEMPER'])
+        np.testing.assert_array_equal(s0, [0.0, 0.1])
+        np.testing.assert_array_equal(polarity, [0.5, 0.25, -0.25])
+        self.assertEqual(tasks[1][2], ['a1', 'a2'])
+
+    def test_emotion_matrix_gives_the_same_tasks(self):
+        data = make_mixed_speeches().dropna(subset=['speaker'])
+        data['TEMPER'] = data['TEMPER'].astype(float)
+        builder = EmotionMatrixBuilder(['TEMPER', 'ATTITUDE', 'JOY', 'POLARITY'])
+        for _, row in data.iterrows():
+            builder.add({'TEMPER': row['TEMPER'], 'ATTITUDE': row['ATTITUDE'], 'POLARITY': row['POLARITY']})
+        matrix = builder.build(data[['title', 'speaker', 'speech']].reset_index(drop=True))
+
+        calculator = SentimentFlowCalculator()
+        for expected, task in zip(calculator._speaker_tasks(data), calculator._speaker_tasks(matrix)):
+            self.assertEqual(expected[:3], task[:3])
+            np.testing.assert_array_equal(expected[3], task[3])
+            np.testing.assert_array_equal(expected[4], task[4])
+            self.assertEqual(list(expected[5]), list(task[5]))
+
+    def test_speaker_flow_is_returned(self):
+        data = make_mixed_speeches().dropna(subset=['speaker'])
+        all_s = SentimentFlowCalculator(output=OutputPolicy.memory()).calculate_navier_stocker_for_speeches(data)
+        result = all_s['T1'][0]
+        # The first step is driven by the first speech, the second one by the third.
+        self.assertEqual(list(result['speech']), ['b1', 'b3'])
+        self.assertEqual(list(result['time']), [0, 1, 1, 2])
+        self.assertEqual(result['simulation'].shape, (4, 2))
+        np.testing.assert_array_equal(result['simulation'][0], [0.0, 0.1])
+        np.testing.assert_array_equal(result['simulation'][2], result['simulation'][1])
+
+    def test_resolution_and_dtype_select_the_stored_states(self):
+        data = make_mixed_speeches().dropna(subset=['speaker'])
+        full = SentimentFlowCalculator(output=OutputPolicy.memory()).calculate_navier_stocker_for_speeches(data)
+        states = full['T1'][0]['simulation']
+        for resolution, rows, times in (('final', [3], [2]), (1, [0, 1, 3], [0, 1, 2]), (2, [0, 3], [0, 2])):
+            with self.subTest(resolution=resolution):
+                calculator = SentimentFlowCalculator(output=OutputPolicy.memory(), resolution=resolution,
+                                                     dtype='float32')
+                result = calculator.calculate_navier_stocker_for_speeches(data)['T1'][0]
+                self.assertEqual(list(result['speech']), ['b1', 'b3'])
+                self.assertEqual(list(result['time']), times)
+                self.assertEqual(result['simulation'].dtype, np.float32)
+                np.testing.assert_array_equal(result['simulation'], states[rows].astype(np.float32))
+
+        texts = data.rename(columns={'speech': 'text'}).drop(columns=['title', 'speaker']).astype({'TEMPER': float})
+        for vectorized in (False, True):
+            results = SentimentFlowCalculator(output=OutputPolicy.memory(), resolution='final').\
+                calculate_navier_stocker_for_texts(texts, vectorized=vectorized)
+            self.assertEqual(results[0][0]['text'], 'b1')
+            self.assertEqual(results[0][0]['simulation'].shape, (1, 3))
+
+    def test_invalid_resolution_and_dtype(self):
+        for options in ({'resolution': 0}, {'resolution': 'half'}, {'resolution': True}, {'dtype': 'int32'}):
+            with self.subTest(**options), self.assertRaises(ValueError):
+                SentimentFlowCalculator(**options)
+
+
+if __name__ == '__main__':
+    unittest.main()
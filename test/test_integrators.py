@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy.integrate import odeint
+
+from SentimentFlow.integrators import (FIXED_STEP_METHODS, SOLVE_IVP_METHODS, FlowIntegrator, _rhs_kernel,
+                                       flow_jacobian, to_banded)
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.solver import navier_stokes_rhs, pressure_terms
+
+
+def make_problem(d: int = 8, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    s0 = rng.uniform(-0.3, 0.3, size=d)
+    rho = np.sum(np.abs(s0))
+    pressure_term = pressure_terms(np.array([rho]), s0[None])[0]
+    return s0, pressure_term, float(np.std(s0)), 0.2
+
+
+class TestFlowIntegrator(unittest.TestCase):
+    def test_jacobian_matches_finite_differences(self):
+        s0, pressure_term, nu, g_context = make_problem()
+        jacobian = flow_jacobian(s0, pressure_term, nu, g_context)
+        eps = 1e-6
+        numeric = np.column_stack([
+            (navier_stokes_rhs(s0 + eps * e, 0, pressure_term, nu, g_context)
+             - navier_stokes_rhs(s0 - eps * e, 0, pressure_term, nu, g_context)) / (2 * eps)
+            for e in np.eye(len(s0))
+        ])
+        np.testing.assert_allclose(jacobian, numeric, atol=1e-8)
+
+        band = to_banded(jacobian)
+        for i, j in zip(*np.nonzero(jacobian)):
+            self.assertLessEqual(abs(i - j), 2)
+            self.assertEqual(band[2 + i - j, j], jacobian[i, j])
+
+    def test_rhs_kernel_matches_numpy(self):
+        s0, pressure_term, nu, g_context = make_problem()
+        out = np.empty_like(s0)
+        self.assertTrue(_rhs_kernel(s0, pressure_term, nu, g_context, out))
+        np.testing.assert_array_equal(out, navier_stokes_rhs(s0, 0, pressure_term, nu, g_context))
+        with np.errstate(invalid='ignore'):
+            self.assertFalse(_rhs_kernel(np.array([np.inf, 0.0]), np.zeros(2), nu, g_context, np.empty(2)))
+
+    def test_default_reproduces_odeint(self):
+        s0, _, nu, g_context = make_problem()
+        calculator = SentimentFlowCalculator()
+        speech_info = (np.sum(np.abs(s0)), s0, nu, g_context)
+        t = np.array([0, 1])
+        expected = odeint(SentimentFlowCalculator._differential_equation, s0, t, args=(speech_info,))
+        np.testing.assert_array_equal(calculator._integrate(s0, t, speech_info), expected)
+
+    def test_methods_agree(self):
+        s0, pressure_term, nu, g_context = make_problem()
+        t = np.array([0.0, 0.5, 1.0])
+        reference = FlowIntegrator(rtol=1e-12, atol=1e-12).integrate(s0, t, pressure_term, nu, g_context)
+        for method in SOLVE_IVP_METHODS + FIXED_STEP_METHODS:
+            for use_jacobian in (False, True):
+                integrator = FlowIntegrator(method, rtol=1e-8, atol=1e-10, n_steps=200, use_jacobian=use_jacobian)
+                states = integrator.integrate(s0, t, pressure_term, nu, g_context)
+                tolerance = 1e-3 if method == 'euler' else 1e-6
+                np.testing.assert_allclose(states, reference, atol=tolerance, err_msg=method)
+                self.assertEqual(integrator.stats.integrations, 1)
+                self.assertGreater(integrator.stats.rhs_evaluations, 0)
+
+    def test_fixed_step_counts_rhs_evaluations(self):
+        s0, pressure_term, nu, g_context = make_problem()
+        integrator = FlowIntegrator('rk4', n_steps=5)
+        integrator.integrate(s0, np.array([0, 1, 2]), pressure_term, nu, g_context)
+        self.assertEqual(integrator.stats.rhs_evaluations, 2 * 5 * 4)
+
+    def test_divergence_is_flagged(self):
+        s0, pressure_term, nu, _ = make_problem()
+        for method in ('odeint', 'RK45', 'rk4'):
+            integrator = FlowIntegrator(method)
+            self.assertIsNone(integrator.try_integrate(s0, np.array([0, 1]), pressure_term, nu, np.nan))
+            self.assertEqual(integrator.stats.diverged, 1)
+            with self.assertRaises(ValueError):
+                integrator.integrate(s0, np.array([0, 1]), pressure_term, nu, np.nan)
+
+    def test_diverged_texts_are_skipped(self):
+        rng = np.random.default_rng(2)
+        data = pd.DataFrame(rng.uniform(-0.3, 0.3, size=(4, 3)), columns=['ATTITUDE', 'TEMPER', 'POLARITY'])
+        data.insert(0, 'text', ['a calm day'] * 4)
+        data.loc[2, 'POLARITY'] = np.nan
+        for vectorized in (False, True):
+            calculator = SentimentFlowCalculator()
+            results = calculator.calculate_navier_stocker_for_texts(data, vectorized=vectorized)
+            self.assertEqual(list(results), [0, 1, 3])
+            self.assertEqual(calculator.diverged, [2])
+            with self.assertRaises(ValueError):
+                SentimentFlowCalculator(on_divergence='raise').calculate_navier_stocker_for_texts(data, vectorized=vectorized)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            FlowIntegrator('midpoint')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import pickle
+import unittest
+
+from SentimentFlow.keyword_matcher import KeywordMatcher
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_matches_like_substring_search(self):
+        keywords = ['War', 'warm', 'peace', 'pea', 'tax reform']
+        matcher = KeywordMatcher(keywords)
+        texts = ['Wa', 'the WARMTH', 'a pe', 'split peas', 'TAX REFORMS now', 'tax  reform', '']
+        for text in texts:
+            expected = any(keyword.lower() in text.lower() for keyword in keywords)
+            self.assertEqual(matcher.contains(text), expected, text)
+
+    def test_special_characters_are_literal(self):
+        matcher = KeywordMatcher(['c++', 'u.s.'])
+        self.assertTrue(matcher.contains('I write C++'))
+        self.assertTrue(matcher.contains('the U.S. economy'))
+        self.assertFalse(matcher.contains('the usa economy'))
+
+    def test_empty_keywords(self):
+        self.assertFalse(KeywordMatcher([]).contains('anything'))
+        self.assertTrue(KeywordMatcher(['']).contains('anything'))
+
+    def test_pickle_round_trip(self):
+        matcher = pickle.loads(pickle.dumps(KeywordMatcher(['hope'])))
+        self.assertTrue(matcher.contains('Hopeful'))
+        self.assertFalse(matcher.contains('despair'))
+
+
+if __name__ == '__main__':
+    unittest.main()
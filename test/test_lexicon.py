@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.lexicon import SenticNetLexicon
+from conftest import make_senticnet_data
+
+CATEGORIES = ['INTROSPECTION', 'TEMPER', 'ATTITUDE', 'SENSITIVITY']
+
+
+class TestSenticNetLexicon(unittest.TestCase):
+    def setUp(self):
+        self.lexicon = SenticNetLexicon.from_dataframe(make_senticnet_data(), CATEGORIES)
+
+    def test_resolves_categories_and_emotions(self):
+        entry = self.lexicon.get('happy')
+        self.assertEqual(entry.max_category, 'INTROSPECTION')
+        self.assertEqual(entry.min_category, 'TEMPER')
+        self.assertEqual(entry.max_emotion, 'INTROSPECTION#joy')
+        self.assertEqual(entry.min_emotion, 'TEMPER#eagerness')
+        self.assertAlmostEqual(entry.max_score, 0.8)
+        self.assertAlmostEqual(entry.min_score, 0.0)
+        self.assertAlmostEqual(entry.polarity, 0.75)
+
+    def test_missing_emotion_falls_back_to_category(self):
+        self.assertEqual(self.lexicon.get('sad').min_emotion, 'ATTITUDE')
+        self.assertEqual(self.lexicon.get('calm').max_emotion, 'TEMPER')
+
+    def test_first_duplicate_wins(self):
+        self.assertEqual(len(self.lexicon), 3)
+        self.assertEqual(self.lexicon.get('happy').max_emotion, 'INTROSPECTION#joy')
+
+    def test_unknown_concept(self):
+        self.assertIsNone(self.lexicon.get('unknown'))
+        self.assertNotIn('unknown', self.lexicon)
+
+
+class TestPhraseMatching(unittest.TestCase):
+    def setUp(self):
+        phrases = make_senticnet_data().iloc[[0, 1, 3]].assign(CONCEPT=['very_happy', 'not_happy_at_all', 'a_lot'])
+        self.lexicon = SenticNetLexicon.from_dataframe(pd.concat([make_senticnet_data(), phrases]), CATEGORIES)
+
+    def test_phrase_prefixes(self):
+        self.assertEqual(self.lexicon.phrase_prefixes, {'very', 'not', 'not_happy', 'not_happy_at', 'a'})
+
+    def test_longest_match(self):
+        words = ['not', 'happy', 'at', 'all', 'very', 'happy', 'very', 'sad', 'a', 'lot']
+        self.assertEqual(self.lexicon.match_phrase(words, 0), 4)
+        self.assertEqual(self.lexicon.match_phrase(words, 1), 1)
+        self.assertEqual(self.lexicon.match_phrase(words, 4), 2)
+        self.assertEqual(self.lexicon.match_phrase(words, 6), 0)
+        self.assertEqual(self.lexicon.match_phrase(words, 8), 2)
+        self.assertEqual(self.lexicon.match_phrase(['not', 'happy', 'at'], 0), 0)
+
+
+class TestSenticNetLexiconCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tsv_path = Path(self.tmp.name) / 'senticnet.tsv'
+        self.cache_dir = Path(self.tmp.name) / 'cache'
+        make_senticnet_data().to_csv(self.tsv_path, sep='\t', index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_round_trip(self):
+        built = SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        self.assertTrue((self.cache_dir / 'meta.json').exists())
+        cached = SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        self.assertIsInstance(cached.values, np.memmap)
+        for concept in ['happy', 'sad', 'calm']:
+            self.assertEqual(cached.get(concept), built.get(concept))
+        self.assertEqual(cached.version, built.version)
+
+    def test_cache_invalidated_when_source_changes(self):
+        SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        data = make_senticnet_data()
+        data.loc[1, 'POLARITY INTENSITY'] = -0.25
+        data.to_csv(self.tsv_path, sep='\t', index=False)
+        os.utime(self.tsv_path, ns=(1, 1))
+        reloaded = SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        self.assertAlmostEqual(reloaded.get('sad').polarity, -0.25)
+
+    def test_touched_source_updates_the_cache_metadata(self):
+        SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        values_mtime = (self.cache_dir / 'values.npy').stat().st_mtime_ns
+        os.utime(self.tsv_path, ns=(2, 2))
+        cached = SenticNetLexicon.load(str(self.tsv_path), CATEGORIES, cache_dir=str(self.cache_dir))
+        self.assertIsInstance(cached.values, np.memmap)
+        self.assertEqual((self.cache_dir / 'values.npy').stat().st_mtime_ns, values_mtime)
+        meta = json.loads((self.cache_dir / 'meta.json').read_text(encoding='utf-8'))
+        self.assertEqual(meta['mtime_ns'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
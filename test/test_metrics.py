@@ -0,0 +1,79 @@
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.metrics import Metrics
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+        self.metrics.increment('tokens_total', 5)
+        self.metrics.update(counters={'tokens_total': 2}, timings={'solver': 0.5})
+        self.metrics.record_time('solver', 0.05)
+        self.metrics.record_time('solver', 3.0)
+
+    def test_values(self):
+        self.assertEqual(self.metrics.counter('tokens_total'), 7)
+        self.assertEqual(self.metrics.counter('missing_total'), 0)
+        histogram = self.metrics.histogram('stage_seconds', stage='solver')
+        self.assertEqual(histogram.count, 3)
+        self.assertAlmostEqual(histogram.sum, 3.55)
+        self.assertEqual(histogram.cumulative(), [('0.1', 1), ('1.0', 2), ('+Inf', 3)])
+
+    def test_prometheus_export(self):
+        self.assertEqual(self.metrics.to_prometheus().splitlines(), [
+            '# TYPE sentimentflow_tokens_total counter',
+            'sentimentflow_tokens_total 7',
+            '# TYPE sentimentflow_stage_seconds histogram',
+            'sentimentflow_stage_seconds_bucket{stage="solver",le="0.1"} 1',
+            'sentimentflow_stage_seconds_bucket{stage="solver",le="1.0"} 2',
+            'sentimentflow_stage_seconds_bucket{stage="solver",le="+Inf"} 3',
+            'sentimentflow_stage_seconds_sum{stage="solver"} 3.55',
+            'sentimentflow_stage_seconds_count{stage="solver"} 3',
+        ])
+
+    def test_json_export(self):
+        data = json.loads(self.metrics.to_json())
+        self.assertEqual(data['counters'], [{'name': 'tokens_total', 'labels': {}, 'value': 7}])
+        self.assertEqual(data['histograms'][0]['labels'], {'stage': 'solver'})
+
+    def test_merge_pickled_copy(self):
+        copy = pickle.loads(pickle.dumps(self.metrics))
+        copy.increment('nan_skips_total')
+        self.metrics.merge(copy)
+        self.assertEqual(self.metrics.counter('tokens_total'), 14)
+        self.assertEqual(self.metrics.counter('nan_skips_total'), 1)
+        self.assertEqual(self.metrics.histogram('stage_seconds', stage='solver').count, 6)
+
+    def test_listeners(self):
+        seen = []
+        self.metrics.add_listener(lambda *args: seen.append(args))
+        self.metrics.increment('documents_total', stage='x')
+        self.metrics.update(timings={'aggregation': 0.01})
+        self.assertEqual(seen, [('counter', 'documents_total', 1, {'stage': 'x'}),
+                                ('histogram', 'stage_seconds', 0.01, {'stage': 'aggregation'})])
+
+    def test_calculator_records_stages(self):
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame(rng.uniform(-0.3, 0.3, size=(4, 3)), columns=['ATTITUDE', 'TEMPER', 'POLARITY'])
+        data.insert(0, 'text', ['a calm day', 'an awful day', 'hope', 'rain'])
+        data.loc[3, 'POLARITY'] = np.nan
+        calculator = SentimentFlowCalculator()
+        with tempfile.TemporaryDirectory() as tmp:
+            calculator.calculate_navier_stocker_for_texts(data, sink=str(Path(tmp) / 'texts'))
+            calculator.calculate_navier_stocker_for_texts(data, vectorized=True, sink=str(Path(tmp) / 'batched'))
+        self.assertEqual(calculator.metrics.counter('solver_failures_total'), 1)
+        self.assertEqual(calculator.metrics.counter('nan_skips_total'), 1)
+        self.assertEqual(calculator.metrics.histogram('stage_seconds', stage='solver').count, 5)
+        self.assertEqual(calculator.metrics.histogram('stage_seconds', stage='serialization').count, 3 + 3 + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.sinks import NullSink
+from conftest import make_texts
+
+
+class TestOutputPolicy(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_memory_policy_writes_nothing(self):
+        policy = OutputPolicy.memory()
+        policy.write_frame(make_texts(4, seed=2), 'processed_texts.csv')
+        self.assertIsInstance(policy.open_sink('navier_stocker_text_results.json'), NullSink)
+        all_s = SentimentFlowCalculator(output=policy).calculate_navier_stocker_for_texts(make_texts(4, seed=2))
+        self.assertEqual(len(all_s), 4)
+        self.assertEqual(list(self.path.iterdir()), [])
+
+    def test_default_policy_writes_to_results(self):
+        SentimentFlowCalculator().calculate_navier_stocker_for_texts(make_texts(4, seed=2))
+        self.assertTrue((self.path / 'results' / 'navier_stocker_text_results.json').exists())
+
+    def test_background_writes_match_synchronous_ones(self):
+        frame = make_texts(4, seed=2)
+        OutputPolicy('sync').write_frame(frame, 'processed_texts.csv')
+        policy = OutputPolicy('background', background=True)
+        policy.write_frame(frame, 'processed_texts.csv')
+        frame.loc[0, 'text'] = 'changed after the call'
+        policy.wait()
+        self.assertEqual((self.path / 'background' / 'processed_texts.csv').read_bytes(),
+                         (self.path / 'sync' / 'processed_texts.csv').read_bytes())
+
+        for name, output in (('sync', OutputPolicy('sync')), ('background', policy)):
+            SentimentFlowCalculator(output=output).calculate_navier_stocker_for_texts(make_texts(4, seed=2))
+        self.assertEqual((self.path / 'background' / 'navier_stocker_text_results.json').read_bytes(),
+                         (self.path / 'sync' / 'navier_stocker_text_results.json').read_bytes())
+        self.assertEqual(sorted(path.name for path in (self.path / 'background').iterdir()),
+                         ['navier_stocker_text_results.json', 'processed_texts.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
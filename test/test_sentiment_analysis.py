@@ -1,29 +1,68 @@
 import unittest
+
 import numpy as np
 
-from SentimentFlow.sentiment_analysis import _calculate_sentiment_density, calculate_sentiment_pressure, calculate_sentiment_viscosity, calculate_external_contextual_force
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from conftest import DIMENSIONS, make_texts
+
+SCORES = np.array([0.1, 0.2, 0.3, 0.4])
+
+
 class TestSentimentAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.calculator = SentimentFlowCalculator(keywords=['happy', 'joyful'], output=OutputPolicy.memory())
+
     def test_calculate_sentiment_density(self):
-        scores = [0.1, 0.2, 0.3, 0.4]
-        density = _calculate_sentiment_density(scores)
-        self.assertAlmostEqual(density, 1.0)
+        self.assertAlmostEqual(SentimentFlowCalculator._calculate_sentiment_density(SCORES), 1.0)
+        self.assertAlmostEqual(SentimentFlowCalculator._calculate_sentiment_density(-SCORES), 1.0)
 
     def test_calculate_sentiment_pressure(self):
-        score = 0.5
-        keywords = ["happy", "joyful"]
-        text = "This is a very happy day."
-        pressure = calculate_sentiment_pressure(score, keywords, text)
-        self.assertAlmostEqual(pressure, 0.5)
+        self.assertAlmostEqual(self.calculator._calculate_sentiment_pressure(0.5, "This is a very HAPPY day."), 0.5)
+        self.assertEqual(self.calculator._calculate_sentiment_pressure(0.5, "This is a rainy day."), 0)
+        np.testing.assert_array_equal(self.calculator._calculate_sentiment_pressures(SCORES, "a joyful day"), SCORES)
+        np.testing.assert_array_equal(self.calculator._calculate_sentiment_pressures(SCORES, "a rainy day"),
+                                      np.zeros(4))
 
     def test_calculate_sentiment_viscosity(self):
-        scores = [0.1, 0.2, 0.3, 0.4]
-        viscosity = calculate_sentiment_viscosity(scores)
-        self.assertAlmostEqual(viscosity, 0.129099)
+        self.assertAlmostEqual(SentimentFlowCalculator._calculate_sentiment_viscosity(SCORES), 0.111803, places=6)
 
     def test_calculate_external_contextual_force(self):
-        polarity = 0.75
-        force = calculate_external_contextual_force(polarity)
-        self.assertAlmostEqual(force, 0.75)
+        self.assertAlmostEqual(SentimentFlowCalculator._calculate_external_contextual_force(0.75), 0.75)
+
+    def test_navier_stokes_sentiment_flow(self):
+        s = np.array([0.2, -0.1, 0.3])
+        p_sent = np.array([0.5, 0.0, -0.5])
+        rhs = SentimentFlowCalculator._navier_stokes_sentiment_flow(2.0, p_sent, 0.1, 0.25, s)
+        grad_s = np.gradient(s)
+        expected = s * grad_s - np.gradient(p_sent) / 2.0 + 0.1 * np.gradient(grad_s) + 0.25
+        np.testing.assert_allclose(rhs, expected)
+        # Without density there is no pressure term.
+        np.testing.assert_allclose(SentimentFlowCalculator._navier_stokes_sentiment_flow(0, p_sent, 0.1, 0.25, s),
+                                   expected + np.gradient(p_sent) / 2.0)
+
+    def test_differential_equation_rejects_non_finite_states(self):
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(SentimentFlowCalculator._navier_stokes_sentiment_flow(
+                1.0, np.zeros(3), 0.1, 0.0, np.array([0.1, np.nan, 0.2])))
+        with self.assertLogs(level='WARNING'), self.assertRaises(ValueError):
+            SentimentFlowCalculator._differential_equation(np.array([0.1, np.inf, 0.2]), 0.0,
+                                                           [1.0, np.zeros(3), 0.1, 0.0])
+
+    def test_calculate_navier_stocker_for_texts(self):
+        data = make_texts(4)
+        columns = [*DIMENSIONS, 'POLARITY']
+        results = self.calculator.calculate_navier_stocker_for_texts(data)
+        self.assertEqual(sorted(results), list(data.index))
+        for idx, row in data.iterrows():
+            record = results[idx][0]
+            # Every score column is an emotion dimension of the flow.
+            self.assertEqual(sorted(record['emotion dimension']), sorted(columns))
+            # The flow starts at the scores of the text and runs for one unit of time.
+            start = row[list(record['emotion dimension'])].to_numpy(dtype=float)
+            np.testing.assert_allclose(record['simulation'][0], start)
+            self.assertEqual(np.shape(record['simulation']), (2, len(columns)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import importlib.util
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.data_processing import SpeechProcessor
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.service import RequestTooLarge, ScoringService, ServiceOverloaded, _score_batch
+from conftest import make_senticnet_data
+
+HAS_SPACY = importlib.util.find_spec('spacy') is not None
+TEXTS = ['I am happy and calm.', 'So sad, sad.', 'Nothing here.', 'Happy? Sad!']
+
+
+@unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+class TestScoringService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        tsv_path = Path(self.tmp.name) / 'senticnet.tsv'
+        make_senticnet_data().to_csv(tsv_path, sep='\t', index=False)
+        self.processor = SpeechProcessor(str(tsv_path), lexicon_cache=False, nlp_model='blank:en')
+        self.service = ScoringService(self.processor, SentimentFlowCalculator(), max_batch_size=8, max_wait=0.05,
+                                      max_pending=6)
+        await self.service.start()
+
+    async def asyncTearDown(self):
+        await self.service.stop()
+        self.tmp.cleanup()
+
+    async def test_concurrent_requests_share_a_batch(self):
+        results = await asyncio.gather(self.service.score(TEXTS[:2]), self.service.score(TEXTS[2:]))
+        self.assertEqual(self.service.metrics.counter('batches_total'), 1)
+        self.assertEqual(self.service.metrics.counter('batched_texts_total'), 4)
+        results = results[0] + results[1]
+        self.assertEqual([result['text'] for result in results], TEXTS)
+        self.assertEqual(results[2]['scores'], {})
+
+        # The same flows as the offline vectorized path over the same emotion dimensions.
+        scores = self.processor.score_texts(TEXTS)
+        data = pd.DataFrame(scores, columns=self.service.dimensions).fillna(0)
+        data.insert(0, 'text', TEXTS)
+        expected = SentimentFlowCalculator().calculate_navier_stocker_for_texts(
+            data, vectorized=True, sink=str(Path(self.tmp.name) / 'results'))
+        for i, result in enumerate(results):
+            self.assertEqual(list(expected[i][0]['emotion dimension']), self.service.dimensions)
+            np.testing.assert_array_equal(result['simulation'], expected[i][0]['simulation'])
+
+    async def test_rejects_requests_beyond_max_pending(self):
+        first = asyncio.ensure_future(self.service.score(TEXTS + TEXTS[:2]))
+        await asyncio.sleep(0)
+        self.assertEqual(self.service.pending, 6)
+        with self.assertRaises(ServiceOverloaded):
+            await self.service.score(TEXTS[:1])
+        self.assertEqual(len(await first), 6)
+        self.assertEqual(self.service.metrics.counter('requests_rejected_total'), 1)
+
+    async def test_rejects_requests_larger_than_max_pending(self):
+        with self.assertRaises(RequestTooLarge):
+            await self.service.score(TEXTS + TEXTS)
+        self.assertEqual(self.service.pending, 0)
+        self.assertEqual(self.service.metrics.counter('requests_rejected_total'), 1)
+
+    async def test_worker_processes_match_threads(self):
+        expected = await self.service.score(TEXTS)
+        # Batches go to a worker process by value, so the batch function and its arguments must pickle.
+        pickle.dumps((_score_batch, self.processor, self.service.calculator))
+        service = ScoringService(self.processor, SentimentFlowCalculator(), max_batch_size=8, max_wait=0.05,
+                                 processes=True)
+        await service.start()
+        try:
+            self.assertEqual(await service.score(TEXTS), expected)
+        finally:
+            await service.stop()
+        self.assertEqual(service.metrics.counter('batches_total'), 1)
+        # The processor's metrics of the worker are added to the parent's.
+        self.assertEqual(self.processor.metrics.counter('documents_total'), 2 * len(TEXTS))
+
+    async def test_http_endpoints(self):
+        server = await self.service.serve(port=0)
+        host, port = server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+
+        async def request(method, path, body=b''):
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            line = await reader.readline()
+            while line != b'\r\n':
+                name, _, value = line.decode().partition(':')
+                headers[name.lower()] = value.strip()
+                line = await reader.readline()
+            return status, await reader.readexactly(int(headers['content-length']))
+
+        try:
+            status, body = await request('POST', '/score', json.dumps({'text': TEXTS[0]}).encode())
+            self.assertEqual(status, 200)
+            payload = json.loads(body)
+            self.assertEqual(payload['emotion_dimensions'], self.service.dimensions)
+            self.assertEqual(np.shape(payload['results'][0]['simulation']), (2, len(self.service.dimensions)))
+            self.assertEqual((await request('POST', '/score', b'{"texts": 3}'))[0], 400)
+            self.assertEqual((await request('GET', '/score'))[0], 405)
+            self.assertEqual((await request('POST', '/score', json.dumps({'texts': TEXTS * 2}).encode()))[0], 413)
+            self.processor.score_texts = mock.Mock(side_effect=RuntimeError("tokenizer failed"))
+            with self.assertLogs(level='ERROR'):
+                self.assertEqual((await request('POST', '/score', json.dumps({'text': TEXTS[0]}).encode()))[0], 500)
+            del self.processor.score_texts
+            status, body = await request('GET', '/metrics')
+            self.assertEqual(status, 200)
+            self.assertIn('sentimentflow_batches_total 1', body.decode())
+            self.assertIn('sentimentflow_documents_total 1', body.decode())
+            writer.close()
+
+            # A Content-Length that cannot be read gets an answer, and the connection is closed.
+            for length in ('abc', '-1'):
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.write(f"POST /score HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                response = (await reader.read()).decode()
+                self.assertTrue(response.startswith('HTTP/1.1 400'), response)
+                self.assertIn('Connection: close', response)
+                writer.close()
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.data_processing import SpeechProcessor
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.sharding import ShardedRun
+from SentimentFlow.sinks import load_results
+from conftest import make_senticnet_data
+
+HAS_SPACY = importlib.util.find_spec('spacy') is not None
+WORDS = ['happy', 'sad', 'calm', 'day', 'NA']
+
+
+def make_corpus(n: int = 30, seed: int = 0, speakers=('A', 'B', 'C', 'D', 'E')) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    speeches = [' '.join(rng.choice(WORDS, size=6)) + '.' for _ in range(n)]
+    speeches[3] = 'NA'
+    return pd.DataFrame({'title': [f'T{i}' for i in range(n)],
+                         'speaker': rng.choice(list(speakers), size=n), 'speech': speeches})
+
+
+@unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+class TestShardedRun(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        make_senticnet_data().to_csv(self.path / 'senticnet.tsv', sep='\t', index=False)
+        self.processor = SpeechProcessor(str(self.path / 'senticnet.tsv'), lexicon_cache=False,
+                                         nlp_model='blank:en', output=OutputPolicy.memory())
+        self.calculator = SentimentFlowCalculator(output=OutputPolicy.memory())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_shards(self, input_path: Path, kind: str, n_shards: int) -> Path:
+        run = ShardedRun.plan(str(input_path), str(self.path / f'{kind}-{n_shards}'), n_shards, kind)
+        for shard in reversed(range(n_shards)):
+            run.score(shard, self.processor)
+        for shard in range(n_shards):
+            run.flow(shard, self.calculator)
+        self.assertEqual(list(run.status()['flow']), ['done'] * n_shards)
+        return run.merge()
+
+    def check_merged(self, merged: Path, processed: pd.DataFrame, reference: Path):
+        text_columns = {column: str for column in ('title', 'speaker', 'speech', 'text')}
+        scores = pd.read_csv(merged / 'processed.csv', dtype=text_columns, keep_default_na=False,
+                             float_precision='round_trip')
+        self.assertEqual(sorted(scores.columns), sorted(processed.columns))
+        pd.testing.assert_frame_equal(scores[processed.columns], processed, check_dtype=False)
+        expected, results = load_results(reference), load_results(merged / 'flows')
+        self.assertEqual(results.emotion_dimensions, expected.emotion_dimensions)
+        np.testing.assert_array_equal(results.states, expected.states)
+        pd.testing.assert_frame_equal(results.metadata, expected.metadata)
+
+    def test_texts_match_an_unsharded_run(self):
+        texts = make_corpus()[['speech']].rename(columns={'speech': 'text'})
+        texts.to_csv(self.path / 'texts.csv', index=False)
+        processed = self.processor.process_texts(texts['text'])
+        self.calculator.calculate_navier_stocker_for_texts(processed, sink=str(self.path / 'reference'))
+        for n_shards in (1, 3):
+            self.check_merged(self.run_shards(self.path / 'texts.csv', 'texts', n_shards), processed,
+                              self.path / 'reference')
+
+    def test_speeches_match_an_unsharded_run(self):
+        speeches = make_corpus()
+        speeches.to_csv(self.path / 'speeches.csv', index=False)
+        processed = self.processor.process_speeches(speeches)
+        self.calculator.calculate_navier_stocker_for_speeches(processed, sink=str(self.path / 'reference'))
+        self.check_merged(self.run_shards(self.path / 'speeches.csv', 'speeches', 3), processed,
+                          self.path / 'reference')
+
+    def test_numeric_looking_fields_stay_strings(self):
+        speeches = make_corpus(12, speakers=['007', '1e3', '7'])
+        speeches.loc[[0, 5], 'speech'] = ['123', '0.50']
+        speeches.loc[1, 'title'] = '0042'
+        speeches.to_csv(self.path / 'speeches.csv', index=False)
+        processed = self.processor.process_speeches(speeches)
+        self.calculator.calculate_navier_stocker_for_speeches(processed, sink=str(self.path / 'reference'))
+        merged = self.run_shards(self.path / 'speeches.csv', 'speeches', 2)
+        self.check_merged(merged, processed, self.path / 'reference')
+        metadata = load_results(merged / 'flows').metadata
+        self.assertEqual(list(metadata['speaker']), list(pd.unique(speeches['speaker'])))
+        self.assertTrue(all(isinstance(key, str) for key in metadata['key']))
+        speeches_by_speaker = [speech for record in metadata['speech'] for speech in record]
+        self.assertIn('123', speeches_by_speaker)
+
+        texts = speeches[['speech']].rename(columns={'speech': 'text'})
+        texts.to_csv(self.path / 'texts.csv', index=False)
+        merged = self.run_shards(self.path / 'texts.csv', 'texts', 2)
+        metadata = load_results(merged / 'flows').metadata
+        self.assertEqual(metadata['text'][0], '123')
+        self.assertEqual(metadata['text'][5], '0.50')
+
+    def test_failed_shard_is_retried_alone(self):
+        make_corpus().to_csv(self.path / 'speeches.csv', index=False)
+        run = ShardedRun.plan(str(self.path / 'speeches.csv'), str(self.path / 'run'), 2, 'speeches')
+        run.score(0, self.processor)
+        with self.assertRaises(RuntimeError):
+            run.flow(0, self.calculator)
+        with self.assertRaises(AttributeError):
+            run.score(1, None)
+        status = run.phase_status(1, 'score')
+        self.assertEqual(status['state'], 'failed')
+        self.assertIn('AttributeError', status['error'])
+        run.score(1, self.processor)
+        self.assertEqual(list(run.status()['score']), ['done', 'done'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import importlib.util
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.sinks import BackgroundSink, JsonSink, NpySink, ParquetSink, ResultSink, load_results
+from conftest import make_speeches, make_texts
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+DIMENSIONS = pd.Index(['ATTITUDE', 'INTROSPECTION', 'TEMPER'])
+
+
+def make_records():
+    rng = np.random.default_rng(0)
+    return [
+        (0, {'text': ('a calm day',) * 2, 'simulation': rng.normal(size=(2, 3)), 'emotion dimension': DIMENSIONS}),
+        ('Title', {'speaker': 'Speaker 1', 'speech': ('first', 'first', 'second', 'second'),
+                   'simulation': rng.normal(size=(4, 3)), 'emotion dimension': DIMENSIONS}),
+        (2, {'text': ('an awful day',) * 2, 'simulation': rng.normal(size=(2, 3)), 'emotion dimension': DIMENSIONS}),
+    ]
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_round_trip(self, results):
+        records = make_records()
+        self.assertEqual(results.emotion_dimensions, list(DIMENSIONS))
+        self.assertEqual(len(results.metadata), len(records))
+        for (key, record), (_, row) in zip(records, results.metadata.iterrows()):
+            self.assertEqual(str(row['key']), str(key))
+            np.testing.assert_array_equal(results.states[row['start']:row['stop']], record['simulation'])
+        self.assertEqual(results.metadata['text'][0], ['a calm day'] * 2)
+
+    def test_npy_round_trip(self):
+        with NpySink(str(self.path / 'results'), buffer_size=2) as sink:
+            for key, record in make_records():
+                sink.write(key, record)
+        results = load_results(self.path / 'results')
+        self.assertIsInstance(results.states, np.memmap)
+        self.assertEqual(results.states.shape, (8, 3))
+        self.check_round_trip(results)
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        with ParquetSink(str(self.path / 'results.parquet'), buffer_size=2) as sink:
+            for key, record in make_records()[::2]:
+                sink.write(key, record)
+        results = load_results(self.path / 'results.parquet')
+        self.assertEqual(results.states.shape, (4, 3))
+        self.assertEqual(list(results.metadata['key']), [0, 2])
+        np.testing.assert_array_equal(results.states[2:], make_records()[2][1]['simulation'])
+
+    def test_float32_states_and_times_round_trip(self):
+        record = {'speaker': 'Speaker 1', 'speech': ('first', 'NA'), 'time': np.array([0, 2]),
+                  'simulation': np.arange(6, dtype=np.float32).reshape(2, 3) / 3, 'emotion dimension': DIMENSIONS}
+        paths = [self.path / 'results'] + ([self.path / 'results.parquet'] if HAS_PYARROW else [])
+        for path in paths:
+            with self.subTest(path=path.name):
+                with (NpySink(str(path)) if path.suffix == '' else ParquetSink(str(path))) as sink:
+                    sink.write('Title', record)
+                results = load_results(path)
+                self.assertEqual(results.states.dtype, np.float32)
+                np.testing.assert_array_equal(results.states, record['simulation'])
+                self.assertEqual(list(results.metadata['time'][0]), [0, 2])
+                self.assertEqual(list(results.metadata['speech'][0]), ['first', 'NA'])
+
+    def test_json_sink_keeps_original_format(self):
+        all_s = {}
+        with JsonSink(str(self.path / 'results.json')) as sink:
+            for key, record in make_records():
+                sink.write(key, record)
+                all_s.setdefault(key, []).append(record)
+        pd.DataFrame(all_s).to_json(self.path / 'expected.json', orient='records', lines=True, indent=4)
+        self.assertEqual((self.path / 'results.json').read_text(), (self.path / 'expected.json').read_text())
+
+    def test_sinks_implement_write_records(self):
+        with self.assertRaises(TypeError):
+            ResultSink(str(self.path / 'results'))
+
+        class ListSink(ResultSink):
+            def _write_records(self, records):
+                self.records = list(records)
+
+        with ListSink(str(self.path / 'results'), buffer_size=4) as sink:
+            for key, record in make_records():
+                sink.write(key, record)
+        self.assertEqual([key for key, _ in sink.records], [0, 'Title', 2])
+
+    def test_npy_sink_releases_its_files_when_the_header_does_not_match(self):
+        sink = NpySink(str(self.path / 'results'))
+        sink.write(0, make_records()[0][1])
+        sink.flush()
+        sink._states.write(b'x')
+        with self.assertRaises(RuntimeError):
+            sink.close()
+        self.assertTrue(sink._states.closed)
+        self.assertFalse((self.path / 'results' / 'meta.json').exists())
+
+    def test_background_sink_writes_in_order(self):
+        with BackgroundSink(NpySink(str(self.path / 'results'), buffer_size=2), max_pending=1) as sink:
+            for key, record in make_records():
+                sink.write(key, record)
+            sink.flush()
+            self.assertEqual(sink.emotion_dimensions, list(DIMENSIONS))
+            self.assertEqual(sink.path, self.path / 'results')
+        self.check_round_trip(load_results(self.path / 'results'))
+
+    def test_background_sink_raises_errors_of_the_writer(self):
+        sink = BackgroundSink(NpySink(str(self.path / 'results')))
+        record = make_records()[0][1]
+        sink.write(0, record)
+        sink.write(1, {**record, 'emotion dimension': pd.Index(['OTHER', 'A', 'B'])})
+        with self.assertRaises(ValueError):
+            sink.flush()
+        with self.assertRaises(ValueError):
+            sink.close()
+        self.assertFalse(sink._thread.is_alive())
+        self.assertTrue(sink.sink._states.closed)
+
+    def test_calculator_writes_to_sink(self):
+        rng = np.random.default_rng(1)
+        data = pd.DataFrame(rng.uniform(-0.3, 0.3, size=(5, 3)), columns=['ATTITUDE', 'TEMPER', 'POLARITY'])
+        data.insert(0, 'text', ['a calm day', 'an awful day'] * 2 + ['hope'])
+        all_s = SentimentFlowCalculator().calculate_navier_stocker_for_texts(data, sink=str(self.path / 'texts'))
+        results = load_results(self.path / 'texts')
+        self.assertEqual(list(results.metadata['key']), list(all_s))
+        for idx, row in results.metadata.iterrows():
+            np.testing.assert_array_equal(results.states[row['start']:row['stop']], all_s[idx][0]['simulation'])
+
+    def test_calculator_closes_its_sink_when_a_flow_raises(self):
+        texts = make_texts(4, seed=1)
+        texts.loc[2, 'POLARITY'] = np.nan
+        speeches = make_speeches(4)
+        speeches.loc[0, 'POLARITY'] = np.nan
+        calculator = SentimentFlowCalculator(on_divergence='raise')
+        for name, run in (('texts', lambda path: calculator.calculate_navier_stocker_for_texts(texts, sink=path)),
+                          ('batched', lambda path: calculator.calculate_navier_stocker_for_texts(
+                              texts, vectorized=True, sink=path)),
+                          ('speeches', lambda path: calculator.calculate_navier_stocker_for_speeches(
+                              speeches, sink=path))):
+            with self.subTest(name), self.assertRaises(ValueError):
+                run(str(self.path / name))
+            self.assertTrue((self.path / name / 'meta.json').exists())
+
+    def test_background_writer_stops_when_a_flow_raises(self):
+        texts = make_texts(4, seed=1)
+        texts.loc[2, 'POLARITY'] = np.nan
+        policy = OutputPolicy(str(self.path), background=True)
+        calculator = SentimentFlowCalculator(on_divergence='raise', output=policy)
+        with self.assertRaises(ValueError):
+            calculator.calculate_navier_stocker_for_texts(texts)
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('sink-')])
+        self.assertTrue((self.path / 'navier_stocker_text_results.json').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy.integrate import odeint
+
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.integrators import FlowIntegrator
+from SentimentFlow.solver import FlowRHS, gradient, integrate_batch, pressure_terms
+from conftest import make_states
+
+
+class TestSolver(unittest.TestCase):
+    def test_gradient_matches_numpy(self):
+        states = make_states(4, 7) * 1e3
+        np.testing.assert_array_equal(gradient(states), np.gradient(states, axis=1))
+        np.testing.assert_array_equal(gradient(states[0, :2]), np.gradient(states[0, :2]))
+
+    def test_integrate_batch_matches_odeint(self):
+        s0 = make_states(20, 6)
+        rho = np.sum(np.abs(s0), axis=1)
+        nu = np.std(s0, axis=1)
+        g_context = np.linspace(-0.5, 0.5, len(s0))
+        t = np.array([0, 1])
+
+        trajectories = integrate_batch(s0, rho, s0, nu, g_context, t)
+
+        self.assertEqual(trajectories.shape, (2, 20, 6))
+        for i in range(len(s0)):
+            expected = odeint(SentimentFlowCalculator._differential_equation, s0[i], t,
+                              args=((rho[i], s0[i], nu[i], g_context[i]),))
+            np.testing.assert_allclose(trajectories[:, i], expected, rtol=1e-5, atol=1e-7)
+
+    def test_integrate_batch_bounds_the_error_of_growing_flows(self):
+        rng = np.random.default_rng(0)
+        s0 = rng.uniform(-1, 1, size=(300, 8)) * (rng.random((300, 8)) > 0.3)
+        rho = np.sum(np.abs(s0), axis=1)
+        p_sent = np.where(rng.random((300, 1)) > 0.5, s0, 0.0)
+        nu = np.std(s0, axis=1)
+        g_context = rng.uniform(-1, 1, 300)
+        t = np.array([0, 1])
+
+        final = integrate_batch(s0, rho, p_sent, nu, g_context, t, on_divergence='skip')[-1]
+        pressure_term = pressure_terms(rho, p_sent)
+        expected = np.array([odeint(FlowRHS(pressure_term[i], nu[i], g_context[i]), s0[i], t)[-1]
+                             for i in range(len(s0))])
+        scale = np.abs(expected).max(axis=1)
+        grown = scale > 100
+        self.assertGreater(grown.sum(), 5)
+        # Flows that blow up are integrated as in the per-state path; the others stay within the bound.
+        np.testing.assert_array_equal(final[grown], expected[grown])
+        error = np.abs(final - expected).max(axis=1) / np.maximum(scale, 1)
+        self.assertLess(error.max(), 1e-5)
+
+    def test_vectorized_texts_need_the_default_integrator(self):
+        data = pd.DataFrame(make_states(4, 3), columns=['ATTITUDE', 'TEMPER', 'POLARITY'])
+        data.insert(0, 'text', ['a calm day'] * 4)
+        calculator = SentimentFlowCalculator(integrator=FlowIntegrator('RK45'))
+        with self.assertRaises(ValueError):
+            calculator.calculate_navier_stocker_for_texts(data, vectorized=True)
+        with self.assertRaises(ValueError):
+            calculator.integrate_texts(data[['ATTITUDE', 'TEMPER']].to_numpy(), data['text'], data['POLARITY'])
+        self.assertEqual(len(calculator.calculate_navier_stocker_for_texts(data)), 4)
+
+    def test_vectorized_texts_match_serial(self):
+        s0 = make_states(8, 5, seed=1)
+        data = pd.DataFrame(s0, columns=['ATTITUDE', 'INTROSPECTION', 'SENSITIVITY', 'TEMPER', 'POLARITY'])
+        data.insert(0, 'text', ['a calm day', 'an awful day'] * 4)
+        calculator = SentimentFlowCalculator()
+
+        serial = calculator.calculate_navier_stocker_for_texts(data)
+        batched = calculator.calculate_navier_stocker_for_texts(data, vectorized=True, batch_size=3)
+
+        self.assertEqual(list(serial), list(batched))
+        for idx in serial:
+            self.assertEqual(serial[idx][0]['text'], batched[idx][0]['text'])
+            np.testing.assert_allclose(batched[idx][0]['simulation'], serial[idx][0]['simulation'],
+                                       rtol=1e-5, atol=1e-7)
+
+
+if __name__ == '__main__':
+    unittest.main()
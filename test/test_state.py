@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.state import SpeakerState, SpeakerStateStore
+from conftest import make_speeches
+
+
+class TestSpeakerStateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'states.sqlite'
+        self.calculator = SentimentFlowCalculator(output=OutputPolicy.memory())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        state = SpeakerState('T1', np.array([0.1, -0.2]), 3, 4, 'first', 0.5, False)
+        with SpeakerStateStore(str(self.path)) as store:
+            self.assertIsNone(store.emotion_dimensions)
+            store.save({'A': state}, ['ATTITUDE', 'TEMPER'])
+        with SpeakerStateStore(str(self.path)) as store:
+            self.assertEqual(store.emotion_dimensions, ['ATTITUDE', 'TEMPER'])
+            self.assertEqual(len(store), 1)
+            stored = store.get_many(['A', 'missing'])
+            self.assertEqual(list(stored), ['A'])
+            np.testing.assert_array_equal(stored['A'].state, state.state)
+            self.assertEqual(stored['A']._replace(state=None), state._replace(state=None))
+            with self.assertRaises(ValueError):
+                store.save({'B': state}, ['TEMPER'])
+
+    def test_appended_speeches_continue_the_flow(self):
+        data = make_speeches()
+        full = self.calculator.calculate_navier_stocker_for_speeches(data)
+        with SpeakerStateStore(str(self.path)) as store:
+            for rows in (slice(0, 2), slice(2, 7), slice(7, 12)):
+                part = self.calculator.calculate_navier_stocker_for_speeches(data.iloc[rows], state_store=store,
+                                                                            appended=True)
+                for title, results in part.items():
+                    expected = full[title][0]
+                    steps = len(results[0]['speech'])
+                    np.testing.assert_array_equal(results[0]['simulation'], expected['simulation'][:2 * steps])
+                    np.testing.assert_array_equal(results[0]['time'], expected['time'][:2 * steps])
+                    self.assertEqual(list(results[0]['speech']), list(expected['speech'][:steps]))
+                    full[title][0] = {**expected, 'simulation': expected['simulation'][2 * steps:],
+                                      'time': expected['time'][2 * steps:], 'speech': expected['speech'][steps:]}
+            self.assertEqual(store.get_many(['A'])['A'].rows, 4)
+        for results in full.values():
+            self.assertEqual(len(results[0]['speech']), 0)
+
+    def test_resuming_with_the_full_history_skips_the_seen_speeches(self):
+        data = make_speeches()
+        full = self.calculator.calculate_navier_stocker_for_speeches(data)
+        with SpeakerStateStore(str(self.path)) as store:
+            first = self.calculator.calculate_navier_stocker_for_speeches(data.iloc[:7], state_store=store)
+            second = self.calculator.calculate_navier_stocker_for_speeches(data, state_store=store)
+            again = self.calculator.calculate_navier_stocker_for_speeches(data, state_store=store)
+            self.assertEqual(store.get_many(['A'])['A'].rows, 4)
+        for title, expected in full.items():
+            resumed = [first[title][0], second[title][0]]
+            np.testing.assert_array_equal(np.concatenate([result['simulation'] for result in resumed]),
+                                          expected[0]['simulation'])
+            np.testing.assert_array_equal(np.concatenate([result['time'] for result in resumed]), expected[0]['time'])
+            self.assertEqual([speech for result in resumed for speech in result['speech']], list(expected[0]['speech']))
+            self.assertEqual(len(again[title][0]['speech']), 0)
+
+    def test_store_fixes_the_emotion_dimensions(self):
+        data = make_speeches()
+        with SpeakerStateStore(str(self.path)) as store:
+            self.calculator.calculate_navier_stocker_for_speeches(data.iloc[:6], state_store=store)
+            more = data.iloc[6:].assign(JOY=0.2)
+            with self.assertLogs(level='WARNING'):
+                results = self.calculator.calculate_navier_stocker_for_speeches(more, state_store=store, appended=True)
+        self.assertEqual(list(results['T0'][0]['emotion dimension']), ['ATTITUDE', 'TEMPER'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from SentimentFlow.streaming import Checkpoint, ChunkWriter, read_chunks
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_chunks_skips_rows(self):
+        for name in ['corpus.csv', 'corpus.jsonl']:
+            path = self.dir / name
+            frame = pd.DataFrame({'text': [f'text {i}' for i in range(7)]})
+            if name.endswith('.csv'):
+                frame.to_csv(path, index=False)
+            else:
+                frame.to_json(path, orient='records', lines=True)
+            chunks = list(read_chunks(str(path), chunk_size=3, skip_rows=4))
+            self.assertEqual([text for chunk in chunks for text in chunk['text']], ['text 4', 'text 5', 'text 6'])
+
+    def test_writer_resumes_from_checkpoint(self):
+        output_path = self.dir / 'out.csv'
+        checkpoint = Checkpoint(str(self.dir / 'out.checkpoint.json'), 'in.csv', str(output_path))
+        with ChunkWriter(str(output_path), ['text', 'JOY', 'POLARITY']) as writer:
+            checkpoint.save(2, writer.write(pd.DataFrame({'text': ['a', 'b'], 'POLARITY': [0.5, -0.5]})))
+            writer.write(pd.DataFrame({'text': ['lost'], 'JOY': [1.0], 'POLARITY': [0.1]}))
+
+        checkpoint = Checkpoint(str(self.dir / 'out.checkpoint.json'), 'in.csv', str(output_path)).load()
+        self.assertEqual(checkpoint.rows_done, 2)
+        with ChunkWriter(str(output_path), ['text', 'JOY', 'POLARITY'], truncate_to=checkpoint.output_bytes) as writer:
+            writer.write(pd.DataFrame({'text': ['c'], 'JOY': [0.25], 'POLARITY': [0.0]}))
+
+        result = pd.read_csv(output_path)
+        self.assertEqual(result['text'].tolist(), ['a', 'b', 'c'])
+        self.assertEqual(list(result.columns), ['text', 'JOY', 'POLARITY'])
+
+    def test_checkpoint_rejects_other_run(self):
+        Checkpoint(str(self.dir / 'ckpt.json'), 'a.csv', 'out.csv').save(1, 10)
+        with self.assertRaises(ValueError):
+            Checkpoint(str(self.dir / 'ckpt.json'), 'b.csv', 'out.csv').load()
+
+
+if __name__ == '__main__':
+    unittest.main()
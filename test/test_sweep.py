@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from SentimentFlow.output import OutputPolicy
+from SentimentFlow.sentiment_analysis import SentimentFlowCalculator
+from SentimentFlow.solver import integrate_batch
+from SentimentFlow.sweep import PARAMETERS, ParameterSweep, parameter_grid
+from conftest import TEXTS, make_speeches, make_texts
+
+DIMENSIONS = ['ATTITUDE', 'INTROSPECTION', 'SENSITIVITY', 'TEMPER']
+
+
+class TestParameterSweep(unittest.TestCase):
+    def setUp(self):
+        self.calculator = SentimentFlowCalculator(output=OutputPolicy.memory())
+
+    def test_parameter_grid(self):
+        grid = parameter_grid(viscosity=[1, 2], density=[0.5, 1, 2])
+        self.assertEqual(list(grid.columns), list(PARAMETERS))
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(list(grid['density']), [0.5, 0.5, 1, 1, 2, 2])
+        self.assertEqual(list(grid['viscosity']), [1, 2] * 3)
+        self.assertTrue((grid[['pressure', 'context']] == 1).all(axis=None))
+        with self.assertRaises(ValueError):
+            parameter_grid(gravity=[1])
+
+    def test_texts_match_the_vectorized_path(self):
+        data = make_texts(8, seed=1, dimensions=DIMENSIONS, texts=TEXTS[:2])
+        sweep = ParameterSweep(self.calculator, data)
+        grid = pd.DataFrame({'viscosity': [1.0, 2.0], 'pressure': [1.0, 0.5]})
+        results = sweep.run(grid, batch_size=5)
+        self.assertEqual(results.states.shape, (2, 8, 5))
+        self.assertEqual(results.emotion_dimensions, sorted(DIMENSIONS + ['POLARITY']))
+
+        expected = self.calculator.calculate_navier_stocker_for_texts(data, vectorized=True)
+        for i, key in enumerate(results.keys):
+            np.testing.assert_array_equal(results.states[0, i], expected[key][0]['simulation'][-1])
+
+        s0 = data[results.emotion_dimensions].to_numpy()
+        has_keyword = np.array([self.calculator._contains_keyword(text) for text in data['text']])
+        scaled = integrate_batch(s0, np.sum(np.abs(s0), axis=1), np.where(has_keyword[:, None], s0, 0.0) * 0.5,
+                                 np.std(s0, axis=1) * 2, data['POLARITY'].to_numpy(), np.array([0, 1]))
+        np.testing.assert_array_equal(results.states[1], scaled[-1])
+
+        np.testing.assert_array_equal(sweep.run(grid, n_workers=2).states, results.states)
+        with self.assertRaises(ValueError):
+            sweep.run(pd.DataFrame({'gravity': [1.0]}))
+
+    def test_speeches_match_the_speaker_flows(self):
+        data = make_speeches(6)
+        expected = self.calculator.calculate_navier_stocker_for_speeches(data)
+        results = ParameterSweep(self.calculator, data).run({'context': [1.0, 0.25]})
+        self.assertEqual(list(results.keys), ['T0', 'T1', 'T2'])
+        for i, key in enumerate(results.keys):
+            np.testing.assert_array_equal(results.states[0, i], expected[key][0]['simulation'][-1])
+        self.assertFalse(np.allclose(results.states[0], results.states[1]))
+
+    def test_single_speech_speakers_have_no_final_state(self):
+        data = make_speeches(4)
+        expected = self.calculator.calculate_navier_stocker_for_speeches(data)
+        results = ParameterSweep(self.calculator, data).run({'viscosity': [1.0, 2.0]})
+        self.assertEqual(list(results.keys), ['T0', 'T1', 'T2'])
+        self.assertEqual(list(results.steps), [1, 0, 0])
+        self.assertEqual(len(expected['T1'][0]['simulation']), 0)
+        np.testing.assert_array_equal(results.states[0, 0], expected['T0'][0]['simulation'][-1])
+        self.assertTrue(np.isnan(results.states[:, 1:]).all())
+        self.assertFalse(results.to_frame()['diverged'].any())
+
+    def test_multipliers_must_be_positive(self):
+        sweep = ParameterSweep(self.calculator, make_speeches(4))
+        for grid in ({'density': [1.0, 0.0]}, {'viscosity': [-1.0]}, {'context': [float('nan')]}):
+            with self.assertRaises(ValueError):
+                sweep.run(grid)
+
+    def test_results_cube_to_frame(self):
+        calculator = SentimentFlowCalculator(output=OutputPolicy.memory(), dtype='float32')
+        data = make_texts(4, seed=1, dimensions=DIMENSIONS, texts=TEXTS[:2])
+        results = ParameterSweep(calculator, data).run(parameter_grid(density=[1, 2, 4]))
+        self.assertEqual(results.states.dtype, np.float32)
+        frame = results.to_frame()
+        self.assertEqual(len(frame), 12)
+        self.assertEqual(list(frame.columns[:6]), ['parameter_set', *PARAMETERS, 'key'])
+        self.assertEqual(list(frame['density'][:5]), [1, 1, 1, 1, 2])
+        self.assertEqual(list(frame['key'][:5]), [0, 1, 2, 3, 0])
+        self.assertFalse(frame['diverged'].any())
+        np.testing.assert_array_equal(frame.loc[5, results.emotion_dimensions].to_numpy(dtype=np.float32),
+                                      results.states[1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
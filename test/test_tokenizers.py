@@ -0,0 +1,77 @@
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+from SentimentFlow.data_processing import SpeechProcessor
+from SentimentFlow.tokenizers import RegexTokenizer, SpacyTokenizer, Tokenizer, make_tokenizer
+from conftest import make_senticnet_data
+
+HAS_SPACY = importlib.util.find_spec('spacy') is not None
+TEXTS = [
+    "I'm happy!! Don't worry :) #blessed well-known U.S. 3.5 e-mail http://x.com/a can't won't gonna it's",
+    "She said: \"great\"... (really) — so-so; 50% off, $20. Love it! I ❤️ NY. He's done. They'll go, we'd've.",
+    "@bob thanks!! lol... ok?? 10am 5-3 rock'n'roll o'clock don’t it’s 'quoted' a/b :( ;) <3 gotta wanna",
+    "Check www.example.com/page. Great (really great). \"Fine.\" 1,000 people at 10:30! Mr. Smith's dog. A. B. c.",
+    "Happy, sad and happy. Calm? Unknown words.",
+]
+
+
+class TestRegexTokenizer(unittest.TestCase):
+    def test_sentences(self):
+        self.assertEqual(RegexTokenizer.tokenize("Happy, SAD. (Calm!) \"Ok.\" Mr. Smith isn't here..."), [
+            ['happy', ',', 'sad', '.', '('],
+            ['calm', '!', ')', '"'],
+            ['ok', '.', '"'],
+            ['mr.', 'smith', 'is', "n't", 'here', '...'],
+        ])
+        self.assertEqual(RegexTokenizer.tokenize("  "), [])
+
+    @unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+    def test_tokens_match_spacy(self):
+        tokenizer = SpacyTokenizer('blank:en')
+        for doc, text in tokenizer.pipe((text, text) for text in TEXTS):
+            self.assertEqual(RegexTokenizer.tokenize(text), list(tokenizer.sentences(doc)), text)
+
+    def test_make_tokenizer(self):
+        self.assertIsInstance(make_tokenizer('regex'), RegexTokenizer)
+        self.assertEqual(make_tokenizer('spacy', 'blank:en').config[0], 'blank:en')
+        with self.assertRaises(ValueError):
+            make_tokenizer('whitespace')
+
+    def test_backends_implement_the_interface(self):
+        with self.assertRaises(TypeError):
+            Tokenizer()
+
+        class Partial(Tokenizer):
+            config = ('partial',)
+
+            def pipe(self, records, batch_size=256, n_process=1):
+                return iter(records)
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+@unittest.skipUnless(HAS_SPACY, "spaCy is not installed")
+class TestProcessorTokenizers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tsv_path = Path(self.tmp.name) / 'senticnet.tsv'
+        make_senticnet_data().to_csv(self.tsv_path, sep='\t', index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_regex_scores_match_spacy(self):
+        spacy_processor = SpeechProcessor(str(self.tsv_path), lexicon_cache=False, nlp_model='blank:en')
+        regex_processor = SpeechProcessor(str(self.tsv_path), lexicon_cache=False, tokenizer=RegexTokenizer())
+        self.assertEqual(regex_processor.score_texts(TEXTS), spacy_processor.score_texts(TEXTS))
+        self.assertEqual(regex_processor.metrics.counter('tokens_total'),
+                         spacy_processor.metrics.counter('tokens_total'))
+        # Cached scores are kept apart per tokenizer.
+        self.assertNotEqual(regex_processor._scores_key(TEXTS[0]), spacy_processor._scores_key(TEXTS[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()